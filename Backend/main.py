@@ -1,23 +1,96 @@
+import os
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+
 # ================================
-#  DB Table Creation (One-Time)
+#  DB Table Creation (One-Time, in the background at startup)
 # ================================
 from app.models import models
-from app.core.database import Base, engine
+from app.core.database import Base, engine, async_engine, pool_stats
 
-# Create tables if not already created
-Base.metadata.create_all(bind=engine)
-print("✅ All tables created successfully!")
+def create_tables():
+    # Create tables if not already created
+    Base.metadata.create_all(bind=engine)
+    models.ensure_indexes(engine)
+    models.ensure_live_feed(engine)
+    print("✅ All tables created successfully!")
 
 # ================================
 #  FastAPI App Setup + Routers
 # ================================
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core import cache, metrics
+from app.core.sql_guard import guard_stats
+from app.core.context_store import context_store
+from app.core.live_feed import live_feed, table_writes
 from app.routes import chat
 from app.routes.ws import ws_router  # ✅ WebSocket router
+from app.rag import rag_pipeline
+from app.rag.intent_router import intent_router
+from app.rag.timeline_index import TIMELINE_INDEX, timeline_index
+from app.rag.plan_cache import plan_cache
+
+# ✅ Startup work toggles (.env); all of it runs after the port is bound
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() == "true"
+TRACE_IDS = os.getenv("TRACE_IDS", "true").lower() == "true"
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))        # first retry; doubles up to the max
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+READY_DB_TIMEOUT_SECONDS = 2
+
+# ✅ Last outcome of each warm-up step: False = pending, True = done, str = latest error (being retried)
+# (the timeline index is optional: until it is loaded, its questions simply run SQL)
+readiness = {"database": False, "vocabulary": False, "rag": False, "timeline": False, "table_writes": False}
+
+async def _warm(name, step, retry=True):
+    # A blip at boot (DB restarting, LLM API hiccup) must not leave the worker unready for good
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        try:
+            await step()
+            readiness[name] = True
+            return
+        except Exception as e:
+            readiness[name] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Warm-up step '{name}' failed{f', retrying in {delay:g}s' if retry else ''}: {e}")
+        if not retry:
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+async def warm_up():
+    if CREATE_TABLES_ON_STARTUP:
+        await _warm("database", lambda: asyncio.to_thread(create_tables))
+    else:
+        readiness["database"] = True
+    # Row-cache invalidation for writes made outside this app (needs the triggers create_tables installs)
+    steps = [_warm("vocabulary", intent_router.ensure_loaded), _warm("table_writes", lambda: cache.follow_table_writes(table_writes))]
+    if TIMELINE_INDEX:
+        # Not retried here: the index's own maintenance task retries a failed first load
+        steps.append(_warm("timeline", timeline_index.start, retry=False))
+    if RAG_WARMUP:
+        steps.append(_warm("rag", rag_pipeline.warm_up))
+    await asyncio.gather(*steps)
+
+# ✅ Don't block startup (and port binding) on DB/network work: warm up in the background.
+# On shutdown, return pooled connections cleanly.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    yield
+    app.state.warm_up_task.cancel()
+    await timeline_index.close()
+    await live_feed.close()
+    await table_writes.close()
+    await async_engine.dispose()
 
 # ✅ Create FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # ✅ Include Routers
 app.include_router(chat.router)
@@ -30,11 +103,81 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id", "X-Trace-Id"],
 )
 
+# ✅ Trace id per request (X-Trace-Id in, X-Trace-Id out) + end-to-end latency per route
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if TRACE_IDS:
+        metrics.trace_id.set(request.headers.get("X-Trace-Id") or uuid.uuid4().hex)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep the series count bounded
+    route = request.scope.get("route")
+    metrics.stage_seconds.observe(time.perf_counter() - start, f"http:{route.path if route else 'unmatched'}")
+    if TRACE_IDS:
+        response.headers["X-Trace-Id"] = metrics.trace_id.get()
+    return response
+
 @app.get("/")
 def root():
     return {"message": "Batch Control AI Assistant is running!"}
 
+async def _ping_database():
+    try:
+        async with async_engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), READY_DB_TIMEOUT_SECONDS)
+        return True
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+# ✅ Readiness probe: 200 once tables, vocabulary and (if warmed) the RAG clients are ready.
+# Checked live each time; a step's stored error only shows while that step is still not ready.
+@app.get("/ready")
+async def ready():
+    live = {
+        "database": await _ping_database() if readiness["database"] is True else readiness["database"],
+        "vocabulary": intent_router.loaded_at > 0,
+        "rag": rag_pipeline.is_ready(),
+        "timeline": timeline_index.ready or timeline_index.error or False,
+        "table_writes": table_writes.listening,
+    }
+    # Not ready (False): explain with the step's latest error while it is being retried
+    status = {name: ok if ok is not False or not isinstance(readiness[name], str) else readiness[name]
+              for name, ok in live.items()}
+    is_ready = status["database"] is True and status["vocabulary"] is True and (status["rag"] is True or not RAG_WARMUP)
+    return JSONResponse({"ready": is_ready, **status}, status_code=200 if is_ready else 503)
+
+# ✅ Connection pool usage (size, checked out, overflow)
+@app.get("/health/db")
+def db_pool_health():
+    return pool_stats()
+
 
+# ✅ Gauges read at scrape time
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_semantic_cache", "Semantic SQL cache state", rag_pipeline.semantic_cache.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_sql_guard_checks", "SQL guard outcomes since start", dict(guard_stats), "outcome"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_context_store", "Session context store usage", context_store.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_llm_provider", "LLM circuit breaker and hedging state", rag_pipeline.llm.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_embedding_provider", "Query embedding circuit breaker and hedging state", rag_pipeline.embedder.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_plan_cache", "Learned query plans used/learned by this worker", plan_cache.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_timeline_index", "In-memory batch timeline index", timeline_index.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_live_feed", "Live batch feed listener and subscribers", live_feed.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_table_writes", "Table-write listener for cache invalidation", table_writes.stats(), "field"))
+metrics.register_collector(lambda: metrics.gauge_lines(
+    "batch_assistant_db_pool", "Async connection pool usage", pool_stats(), "field"))
 
+# ✅ Prometheus scrape endpoint (per worker)
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
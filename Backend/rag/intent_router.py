@@ -0,0 +1,270 @@
+import re
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import AsyncSessionLocal
+from app.models import models
+
+# ✅ Batch code pattern (e.g. VDT-052025-A), shared with the chat routes
+BATCH_CODE_RE = re.compile(r'\b([A-Z]{3}-\d{6}-[A-Z])\b')
+
+# ✅ How long DB-loaded names are trusted before reloading (seconds)
+VOCAB_TTL = 300
+
+# ✅ Words that mean a status even though they are not the stored value
+STATUS_SYNONYMS = {
+    "delivered": "Dispatched",
+    "deliver": "Dispatched",
+    "shipped": "Dispatched",
+    "ship": "Dispatched",
+    "checked": "Inspected",
+    "check": "Inspected",
+}
+
+# ✅ Verbs that ask about "any involvement", i.e. need no status
+GENERIC_VERBS = {"handle", "handled", "process", "processed", "work", "worked", "touch", "touched",
+                 "involve", "involved", "belong", "do", "done", "manage", "managed"}
+
+# ✅ Question forms the templates can't express: negation, counting, two questions in one
+UNSUPPORTED = re.compile(
+    r"\b(?:not|never|no|without|except|excluding|how many|count|number of)\b|n't\b"
+    r"|\b(?:and|or|also|plus)\s+(?:when|who|where|which|what|how|why|whom)\b|[?;].*\S"
+)
+
+# ✅ Pre-compiled, parameterized SQL for each known intent
+INTENT_SQL = {
+    "batch_status": text(
+        "SELECT batch_latest_status.status FROM batch_latest_status "
+        "JOIN batches ON batch_latest_status.batch_id = batches.id WHERE batches.batch_code = :batch_code"
+    ),
+    "batch_history": text(
+        "SELECT employees.name AS employee, departments.name AS department, batch_tracking.status, batch_tracking.timestamp "
+        "FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "JOIN employees ON batch_tracking.employee_id = employees.id "
+        "JOIN departments ON batch_tracking.department_id = departments.id "
+        "WHERE batches.batch_code = :batch_code ORDER BY batch_tracking.timestamp, batch_tracking.id"
+    ),
+    "batch_statuses": text(
+        "SELECT status FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "WHERE batches.batch_code = :batch_code ORDER BY batch_tracking.timestamp, batch_tracking.id"
+    ),
+    "batch_actor": text(
+        "SELECT employees.name FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "JOIN employees ON batch_tracking.employee_id = employees.id "
+        "WHERE batches.batch_code = :batch_code AND batch_tracking.status = :status ORDER BY batch_tracking.timestamp, batch_tracking.id"
+    ),
+    "batch_status_time": text(
+        "SELECT timestamp FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "WHERE batches.batch_code = :batch_code AND batch_tracking.status = :status ORDER BY timestamp DESC LIMIT 1"
+    ),
+    "batch_department": text(
+        "SELECT DISTINCT departments.name FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "JOIN departments ON batch_tracking.department_id = departments.id "
+        "WHERE batches.batch_code = :batch_code ORDER BY departments.name"
+    ),
+    "batch_status_department": text(
+        "SELECT departments.name FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+        "JOIN departments ON batch_tracking.department_id = departments.id "
+        "WHERE batches.batch_code = :batch_code AND batch_tracking.status = :status ORDER BY batch_tracking.timestamp, batch_tracking.id"
+    ),
+    "batch_product": text(
+        "SELECT products.name FROM batches JOIN products ON batches.product_id = products.id "
+        "WHERE batches.batch_code = :batch_code"
+    ),
+    "product_batches": text(
+        "SELECT batches.batch_code FROM batches JOIN products ON batches.product_id = products.id "
+        "WHERE products.name = :product ORDER BY batches.batch_code"
+    ),
+    "employee_batches": text(
+        "SELECT DISTINCT batches.batch_code FROM batches JOIN batch_tracking ON batches.id = batch_tracking.batch_id "
+        "JOIN employees ON batch_tracking.employee_id = employees.id WHERE employees.name = :employee "
+        "ORDER BY batches.batch_code"
+    ),
+    "employee_status_batches": text(
+        "SELECT DISTINCT batches.batch_code FROM batches JOIN batch_tracking ON batches.id = batch_tracking.batch_id "
+        "JOIN employees ON batch_tracking.employee_id = employees.id "
+        "WHERE batch_tracking.status = :status AND employees.name = :employee ORDER BY batches.batch_code"
+    ),
+    "department_employees": text(
+        "SELECT employees.name FROM employees JOIN departments ON employees.department_id = departments.id "
+        "WHERE departments.name = :department ORDER BY employees.name, employees.id"
+    ),
+    "status_batches": text(
+        "SELECT DISTINCT batches.batch_code FROM batches JOIN batch_tracking ON batches.id = batch_tracking.batch_id "
+        "WHERE batch_tracking.status = :status ORDER BY batches.batch_code"
+    ),
+}
+
+
+@dataclass
+class IntentMatch:
+    name: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def sql(self):
+        return INTENT_SQL[self.name]
+
+
+def _names_pattern(names: List[str]) -> Optional[re.Pattern]:
+    # Longest first so "Cough Syrup" wins over a shorter overlapping name
+    names = sorted({n for n in names if n}, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b", re.IGNORECASE)
+
+
+class IntentRouter:
+    """Rule/template matcher for the common batch questions; unmatched questions go to RAG."""
+
+    def __init__(self, ttl: int = VOCAB_TTL):
+        self.ttl = ttl
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._canonical: Dict[str, Dict[str, str]] = {}
+        self._patterns: Dict[str, Optional[re.Pattern]] = {}
+
+    def needs_refresh(self) -> bool:
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    async def refresh(self, db: AsyncSession) -> None:
+        columns = {
+            "employee": models.Employee.name,
+            "product": models.Product.name,
+            "department": models.Department.name,
+            "status": models.BatchTracking.status,
+        }
+        vocab = {}
+        for kind, column in columns.items():
+            vocab[kind] = (await db.execute(select(column).distinct())).scalars().all()
+        self.set_vocabulary(vocab)
+
+    def set_vocabulary(self, vocab: Dict[str, List[str]]) -> None:
+        """Names per kind (employee, product, department, status) the matcher recognizes."""
+        canonical = {kind: {n.lower(): n for n in names if n} for kind, names in vocab.items()}
+
+        # Verb forms of each status ("store", "dispatch") plus synonyms
+        status_words = dict(canonical["status"])
+        for lower, value in canonical["status"].items():
+            if lower.endswith("ed"):
+                status_words[lower[:-2]] = value
+                status_words[lower[:-1]] = value
+        for word, value in STATUS_SYNONYMS.items():
+            if value.lower() in canonical["status"]:
+                status_words[word] = canonical["status"][value.lower()]
+        canonical["status"] = status_words
+
+        self._canonical = canonical
+        self._patterns = {kind: _names_pattern(list(words)) for kind, words in canonical.items()}
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self) -> None:
+        if not self.needs_refresh():
+            return
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self.needs_refresh():
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+
+    def extract(self, question: str) -> Dict[str, str]:
+        entities = {}
+        batch_match = BATCH_CODE_RE.search(question)
+        if batch_match:
+            entities["batch_code"] = batch_match.group(1)
+        for kind, pattern in self._patterns.items():
+            if pattern is None:
+                continue
+            found = pattern.search(question)
+            if found:
+                entities[kind] = self._canonical[kind][found.group(1).lower()]
+        return entities
+
+    def spans(self, question: str) -> List[Tuple[int, int, str, str]]:
+        """Every entity mention as (start, end, kind, canonical value), left to right, no overlaps."""
+        found = [(m.start(1), m.end(1), "batch_code", m.group(1)) for m in BATCH_CODE_RE.finditer(question)]
+        for kind, pattern in self._patterns.items():
+            if pattern is not None:
+                found += [(m.start(1), m.end(1), kind, self._canonical[kind][m.group(1).lower()])
+                          for m in pattern.finditer(question)]
+        # Longest mention wins where two overlap ("Cough Syrup" over a status word inside it)
+        spans: List[Tuple[int, int, str, str]] = []
+        for span in sorted(found, key=lambda s: (s[0], s[0] - s[1])):
+            if not spans or span[0] >= spans[-1][1]:
+                spans.append(span)
+        return spans
+
+    def _unmapped_verb(self, question: str, spans) -> bool:
+        # "which batches did Anna receive?": an action we have no status for, not "any involvement"
+        bare = question
+        for start, end, _, _ in spans:
+            # Names themselves ("Ted") are not verbs; keep a placeholder so "did <name> x" still parses
+            bare = bare[:start] + "\0" * (end - start) + bare[end:]
+        bare = bare.lower()
+        words = set(re.findall(r"\b[a-z]+ed\b", bare))
+        words |= set(re.findall(r"\b(?:did|does|do|has|have|had)\s+\0+\s+([a-z]+)", bare))
+        known = set(self._canonical.get("status", {})) | GENERIC_VERBS
+        return any(w not in known for w in words)
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        q = question.lower()
+        if UNSUPPORTED.search(q.strip()):
+            return None
+        # Two different products/employees/... in one question: the templates take one of each
+        spans = self.spans(question)
+        kinds = [kind for kind, _ in {(kind, value) for _, _, kind, value in spans}]
+        if len(kinds) != len(set(kinds)):
+            return None
+        e = self.extract(question)
+        batch, status = e.get("batch_code"), e.get("status")
+
+        if batch:
+            if re.search(r"\bhistory\b|\btimeline\b", q):
+                return IntentMatch("batch_history", {"batch_code": batch})
+            if re.search(r"\ball (the )?status(es)?\b", q):
+                return IntentMatch("batch_statuses", {"batch_code": batch})
+            if re.search(r"\bdepartments?\b", q):
+                if status:
+                    return IntentMatch("batch_status_department", {"batch_code": batch, "status": status})
+                return IntentMatch("batch_department", {"batch_code": batch})
+            if re.search(r"\bproduct\b", q):
+                return IntentMatch("batch_product", {"batch_code": batch})
+            if status and re.search(r"^\s*when\b", q):
+                return IntentMatch("batch_status_time", {"batch_code": batch, "status": status})
+            if status and re.search(r"^\s*who\b|\bwhich (employee|person)\b", q):
+                return IntentMatch("batch_actor", {"batch_code": batch, "status": status})
+            if not status and re.search(r"^\s*where is\b|\b(current|latest) status\b|\bstatus of\b", q):
+                return IntentMatch("batch_status", {"batch_code": batch})
+            return None
+
+        if not status and self._unmapped_verb(question, spans):
+            return None
+
+        if re.search(r"\bbatch(es)?\b", q):
+            if "product" in e and not status:
+                return IntentMatch("product_batches", {"product": e["product"]})
+            if "employee" in e:
+                if status:
+                    return IntentMatch("employee_status_batches", {"employee": e["employee"], "status": status})
+                return IntentMatch("employee_batches", {"employee": e["employee"]})
+            if status and len(e) == 1:
+                return IntentMatch("status_batches", {"status": status})
+
+        if "department" in e and re.search(r"\bemployees?\b", q) and len(e) == 1:
+            return IntentMatch("department_employees", {"department": e["department"]})
+
+        return None
+
+
+intent_router = IntentRouter()
+
+
+# ✅ Load (or reload) DB names when stale, then match
+async def match_intent(question: str) -> Optional[IntentMatch]:
+    await intent_router.ensure_loaded()
+    return intent_router.match(question)
@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.core import metrics
+
+# ✅ LLM call policy (overridable from .env)
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "8"))        # whole primary call, hedge included
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))       # hedge once a call is slower than this
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = 20        # no hedging until the latency window means something
+LLM_LATENCY_WINDOW = 200          # recent successful calls the quantile is taken over
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))         # consecutive failures that open it
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# ✅ Optional local fallback, used while the primary is failing: LLM_FALLBACK=ollama
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "").lower()
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "llama3.1")
+LLM_FALLBACK_DEADLINE_SECONDS = float(os.getenv("LLM_FALLBACK_DEADLINE_SECONDS", "20"))
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+
+class LLMUnavailable(Exception):
+    """The primary failed (or its circuit is open) and there is no fallback that answered."""
+
+
+class LLMProvider(ABC):
+    name = "llm"
+
+    @abstractmethod
+    async def ainvoke(self, prompt: str) -> Any:
+        ...
+
+
+class ChatModelProvider(LLMProvider):
+    """Any LangChain chat model. `factory` is called per request so a lazily built
+    (or swapped, e.g. by bench.stubs) client is always the current one."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+
+    async def ainvoke(self, prompt: str) -> Any:
+        return await self.factory().ainvoke(prompt)
+
+
+class EmbeddingProvider(LLMProvider):
+    """Any LangChain embeddings model: a question -> its vector, a list of questions -> their vectors."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+
+    async def ainvoke(self, texts: Union[str, List[str]]) -> Any:
+        if isinstance(texts, str):
+            return await self.factory().aembed_query(texts)
+        return await self.factory().aembed_documents(texts, task_type="retrieval_query")
+
+
+def ollama_provider(model: str = LLM_FALLBACK_MODEL, base_url: str = OLLAMA_BASE_URL) -> ChatModelProvider:
+    client = None
+
+    def factory():
+        nonlocal client
+        if client is None:
+            try:
+                from langchain_ollama import ChatOllama
+            except ImportError:
+                from langchain_community.chat_models import ChatOllama
+            client = ChatOllama(model=model, base_url=base_url, temperature=0)
+        return client
+
+    return ChatModelProvider(f"ollama:{model}", factory)
+
+
+def fallback_provider() -> Optional[LLMProvider]:
+    if LLM_FALLBACK == "ollama":
+        return ollama_provider()
+    if LLM_FALLBACK:
+        print(f"⚠️ Unknown LLM_FALLBACK '{LLM_FALLBACK}', running without a fallback")
+    return None
+
+
+class LatencyWindow:
+    def __init__(self, size: int = LLM_LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> one probe after the reset time (half open)."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._since = 0.0  # when it opened, or when the current probe started
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        # A probe that never reported back (e.g. its caller was cancelled) doesn't block forever
+        if time.monotonic() - self._since < self.reset_seconds:
+            return False
+        self.state = "half_open"
+        self._since = time.monotonic()
+        return True
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state == "closed":
+                self.trips += 1
+            self.state = "open"
+            self._since = time.monotonic()
+
+
+class ResilientLLM:
+    """Primary provider behind a deadline, a p95 hedge (or one retry) and a circuit breaker;
+    an optional fallback provider answers while the primary is failing."""
+
+    def __init__(self, primary: LLMProvider, fallback: Optional[LLMProvider] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyWindow()
+
+    def hedge_delay(self) -> Optional[float]:
+        if not LLM_HEDGE:
+            return None
+        p = self.latency.quantile(LLM_HEDGE_QUANTILE)
+        return None if p is None else max(p, LLM_HEDGE_MIN_SECONDS)
+
+    async def ainvoke(self, prompt: str) -> Any:
+        if self.breaker.allow():
+            try:
+                response = await self._hedged(prompt)
+            except Exception as e:
+                self.breaker.failure()
+                error: Exception = e
+            else:
+                self.breaker.success()
+                return response
+        else:
+            # ✅ Fail fast: no request waits on a provider that is known to be down
+            metrics.llm_calls.inc(self.primary.name, "short_circuit")
+            error = LLMUnavailable(f"{self.primary.name} circuit open")
+
+        if self.fallback is None:
+            if isinstance(error, LLMUnavailable):
+                raise error
+            raise LLMUnavailable(repr(error)) from error
+        try:
+            response = await asyncio.wait_for(self.fallback.ainvoke(prompt), LLM_FALLBACK_DEADLINE_SECONDS)
+        except Exception as e:
+            metrics.llm_calls.inc(self.fallback.name, "error")
+            raise LLMUnavailable(f"{self.primary.name}: {error!r}; {self.fallback.name}: {e!r}") from e
+        metrics.llm_calls.inc(self.fallback.name, "ok")
+        return response
+
+    async def _attempt(self, prompt: str):
+        start = time.perf_counter()
+        response = await self.primary.ainvoke(prompt)
+        return response, time.perf_counter() - start
+
+    async def _hedged(self, prompt: str) -> Any:
+        """At most two attempts within LLM_DEADLINE_SECONDS: the second starts when the first
+        is slower than the hedge delay, or right away if the first failed. First success wins."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + LLM_DEADLINE_SECONDS
+        delay = self.hedge_delay()
+        hedge_at = started + delay if delay is not None else deadline
+
+        first = asyncio.ensure_future(self._attempt(prompt))
+        attempts = [first]
+        second = None  # "hedged" (first still running) or "retried" (first failed)
+        last_error: Optional[BaseException] = None
+        try:
+            while True:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                wait_until = deadline if second else min(hedge_at, deadline)
+                done, _ = await asyncio.wait(attempts, timeout=max(0.0, wait_until - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempts.remove(task)
+                    if task.exception() is None:
+                        response, seconds = task.result()
+                        self.latency.add(seconds)
+                        metrics.llm_calls.inc(self.primary.name, "ok" if task is first else f"{second}_won")
+                        return response
+                    last_error = task.exception()
+                    metrics.llm_calls.inc(self.primary.name, "error")
+                if not second and loop.time() < deadline and (not attempts or loop.time() >= hedge_at):
+                    second = "hedged" if attempts else "retried"
+                    metrics.llm_calls.inc(self.primary.name, second)
+                    attempts.append(asyncio.ensure_future(self._attempt(prompt)))
+                elif not attempts:
+                    raise last_error
+            metrics.llm_calls.inc(self.primary.name, "timeout")
+            raise asyncio.TimeoutError(f"{self.primary.name} exceeded {LLM_DEADLINE_SECONDS}s")
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> Dict[str, float]:
+        delay = self.hedge_delay()
+        return {
+            "breaker_open": int(self.breaker.state != "closed"),
+            "breaker_trips": self.breaker.trips,
+            "consecutive_failures": self.breaker.failures,
+            "hedge_delay_seconds": delay if delay is not None else -1,
+            "fallback_configured": int(self.fallback is not None),
+        }
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.cache import cache, schema_version
+from app.rag.intent_router import intent_router
+
+# ✅ Learned query plans: SQL that ran fine, with its entity values turned into parameters,
+# reused for any question of the same shape ("who packed {batch_code}") without the LLM
+PLAN_CACHE = os.getenv("PLAN_CACHE", "true").lower() == "true"
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", "86400"))  # from when it was (re)learned; hits don't extend it
+
+_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+_WRAPS = ("", "%")  # a value may be used as is, or as a LIKE pattern '%value%'
+
+
+def question_shape(question: str) -> Tuple[str, Dict[str, str]]:
+    """("When was ABC-012025-A stored?") -> ("when was {batch_code} {status}", {batch_code: ..., status: "Stored"})."""
+    parts, values, counts, last = [], {}, {}, 0
+    for start, end, kind, value in intent_router.spans(question):
+        counts[kind] = counts.get(kind, 0) + 1
+        name = kind if counts[kind] == 1 else f"{kind}_{counts[kind]}"
+        parts += [question[last:start], "{" + name + "}"]
+        values[name] = value
+        last = end
+    parts.append(question[last:])
+    shape = " ".join("".join(parts).lower().split()).rstrip("?.! ")
+    return shape, values
+
+
+def _cased(value: str, case: str) -> str:
+    return value.lower() if case == "lower" else value.upper() if case == "upper" else value
+
+
+def templatize(sql: str, values: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Replace each entity's string literal with a bind parameter; None if the SQL doesn't
+    use every entity as a plain literal (then the question's values can't be swapped safely)."""
+    if not values or len({v.lower() for v in values.values()}) < len(values):
+        return None
+    params: Dict[str, List[str]] = {}  # parameter -> [entity, wrap, case]
+
+    def substitute(literal: re.Match) -> str:
+        text = literal.group(1).replace("''", "'")
+        for name, value in values.items():
+            for wrap in _WRAPS:
+                for case in ("", "lower", "upper"):
+                    if text == wrap + _cased(value, case) + wrap:
+                        param = "_".join(p for p in ("p", name, "like" if wrap else "", case) if p)
+                        params[param] = [name, wrap, case]
+                        return f":{param}"
+        if any(value.lower() in text.lower() for value in values.values()):
+            raise ValueError(text)  # the value is baked into some other literal
+        return literal.group(0)
+
+    try:
+        template = _LITERAL.sub(substitute, sql)
+    except ValueError:
+        return None
+    if {name for name, _, _ in params.values()} != set(values):
+        return None
+    return {"sql": template, "params": params}
+
+
+class PlanCache:
+    """Redis keys of question shape -> parameterized SQL, shared by all workers.
+
+    Only SQL that passed the schema validator and returned rows is learned. Each plan
+    expires PLAN_CACHE_TTL after it was learned, and a later LLM answer for the same shape
+    replaces it, so a plausible-but-wrong query is not pinned for good. A plan that fails
+    to execute is forgotten at once, and a schema change moves to fresh keys.
+    """
+
+    def __init__(self, ttl: int = PLAN_CACHE_TTL):
+        self.ttl = ttl
+        self.prefix = f"plan:{schema_version()}"
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.forgotten = 0
+
+    async def lookup(self, question: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if not PLAN_CACHE:
+            return None
+        shape, values = question_shape(question)
+        if not values:
+            return None  # nothing to substitute: the exact-question SQL cache covers it
+        with metrics.timed("redis_plan_get"):
+            raw = await cache.get(self._key(shape))
+        metrics.record_cache("plan", bool(raw))
+        if not raw:
+            self.misses += 1
+            return None
+        self.hits += 1
+        plan = json.loads(raw)
+        params = {param: wrap + _cased(values[name], case) + wrap
+                  for param, (name, wrap, case) in plan["params"].items()}
+        return plan["sql"], params
+
+    async def learn(self, question: str, sql: str) -> bool:
+        if not PLAN_CACHE:
+            return False
+        shape, values = question_shape(question)
+        plan = templatize(sql, values)
+        if plan is None:
+            return False
+        with metrics.timed("redis_plan_set"):
+            await cache.set(self._key(shape), json.dumps(plan), ex=self.ttl)
+        self.learned += 1
+        return True
+
+    async def forget(self, question: str) -> None:
+        shape, _ = question_shape(question)
+        self.forgotten += await cache.delete(self._key(shape))
+
+    def _key(self, shape: str) -> str:
+        return f"{self.prefix}:{hashlib.sha256(shape.encode()).hexdigest()}"
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "learned": self.learned,
+            "forgotten": self.forgotten,
+        }
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,187 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from sqlalchemy import MetaData
+
+# ✅ Compiled once; str.format per call instead of a PromptTemplate per call
+PROMPT_TEMPLATE = """
+You are an expert PostgreSQL assistant. Use only the tables, columns and joins listed below.
+
+Schema:
+{schema}
+
+Joins:
+{joins}
+
+Examples:
+{examples}
+
+Question:
+{question}
+
+Only write valid SQL using exact column and table names. Do not guess. Give lists an ORDER BY.
+
+SQL Query:
+"""
+
+# One repair round-trip: the original prompt, the rejected answer and what was wrong with it
+REPAIR_TEMPLATE = """{prompt}{sql}
+
+That query is invalid for this schema:
+{problems}
+
+Write the corrected query. Use only the tables, columns and joins listed above.
+
+SQL Query:
+"""
+
+# Entity kinds (from the intent router) -> the table that holds them
+ENTITY_TABLES = {
+    "batch_code": "batches",
+    "employee": "employees",
+    "product": "products",
+    "department": "departments",
+    "status": "batch_tracking",
+}
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+_DESCRIPTION = re.compile(r"^(Table|Column):\s*([\w\.]+)\s*-\s*(.+)$")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English + SQL: close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def repair_prompt(prompt: str, sql: str, problems: Sequence[str]) -> str:
+    return REPAIR_TEMPLATE.format(prompt=prompt, sql=sql, problems="\n".join(f"- {p}" for p in problems))
+
+
+def select_examples(vectorstore, embeddings: Sequence[Sequence[float]], k: int = 4, fetch_k: int = 20,
+                    lambda_mult: float = 0.5, kind: str = "example") -> List[List[Document]]:
+    """MMR-diverse few-shot docs for each query vector, from one vectorized FAISS search."""
+    matrix = np.array(embeddings, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        import faiss
+        faiss.normalize_L2(matrix)
+    fetch = min(fetch_k, vectorstore.index.ntotal)
+    if fetch == 0:
+        return [[] for _ in range(len(matrix))]
+    _, indices = vectorstore.index.search(matrix, fetch)
+
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+    results = []
+    for query, row in zip(matrix, indices):
+        candidates, vectors = [], []
+        for i in row:
+            if i == -1:
+                continue
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            # Untagged docs (older indexes) count as examples
+            if doc.metadata.get("kind", kind) != kind:
+                continue
+            candidates.append(doc)
+            vectors.append(vectorstore.index.reconstruct(int(i)))
+        if not candidates:
+            results.append([])
+            continue
+        chosen = maximal_marginal_relevance(query, vectors, lambda_mult=lambda_mult, k=min(k, len(candidates)))
+        results.append([candidates[j] for j in chosen])
+    return results
+
+
+class PromptBuilder:
+    """Prompt with only the tables a question touches (plus FK join paths), and few-shot
+    examples added in relevance order until the token budget is spent."""
+
+    def __init__(self, metadata: MetaData, schema_docs: Iterable[Document] = (),
+                 table_hints: Optional[Dict[str, str]] = None, token_budget: int = 600):
+        self.metadata = metadata
+        self.token_budget = token_budget
+        self.table_hints = {t: re.compile(p, re.IGNORECASE) for t, p in (table_hints or {}).items()}
+
+        self.descriptions: Dict[str, str] = {}
+        for doc in schema_docs:
+            found = _DESCRIPTION.match(doc.page_content.strip())
+            if found and found.group(1) == "Table":
+                self.descriptions[found.group(2)] = found.group(3).strip()
+
+        # Undirected FK graph: table -> [(neighbour, "a.x = b.y")]
+        self.graph: Dict[str, List[Tuple[str, str]]] = {name: [] for name in metadata.tables}
+        for table in metadata.tables.values():
+            for fk in table.foreign_keys:
+                target = fk.column.table.name
+                condition = f"{table.name}.{fk.parent.name} = {target}.{fk.column.name}"
+                self.graph[table.name].append((target, condition))
+                self.graph[target].append((table.name, condition))
+        # Rendered once per table: "batches(id, batch_code, product_id -> products.id) -- Contains batch data"
+        self.table_lines = {name: self._render_table(table) for name, table in metadata.tables.items()}
+
+    def _render_table(self, table) -> str:
+        columns = []
+        for column in table.columns:
+            fks = [f"{column.name} -> {fk.column.table.name}.{fk.column.name}" for fk in column.foreign_keys]
+            columns.append(fks[0] if fks else column.name)
+        line = f"{table.name}({', '.join(columns)})"
+        description = self.descriptions.get(table.name)
+        return f"{line} -- {description}" if description else line
+
+    def tables_for(self, question: str, entities: Dict[str, str], examples: Sequence[Document]) -> List[str]:
+        tables: Set[str] = {ENTITY_TABLES[kind] for kind in entities if kind in ENTITY_TABLES}
+        tables |= {t for t, pattern in self.table_hints.items() if pattern.search(question)}
+        # ...and whatever the most relevant example joins, so its pattern is usable
+        for doc in examples[:1]:
+            tables |= {name.lower() for name in _TABLE_REF.findall(doc.page_content)}
+        tables &= set(self.metadata.tables)
+        # Nothing recognisable: fall back to the whole schema
+        return sorted(tables) if tables else sorted(self.metadata.tables)
+
+    def join_paths(self, tables: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """Connect the tables along shortest FK paths (BFS). Returns (tables incl. bridges, join conditions)."""
+        if not tables:
+            return [], []
+        connected, joins = {tables[0]}, []
+        for target in tables[1:]:
+            if target in connected:
+                continue
+            parent: Dict[str, Tuple[Optional[str], Optional[str]]] = {t: (None, None) for t in connected}
+            queue = deque(connected)
+            while queue and target not in parent:
+                current = queue.popleft()
+                for neighbour, condition in self.graph.get(current, []):
+                    if neighbour not in parent:
+                        parent[neighbour] = (current, condition)
+                        queue.append(neighbour)
+            if target not in parent:
+                connected.add(target)  # no FK path; listed without a join
+                continue
+            node = target
+            while node not in connected:
+                previous, condition = parent[node]
+                connected.add(node)
+                if condition not in joins:
+                    joins.append(condition)
+                node = previous
+        return sorted(connected), joins
+
+    def build(self, question: str, examples: Sequence[Document], entities: Dict[str, str]) -> str:
+        tables, joins = self.join_paths(self.tables_for(question, entities, examples))
+        fields = {
+            "schema": "\n".join(self.table_lines[t] for t in tables),
+            "joins": "\n".join(joins) or "(none needed)",
+            "question": question,
+        }
+        # Schema for the touched tables is always included; examples fill what is left
+        remaining = self.token_budget - estimate_tokens(PROMPT_TEMPLATE.format(examples="", **fields))
+        chosen = []
+        for doc in examples:
+            line = doc.page_content.strip()
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                break
+            chosen.append(line)
+            remaining -= cost
+        return PROMPT_TEMPLATE.format(examples="\n".join(chosen), **fields)
@@ -1,38 +1,39 @@
 import os
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
 import re
+from typing import List, Optional
 
-# ✅ LangChain & Gemini
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain.text_splitter import CharacterTextSplitter
+# ✅ LangChain (Gemini, FAISS and the splitter are imported lazily inside the accessors below)
 from langchain.docstore.document import Document
-from langchain.prompts import PromptTemplate
+
+from app.core.database import Base
+from app.rag.intent_router import intent_router
+from app.rag.llm_provider import ChatModelProvider, EmbeddingProvider, LLMUnavailable, ResilientLLM, fallback_provider
+from app.rag.prompt_builder import PromptBuilder, estimate_tokens, repair_prompt, select_examples
+from app.rag.semantic_cache import SemanticSQLCache, entity_key
+from app.rag.vector_index import load_or_update_index
+from app.core import metrics
+from app.core.sql_validator import SchemaValidator
 
 # ✅ Load API key from .env
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# ✅ Initialize Gemini Pro LLM and Embedding Model
-llm = ChatGoogleGenerativeAI(
-    model="models/gemini-1.5-flash",
-    google_api_key=GOOGLE_API_KEY
-)
-
-embedding_model = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
-    google_api_key=GOOGLE_API_KEY
-)
-
 # ✅ Few-shot examples: Natural language to SQL pairs
 examples = [
 
-    # 🟦 Basic status queries
+    # 🟦 Basic status queries (current status comes from the batch_latest_status projection)
     ("Where is batch VDT-052025-A?",
-     "SELECT status FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id WHERE batches.batch_code = 'VDT-052025-A' ORDER BY timestamp DESC LIMIT 1;"),
+     "SELECT batch_latest_status.status FROM batch_latest_status JOIN batches ON batch_latest_status.batch_id = batches.id WHERE batches.batch_code = 'VDT-052025-A';"),
 
     ("What is the current status of batch PRG-052025-B?",
-     "SELECT status FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id WHERE batches.batch_code = 'PRG-052025-B' ORDER BY timestamp DESC LIMIT 1;"),
+     "SELECT batch_latest_status.status FROM batch_latest_status JOIN batches ON batch_latest_status.batch_id = batches.id WHERE batches.batch_code = 'PRG-052025-B';"),
+
+    ("Which batches are currently Stored?",
+     "SELECT batches.batch_code FROM batch_latest_status JOIN batches ON batch_latest_status.batch_id = batches.id WHERE batch_latest_status.status = 'Stored';"),
 
     ("What are all the statuses for batch VDT-052025-A in order?",
      "SELECT status FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id WHERE batches.batch_code = 'VDT-052025-A' ORDER BY timestamp;"),
@@ -94,9 +95,9 @@ examples = [
      "SELECT employees.name FROM employees JOIN departments ON employees.department_id = departments.id WHERE departments.name = 'Storage';"),
 ]
 
-docs = [Document(page_content=f"{q.strip()} => {s.strip()}") for q, s in examples]
+docs = [Document(page_content=f"{q.strip()} => {s.strip()}", metadata={"kind": "example"}) for q, s in examples]
 
-# ✅ Schema Metadata for FAISS
+# ✅ Schema descriptions (table descriptions are shown in the prompt's schema section)
 schema_metadata = [
     Document(page_content="Table: departments - Stores department info"),
     Document(page_content="Column: departments.id - Unique department ID"),
@@ -124,18 +125,137 @@ schema_metadata = [
     Document(page_content="Column: batch_tracking.department_id - FK to department"),
     Document(page_content="Column: batch_tracking.employee_id - FK to employee"),
     Document(page_content="Column: batch_tracking.timestamp - Time of update"),
+
+    Document(page_content="Table: batch_latest_status - Current (latest) status of each batch, one row per batch; use for current status questions"),
+    Document(page_content="Column: batch_latest_status.batch_id - FK to batch (primary key)"),
+    Document(page_content="Column: batch_latest_status.status - Latest stage of the batch"),
+    Document(page_content="Column: batch_latest_status.department_id - FK to department of the latest update"),
+    Document(page_content="Column: batch_latest_status.employee_id - FK to employee of the latest update"),
+    Document(page_content="Column: batch_latest_status.timestamp - Time of the latest update"),
 ]
 
-# ✅ FAISS: Load if exists, else build and save
-text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-index_path = "faiss_index"
+# ✅ Prompt size: only the tables a question touches + MMR-picked examples, within a token budget
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "450"))
+PROMPT_EXAMPLES_K = int(os.getenv("PROMPT_EXAMPLES_K", "3"))
+PROMPT_FETCH_K = int(os.getenv("PROMPT_FETCH_K", "12"))        # candidates MMR picks from
+PROMPT_MMR_LAMBDA = float(os.getenv("PROMPT_MMR_LAMBDA", "0.6"))  # 1 = pure relevance, 0 = pure diversity
+
+# Question wording -> tables it implies (entities like batch codes and names are mapped in prompt_builder)
+TABLE_HINTS = {
+    "batch_latest_status": r"\b(current(ly)?|latest|now|where is)\b",
+    "batch_tracking": r"\b(history|timeline|status(es)?|when|who|handled|involved|worked)\b",
+    "employees": r"\b(who|employees?|staff|person)\b",
+    "departments": r"\bdepartments?\b",
+    "products": r"\bproducts?\b",
+    "batches": r"\bbatch(es)?\b",
+}
+
+prompt_builder = PromptBuilder(Base.metadata, schema_metadata, TABLE_HINTS, PROMPT_TOKEN_BUDGET)
 
-if os.path.exists(index_path):
-    vectorstore = FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
-else:
-    texts = text_splitter.split_documents(docs + schema_metadata)
-    vectorstore = FAISS.from_documents(texts, embedding_model)
-    vectorstore.save_local(index_path)
+# ✅ Generated SQL is checked against the same metadata before it is returned (one repair attempt)
+sql_validator = SchemaValidator(Base.metadata)
+
+index_path = "faiss_index"
+# Per-document embeddings keyed by text hash; survives deleting the index folder
+embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", "faiss_embedding_cache.json")
+
+# ================================
+#  Lazy clients: nothing touches the network (or imports Gemini/FAISS) until first use
+# ================================
+_llm = None
+_embedding_model = None
+_vectorstore = None
+# One lock per client so a slow index build never blocks getting the LLM
+_llm_lock = threading.Lock()
+_embedding_lock = threading.Lock()
+_vectorstore_lock = threading.Lock()
+
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                _llm = ChatGoogleGenerativeAI(
+                    model="models/gemini-1.5-flash",
+                    google_api_key=GOOGLE_API_KEY
+                )
+    return _llm
+
+
+# ✅ Every LLM call goes through this: deadline, p95 hedging, circuit breaker, optional local fallback.
+# The provider resolves get_llm() per call, so the lazy (or stubbed) client is always used.
+llm = ResilientLLM(ChatModelProvider("gemini", get_llm), fallback_provider())
+
+# Returned instead of SQL when no LLM could answer; the routes turn it into a "try again" reply
+LLM_UNAVAILABLE = "-- ERROR: LLM unavailable"
+# First line of SQL borrowed from a similar cached question while no LLM could answer;
+# the routes strip it, say the answer is approximate, and never cache or learn that SQL
+APPROXIMATE = "-- APPROXIMATE: LLM unavailable, SQL of a similar question\n"
+# First line of SQL that already had its one repair round-trip (validator or database errors)
+REPAIRED = "-- REPAIRED\n"
+
+
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                _embedding_model = GoogleGenerativeAIEmbeddings(
+                    model="models/embedding-001",
+                    google_api_key=GOOGLE_API_KEY
+                )
+    return _embedding_model
+
+
+# ✅ Query embeddings get the same deadline, hedging and (their own) circuit breaker as the LLM.
+# No fallback: another model's vectors wouldn't match the FAISS index or the semantic cache.
+embedder = ResilientLLM(EmbeddingProvider("gemini-embedding", get_embedding_model))
+
+
+# ✅ FAISS: load if the stored fingerprint matches, else embed only what changed and update
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        embedding_model = get_embedding_model()
+        with _vectorstore_lock:
+            if _vectorstore is None:
+                from langchain.text_splitter import CharacterTextSplitter
+                text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=0)
+                # Only the few-shot pairs are retrieved; the schema comes from the models' metadata
+                texts = text_splitter.split_documents(docs)
+                _vectorstore = load_or_update_index(texts, embedding_model, index_path, embedding_cache_path)
+    return _vectorstore
+
+
+async def aget_vectorstore():
+    # Loading/building the index is blocking file + network I/O: keep it off the event loop
+    if _vectorstore is not None:
+        return _vectorstore
+    return await asyncio.to_thread(get_vectorstore)
+
+
+def is_ready() -> bool:
+    return _vectorstore is not None and _llm is not None
+
+
+# ✅ Optional warm-up (called in the background at FastAPI startup)
+async def warm_up() -> None:
+    await aget_vectorstore()
+    await asyncio.to_thread(get_llm)
+
+# ✅ Bulk questions (/chat/batch): LLM calls in flight at once
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# ✅ Second cache tier: similar question + same entities -> reuse generated SQL
+semantic_cache = SemanticSQLCache(
+    capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1024")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+)
+# While the LLM is unavailable, a somewhat less similar question (same entities) may reuse cached SQL
+SEMANTIC_CACHE_DEGRADED_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_DEGRADED_THRESHOLD", "0.85"))
 
 # ✅ Helper to clean LLM output
 def clean_sql_response(response_text: str) -> str:
@@ -154,37 +274,155 @@ def clean_sql_response(response_text: str) -> str:
 
     return " ".join(sql_only) if sql_only else "-- No valid SQL found"
 
-# ✅ Main callable used by FastAPI route
-def get_sql_from_question(question: str) -> str:
-    relevant_docs = vectorstore.similarity_search(question)
-    context = "\n".join([doc.page_content.strip() for doc in relevant_docs])
-
-    prompt = PromptTemplate(
-        input_variables=["context", "question"],
-        template="""
-You are an expert SQL assistant. Use only the column and table names provided in the examples and schema.
-
-Examples:
-{context}
-
-Question:
-{question}
-
-Only write valid SQL using exact column and table names. Do not guess.
-
-SQL Query:
-"""
-
-    )
-
-    final_prompt = prompt.format(context=context, question=question)
-
+# ✅ Prompt assembly shared by the sync and async callables
+def build_prompt(question: str, relevant_docs) -> str:
+    final_prompt = prompt_builder.build(question, relevant_docs, intent_router.extract(question))
+    metrics.llm_tokens.observe(estimate_tokens(final_prompt), "prompt_estimate")
+    return final_prompt
+
+# ✅ Few-shot pairs for each query vector: one vectorized FAISS search, then MMR for diversity
+def _select_examples(vectorstore, embeddings) -> List[list]:
+    return select_examples(vectorstore, embeddings, PROMPT_EXAMPLES_K, PROMPT_FETCH_K, PROMPT_MMR_LAMBDA)
+
+# ✅ LLM down (breaker open, deadline missed, fallback failed): a near-enough cached SQL beats no answer
+def _degraded(embedding, entities, error: Exception) -> str:
+    if embedding is None:
+        return f"{LLM_UNAVAILABLE}\n-- Reason: {error}"
+    cached_sql = semantic_cache.lookup(embedding, entities, threshold=SEMANTIC_CACHE_DEGRADED_THRESHOLD)
+    metrics.record_cache("semantic_degraded", bool(cached_sql))
+    return APPROXIMATE + cached_sql if cached_sql else f"{LLM_UNAVAILABLE}\n-- Reason: {error}"
+
+async def _acomplete(prompt: str) -> str:
+    start = time.perf_counter()
+    response = await llm.ainvoke(prompt)
+    metrics.llm_seconds.observe(time.perf_counter() - start)
+    metrics.stage_seconds.observe(time.perf_counter() - start, "llm")
+    metrics.record_llm_usage(response)
+    with metrics.timed("clean_sql"):
+        return clean_sql_response(response.content)
+
+# ✅ Prompt -> LLM -> cleaned, schema-checked SQL (stored in the semantic cache on success)
+async def _agenerate_sql(question: str, embedding, entities, relevant_docs) -> str:
+    with metrics.timed("prompt_build"):
+        final_prompt = build_prompt(question, relevant_docs)
+    sql_query = await _acomplete(final_prompt)
+    if sql_query.startswith("--"):
+        return sql_query
+
+    with metrics.timed("sql_validate"):
+        problems = sql_validator.problems(sql_query)
+    if problems:
+        # One targeted retry with the problems fed back; never a loop
+        metrics.sql_failures.inc("schema")
+        sql_query = await _acomplete(repair_prompt(final_prompt, sql_query, problems))
+        with metrics.timed("sql_validate"):
+            problems = [] if sql_query.startswith("--") else sql_validator.problems(sql_query)
+        metrics.sql_repairs.inc("failed" if problems or sql_query.startswith("--") else "fixed")
+        if problems:
+            return "-- ERROR: invalid SQL\n-- " + "\n-- ".join(problems)
+        if sql_query.startswith("--"):
+            return sql_query
+        sql_query = REPAIRED + sql_query
+    if embedding is not None:
+        semantic_cache.store(embedding, entities, sql_query)
+    return sql_query
+
+# ✅ SQL that passed the validator but failed at EXPLAIN or execution: the same one repair
+# round-trip, with the database's error as the problem. The prompt is schema-only (no second
+# embedding call); None when the LLM can't fix it.
+async def arepair_sql(question: str, sql: str, error: str) -> Optional[str]:
+    with metrics.timed("prompt_build"):
+        final_prompt = build_prompt(question, [])
+    try:
+        sql_query = await _acomplete(repair_prompt(final_prompt, sql, [error]))
+    except Exception as e:
+        print(f"⚠️ SQL repair failed: {e}")
+        return None
+    with metrics.timed("sql_validate"):
+        if sql_query.startswith("--") or sql_validator.problems(sql_query):
+            return None
+    return REPAIRED + sql_query
+
+# ✅ Embeddings down or too slow: no semantic cache, no examples; the LLM (or its fallback) gets schema only
+async def _aembed(texts):
     try:
-        response = llm.invoke(final_prompt)
-        sql_query = response.content
-        return clean_sql_response(sql_query)
+        return await embedder.ainvoke(texts)
+    except LLMUnavailable:
+        metrics.sql_failures.inc("embedding_unavailable")
+        return None
+
+# ✅ Async variant: embedding, FAISS lookup and LLM call never block the event loop
+async def aget_sql_from_question(question: str) -> str:
+    entities = entity_key(question, intent_router.spans(question))
+    embedding = None
+    try:
+        # One embedding serves both the semantic cache and the FAISS lookup
+        with metrics.timed("embed_query"):
+            embedding = await _aembed(question)
+        if embedding is None:
+            return await _agenerate_sql(question, None, entities, [])
+
+        with metrics.timed("semantic_cache"):
+            cached_sql = semantic_cache.lookup(embedding, entities)
+        metrics.record_cache("semantic", bool(cached_sql))
+        if cached_sql:
+            return cached_sql
+
+        vectorstore = await aget_vectorstore()
+        with metrics.timed("faiss_search"):
+            relevant_docs = _select_examples(vectorstore, [embedding])[0]
+        return await _agenerate_sql(question, embedding, entities, relevant_docs)
+    except LLMUnavailable as e:
+        metrics.sql_failures.inc("llm_unavailable")
+        return _degraded(embedding, entities, e)
     except Exception as e:
+        metrics.sql_failures.inc("llm_error")
         return f"-- ERROR: LLM failed to respond\n-- Reason: {str(e)}"
+
+# ✅ Bulk variant: one batched embedding call, one FAISS search, bounded LLM concurrency
+async def aget_sql_for_questions(questions: List[str]) -> List[str]:
+    if not questions:
+        return []
+    with metrics.timed("embed_batch"):
+        embeddings = await _aembed(questions)
+
+    results: List[str] = [""] * len(questions)
+    entities = [entity_key(q, intent_router.spans(q)) for q in questions]
+    if embeddings is None:
+        embeddings = [None] * len(questions)
+        pending = list(range(len(questions)))
+        relevant = [[] for _ in pending]
+    else:
+        pending = []
+        with metrics.timed("semantic_cache"):
+            for i, (embedding, entity_set) in enumerate(zip(embeddings, entities)):
+                cached_sql = semantic_cache.lookup(embedding, entity_set)
+                metrics.record_cache("semantic", bool(cached_sql))
+                if cached_sql:
+                    results[i] = cached_sql
+                else:
+                    pending.append(i)
+        if not pending:
+            return results
+
+        vectorstore = await aget_vectorstore()
+        with metrics.timed("faiss_search"):
+            relevant = _select_examples(vectorstore, [embeddings[i] for i in pending])
+
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def generate(i: int, relevant_docs) -> None:
+        async with semaphore:
+            try:
+                results[i] = await _agenerate_sql(questions[i], embeddings[i], entities[i], relevant_docs)
+            except LLMUnavailable as e:
+                metrics.sql_failures.inc("llm_unavailable")
+                results[i] = _degraded(embeddings[i], entities[i], e)
+            except Exception as e:
+                metrics.sql_failures.inc("llm_error")
+                results[i] = f"-- ERROR: LLM failed to respond\n-- Reason: {str(e)}"
+
+    await asyncio.gather(*(generate(i, docs) for i, docs in zip(pending, relevant)))
+    return results
 #Only respond with a valid SQL query. If no question is asked, respond with:
 #-- ERROR: Missing valid user question
-
@@ -0,0 +1,117 @@
+import re
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+EntityKey = Tuple[Tuple[str, str], ...]
+
+# Values that change the answer but barely move the embedding: "top 5" / "top 10",
+# "in 2024" / "in 2025", "in May" / "in June", "yesterday" / "last week"
+_LITERAL = re.compile(
+    r"\d+(?:[./:-]\d+)*|\b(?:january|february|march|april|may|june|july|august|september|october|"
+    r"november|december|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec|"
+    r"(?:mon|tues|wednes|thurs|fri|satur|sun)day|today|yesterday|tomorrow|tonight|"
+    r"(?:hour|day|week|month|quarter|year)s?)\b",
+    re.IGNORECASE,
+)
+
+
+def entity_key(question: str, spans: Iterable[Tuple[int, int, str, str]]) -> EntityKey:
+    """Every entity mention (IntentRouter.spans) and every number/date word, left to right."""
+    key, last = [], 0
+    for start, end, kind, value in spans:
+        key += [("literal", m.group().lower()) for m in _LITERAL.finditer(question, last, start)]
+        key.append((kind, value))
+        last = end
+    key += [("literal", m.group().lower()) for m in _LITERAL.finditer(question, last)]
+    return tuple(key)
+
+
+class SemanticSQLCache:
+    """Question-embedding -> SQL cache.
+
+    An entry is reused only when the new question carries exactly the same
+    entity key (every batch code, name and status it mentions, plus numbers
+    and dates; see entity_key) and its embedding is within `threshold` cosine
+    similarity of the cached question. Entries are grouped by entity key so a
+    lookup only compares against a handful of vectors.
+    """
+
+    def __init__(self, capacity: int = 1024, threshold: float = 0.92):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._ids = count()
+        self._lock = threading.Lock()
+        # entry id -> (entity key, unit vector, sql); order is LRU -> MRU
+        self._entries: "OrderedDict[int, Tuple[EntityKey, np.ndarray, str]]" = OrderedDict()
+        self._groups: Dict[EntityKey, Dict[int, None]] = {}
+        self._matrices: Dict[EntityKey, Tuple[list, np.ndarray]] = {}
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _matrix(self, key: EntityKey) -> Tuple[list, np.ndarray]:
+        if key not in self._matrices:
+            ids = list(self._groups[key])
+            self._matrices[key] = (ids, np.stack([self._entries[i][1] for i in ids]))
+        return self._matrices[key]
+
+    def _remove(self, entry_id: int) -> None:
+        key, _, _ = self._entries.pop(entry_id)
+        group = self._groups[key]
+        del group[entry_id]
+        if not group:
+            del self._groups[key]
+        self._matrices.pop(key, None)
+
+    def lookup(self, embedding, entities: EntityKey, threshold: Optional[float] = None) -> Optional[str]:
+        with self._lock:
+            if entities not in self._groups:
+                self.misses += 1
+                return None
+            ids, matrix = self._matrix(entities)
+            scores = matrix @ self._unit(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < (self.threshold if threshold is None else threshold):
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id][2]
+
+    def store(self, embedding, entities: EntityKey, sql: str) -> None:
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (entities, self._unit(embedding), sql)
+            self._groups.setdefault(entities, {})[entry_id] = None
+            self._matrices.pop(entities, None)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def discard(self, sql: str) -> None:
+        # Drop every entry that produced SQL which later failed to execute
+        with self._lock:
+            for entry_id in [i for i, (_, _, s) in self._entries.items() if s == sql]:
+                self._remove(entry_id)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+import asyncio
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core import metrics
+from app.core.database import engine
+from app.core.live_feed import live_feed
+from app.rag.intent_router import IntentMatch
+
+# ✅ In-process batch timelines: the hot single-batch intents answered from memory, no SQL
+TIMELINE_INDEX = os.getenv("TIMELINE_INDEX", "true").lower() == "true"
+TIMELINE_MAX_ROWS = int(os.getenv("TIMELINE_MAX_ROWS", "2000000"))       # ~160 MB; beyond this the index turns itself off
+TIMELINE_RELOAD_SECONDS = int(os.getenv("TIMELINE_RELOAD_SECONDS", "900"))  # picks up updates/deletes (feed is inserts only)
+TIMELINE_RETRY_SECONDS = 5
+LOAD_CHUNK_ROWS = 50_000
+
+EPOCH = datetime(1970, 1, 1)
+_INT_BYTES = sys.getsizeof(2 ** 20)  # a batch number stored as a dict value
+
+# Every tracking row with its names resolved, in insert order. LEFT JOINs keep rows with no
+# employee/department/product for the status answers; the answers that name one of those drop
+# such rows, as INTENT_SQL's inner joins do
+_LOAD_SQL = text(
+    "SELECT batch_tracking.id, batches.batch_code, products.name AS product, batch_tracking.status, "
+    "employees.name AS employee, departments.name AS department, batch_tracking.timestamp "
+    "FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+    "LEFT JOIN products ON batches.product_id = products.id "
+    "LEFT JOIN employees ON batch_tracking.employee_id = employees.id "
+    "LEFT JOIN departments ON batch_tracking.department_id = departments.id "
+    "ORDER BY batch_tracking.id"
+)
+
+
+class IndexTooLarge(Exception):
+    pass
+
+
+def _contains(ids: array, tracking_id: int) -> bool:
+    i = bisect_left(ids, tracking_id)
+    return i < len(ids) and ids[i] == tracking_id
+
+
+def _micros(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is None:
+        return 0
+    return (value.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+
+
+def _datetime(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class Timelines:
+    """Column arrays: 24 bytes per tracking row plus ~140 per batch (code string, dict slot,
+    batch number), i.e. ~80 MB per million rows at the usual 2.5 rows per batch.
+
+    Names (status, employee, department, product) are interned into one list, so a row is
+    five machine ints. Each batch's rows form a linked list through `prev`, newest first.
+    Batches with an updated/deleted row are `stale` (answered by SQL) until the next reload.
+    """
+
+    __slots__ = ("slot", "head", "product", "status", "employee", "department", "micros", "prev",
+                 "names", "name_ids", "code_bytes", "stale")
+
+    def __init__(self):
+        self.slot: Dict[str, int] = {}  # batch code -> batch number
+        # per batch
+        self.head = array("i")          # its newest row (-1: none)
+        self.product = array("i")       # name id
+        # per row
+        self.status = array("i")
+        self.employee = array("i")
+        self.department = array("i")
+        self.micros = array("q")        # timestamp, microseconds since 1970
+        self.prev = array("i")          # previous row of the same batch (-1: first)
+        self.names: List[Optional[str]] = []
+        self.name_ids: Dict[Optional[str], int] = {}
+        self.code_bytes = 0
+        self.stale: set = set()
+
+    def intern(self, name: Optional[str]) -> int:
+        i = self.name_ids.get(name)
+        if i is None:
+            i = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def add(self, tracking_id: int, code: str, product, status, employee, department, timestamp) -> None:
+        batch = self.slot.get(code)
+        if batch is None:
+            batch = self.slot[code] = len(self.head)
+            self.head.append(-1)
+            self.product.append(self.intern(product))
+            self.code_bytes += sys.getsizeof(code)
+        row = len(self.status)
+        self.status.append(self.intern(status))
+        self.employee.append(self.intern(employee))
+        self.department.append(self.intern(department))
+        self.micros.append(_micros(timestamp))
+        self.prev.append(self.head[batch])
+        self.head[batch] = row
+
+    def rows(self, code: str) -> Optional[List[int]]:
+        """Row numbers of one batch in timeline order (timestamp, then insert order), or None if unknown."""
+        batch = self.slot.get(code)
+        if batch is None or code in self.stale:
+            return None
+        rows, row = [], self.head[batch]
+        while row != -1:
+            rows.append(row)
+            row = self.prev[row]
+        rows.sort(key=lambda r: (self.micros[r], r))
+        return rows
+
+    def nbytes(self) -> int:
+        arrays = (self.head, self.product, self.status, self.employee, self.department, self.micros, self.prev)
+        return (sum(a.buffer_info()[1] * a.itemsize for a in arrays) + sys.getsizeof(self.slot)
+                + self.code_bytes + len(self.slot) * _INT_BYTES
+                + sys.getsizeof(self.name_ids) + sys.getsizeof(self.names))
+
+
+def _status(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    return [{"status": t.names[t.status[rows[-1]]]}] if rows else []
+
+
+def _named(t: Timelines, rows: List[int], *columns: array) -> List[int]:
+    # Rows where every given name column is set (INNER JOIN on those tables)
+    return [r for r in rows if all(t.names[column[r]] is not None for column in columns)]
+
+
+def _history(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    return [{"employee": t.names[t.employee[r]], "department": t.names[t.department[r]],
+             "status": t.names[t.status[r]], "timestamp": _datetime(t.micros[r])}
+            for r in _named(t, rows, t.employee, t.department)]
+
+
+def _statuses(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    return [{"status": t.names[t.status[r]]} for r in rows]
+
+
+def _with_status(t: Timelines, rows: List[int], status: str) -> List[int]:
+    wanted = t.name_ids.get(status, -1)
+    return [r for r in rows if t.status[r] == wanted]
+
+
+def _actor(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    return [{"name": t.names[t.employee[r]]}
+            for r in _named(t, _with_status(t, rows, params["status"]), t.employee)]
+
+
+def _status_time(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    matching = _with_status(t, rows, params["status"])
+    return [{"timestamp": _datetime(t.micros[matching[-1]])}] if matching else []
+
+
+def _departments(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    # Sorted, like INTENT_SQL's ORDER BY departments.name
+    return [{"name": name} for name in sorted({t.names[t.department[r]] for r in _named(t, rows, t.department)})]
+
+
+def _status_department(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    return [{"name": t.names[t.department[r]]}
+            for r in _named(t, _with_status(t, rows, params["status"]), t.department)]
+
+
+def _product(t: Timelines, rows: List[int], params) -> List[Dict[str, Any]]:
+    name = t.names[t.product[t.slot[params["batch_code"]]]]
+    return [{"name": name}] if name is not None else []
+
+
+# Intent -> rows shaped exactly like INTENT_SQL's result
+ANSWERS = {
+    "batch_status": _status,
+    "batch_history": _history,
+    "batch_statuses": _statuses,
+    "batch_actor": _actor,
+    "batch_status_time": _status_time,
+    "batch_department": _departments,
+    "batch_status_department": _status_department,
+    "batch_product": _product,
+}
+
+
+class TimelineIndex:
+    """Loaded once at startup, then appended to from the live feed (LISTEN/NOTIFY).
+
+    Lookups only answer while the index is known to be complete: before the first load,
+    after the feed connection drops (until reloaded) or past TIMELINE_MAX_ROWS, callers
+    get None and use SQL. Batches it has not seen also fall through to SQL.
+    """
+
+    def __init__(self, max_rows: int = TIMELINE_MAX_ROWS):
+        self.max_rows = max_rows
+        self.ready = False
+        self.error: Optional[str] = None
+        self.oversized = False
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._data = Timelines()
+        self._buffer: Optional[List[Dict[str, Any]]] = None  # events seen while a load is running
+        self._listening = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()  # set when the index stops being ready between reloads
+
+    # ================================
+    #  Loading
+    # ================================
+    def _read_all(self) -> Tuple[Timelines, array]:
+        """The snapshot, plus the tracking ids it contains (ascending; only kept for the replay)."""
+        data, ids = Timelines(), array("q")
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=LOAD_CHUNK_ROWS).execute(_LOAD_SQL)
+            for partition in result.partitions():
+                for row in partition:
+                    data.add(*row)
+                    ids.append(row[0])
+                if len(data.status) > self.max_rows:
+                    raise IndexTooLarge(f"more than TIMELINE_MAX_ROWS={self.max_rows} tracking rows")
+        return data, ids
+
+    async def load(self) -> None:
+        """(Re)build from the database; events that arrive meanwhile are replayed on top."""
+        async with self._lock:
+            if not self._listening:
+                live_feed.add_listener(self._on_event, self._on_lost)
+                self._listening = True
+            # Listen before reading, so nothing committed during the read is missed
+            await live_feed.ensure_listening()
+            self._buffer = []
+            started = time.perf_counter()
+            try:
+                data, ids = await asyncio.to_thread(self._read_all)
+            except BaseException as e:
+                self._buffer = None
+                self.ready = False
+                self.error = f"{type(e).__name__}: {e}"
+                self.oversized = isinstance(e, IndexTooLarge)
+                self._data = Timelines()
+                raise
+            for event in self._buffer:
+                # Inserts the read already saw are skipped; updates/deletes always apply. Ids come
+                # from a sequence, not commit order: a lower id can commit after the snapshot
+                if event.get("op", "INSERT") != "INSERT" or not _contains(ids, event.get("id", 0)):
+                    self._apply(data, event)
+            self._data, self._buffer = data, None
+            self.ready, self.error, self.oversized, self.loaded_at = True, None, False, time.monotonic()
+            print(f"✅ Timeline index: {len(data.status)} rows, {len(data.slot)} batches, "
+                  f"{data.nbytes() / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+
+    async def start(self) -> None:
+        """Startup: first load, plus the background reloads (which also retry a failed first load)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+        await self.load()
+
+    async def _maintain(self) -> None:
+        # Periodic full reload (UPDATE/DELETE aren't on the feed); quick retries while it is down
+        while True:
+            quick = not self.ready and not self.oversized
+            try:
+                await asyncio.wait_for(self._wake.wait(), TIMELINE_RETRY_SECONDS if quick else TIMELINE_RELOAD_SECONDS)
+                self._wake.clear()
+                continue  # e.g. the feed dropped mid-sleep: wait again, on the quick-retry interval
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"⚠️ Timeline index reload failed: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ================================
+    #  Live updates
+    # ================================
+    def _apply(self, data: Timelines, event: Dict[str, Any]) -> None:
+        if not event.get("batch_code"):
+            return
+        if event.get("op", "INSERT") != "INSERT":
+            data.stale.add(event["batch_code"])
+            return
+        data.add(event.get("id", 0), event["batch_code"], event.get("product"), event.get("status"),
+                 event.get("employee"), event.get("department"), event.get("timestamp"))
+
+    def _on_event(self, event: Dict[str, Any]) -> None:
+        if self._buffer is not None:
+            self._buffer.append(event)
+        if not self.ready:
+            return
+        if len(self._data.status) >= self.max_rows:
+            self.ready, self.oversized = False, True
+            self.error = f"grew past TIMELINE_MAX_ROWS={self.max_rows}"
+            self._data = Timelines()
+            return
+        self._apply(self._data, event)
+
+    def _on_lost(self) -> None:
+        # Inserts during the outage never reach us: stop answering until the next reload
+        self.ready = False
+        self._wake.set()
+
+    # ================================
+    #  Lookups
+    # ================================
+    def answer(self, intent: IntentMatch) -> Optional[List[Dict[str, Any]]]:
+        """Rows for a single-batch intent, or None when the index can't vouch for the answer."""
+        handler = ANSWERS.get(intent.name)
+        code = intent.params.get("batch_code")
+        if handler is None or code is None or not self.ready:
+            return None
+        data = self._data
+        rows = data.rows(code)
+        metrics.record_cache("timeline", rows is not None)
+        if rows is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return handler(data, rows, intent.params)
+
+    def stats(self) -> Dict[str, float]:
+        data = self._data
+        return {
+            "ready": int(self.ready),
+            "rows": len(data.status),
+            "batches": len(data.slot),
+            "stale_batches": len(data.stale),
+            "bytes": data.nbytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+timeline_index = TimelineIndex()
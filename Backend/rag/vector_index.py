@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+from typing import Dict, List
+
+from langchain.docstore.document import Document
+
+FINGERPRINT_FILE = "fingerprint.json"
+
+
+def _sha(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _model_name(embedding_model) -> str:
+    return getattr(embedding_model, "model", type(embedding_model).__name__)
+
+
+def doc_id(doc: Document) -> str:
+    # Metadata is part of the identity: re-tagging a doc must replace it in the index
+    return _sha(doc.page_content, json.dumps(doc.metadata, sort_keys=True, default=str))
+
+
+def fingerprint(documents: List[Document], embedding_model) -> str:
+    return _sha(_model_name(embedding_model), *sorted(doc_id(d) for d in documents))
+
+
+def _load_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json(path: str, data) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def embed_with_cache(texts: List[str], embedding_model, cache_path: str) -> List[List[float]]:
+    """Embed texts, calling the API once (batched) for only those not already cached."""
+    model = _model_name(embedding_model)
+    cache: Dict[str, List[float]] = _load_json(cache_path)
+    keys = [_sha(model, t) for t in texts]
+
+    missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in cache))
+    if missing:
+        for text, vector in zip(missing, embedding_model.embed_documents(missing)):
+            cache[_sha(model, text)] = list(vector)
+        _save_json(cache_path, cache)
+    return [cache[k] for k in keys]
+
+
+def load_or_update_index(documents: List[Document], embedding_model, index_path: str, cache_path: str):
+    """Load the FAISS index, updating it in place when `documents` changed since it was saved.
+
+    Only added/changed documents are embedded (and only if not in the embedding
+    cache); removed ones are deleted from the index. An unchanged fingerprint is
+    a plain load_local(). A different embedding model rebuilds the index from scratch:
+    its vectors can't be mixed with the stored ones (they may not even be the same size).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    current = fingerprint(documents, embedding_model)
+    model = _model_name(embedding_model)
+    stored = _load_json(os.path.join(index_path, FINGERPRINT_FILE))
+    if stored.get("fingerprint") == current:
+        return FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
+
+    wanted = {doc_id(d): d for d in documents}
+    vectorstore = None
+    if os.path.exists(index_path) and stored.get("model") == model:
+        vectorstore = FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
+        stale = [i for i in vectorstore.index_to_docstore_id.values() if i not in wanted]
+        if stale:
+            vectorstore.delete(stale)
+        present = set(vectorstore.index_to_docstore_id.values())
+        to_add = [i for i in wanted if i not in present]
+    else:
+        to_add = list(wanted)
+
+    if to_add:
+        new_docs = [wanted[i] for i in to_add]
+        vectors = embed_with_cache([d.page_content for d in new_docs], embedding_model, cache_path)
+        text_embeddings = [(d.page_content, v) for d, v in zip(new_docs, vectors)]
+        metadatas = [d.metadata for d in new_docs]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=to_add)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=to_add)
+
+    vectorstore.save_local(index_path)
+    _save_json(os.path.join(index_path, FINGERPRINT_FILE), {"fingerprint": current, "model": model, "documents": len(wanted)})
+    return vectorstore
@@ -1,86 +1,183 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from pydantic import BaseModel, Field
-from typing import Any
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.core.database import SessionLocal
-from app.rag.rag_pipeline import get_sql_from_question
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db
+from app.core import metrics
+from app.core.context_store import session_id_or_new
+from app.core.query import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BATCH_QUESTIONS, BATCH_DB_CONCURRENCY,
+    format_row, format_rows,
+)
+from app.core.sql_guard import SQLRejected
+from app.routes.resolve import (
+    APPROXIMATE_NOTE, LLM_UNAVAILABLE_REPLY, NOT_UNDERSTOOD_REPLY, UNORDERED_NOTE,
+    failed, resolve_many, resolve_sql, run_query, succeeded, with_context,
+)
 import traceback
-import redis
-import hashlib
-import re
+import asyncio
+import json
 
-# ✅ Redis setup
-cache = redis.Redis(host="localhost", port=6379, db=0)
-
-# ✅ Simple in-memory session memory
-chat_context = {
-    "last_batch_code": None,
-}
+GREETINGS = ["hello", "hi", "hey", "how are you", "thank you"]
+GREETING_REPLY = "👋 Hi! I'm your Batch Control Assistant. How can I help you today?"
 
 router = APIRouter()
 
 class Message(BaseModel):
     message: str = Field(..., alias="query")
+    page: int = Field(1, ge=1)
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
     class Config:
         validate_by_name = True
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/chat", response_model=str)
-async def chat_route(request: Message) -> Any:
+async def chat_route(request: Message, response: Response, db: AsyncSession = Depends(get_db),
+                     x_session_id: Optional[str] = Header(None)) -> Any:
     try:
         question = request.message.strip()
+        session_id, _ = session_id_or_new(x_session_id)
+        response.headers["X-Session-Id"] = session_id
 
         # ✅ Greeting detection
-        if question.lower() in ["hello", "hi", "hey", "how are you", "thank you"]:
-            return "👋 Hi! I'm your Batch Control Assistant. How can I help you today?"
-
-        # ✅ Track batch code context
-        batch_match = re.search(r'\b([A-Z]{3}-\d{6}-[A-Z])\b', question)
-        if batch_match:
-            chat_context["last_batch_code"] = batch_match.group(1)
-        elif re.search(r"\bit\b|\bthat batch\b", question.lower()) and chat_context.get("last_batch_code"):
-            question += f" for batch {chat_context['last_batch_code']}"
-
-        # ✅ Redis Caching
-        question_hash = hashlib.sha256(question.encode()).hexdigest()
-        cached_response = cache.get(question_hash)
-        if cached_response:
-            return cached_response.decode()
-
-        # ✅ Get SQL from LLM
-        sql_query = get_sql_from_question(question)
-
-        if sql_query.startswith("-- ERROR") or sql_query.strip() == "-- No valid SQL found":
-            return "🤖 Sorry, I couldn't understand your question. Try asking about batches, employees, or products."
-
-        db: Session = next(get_db())
+        if question.lower() in GREETINGS:
+            metrics.answers.inc("chat", "greeting")
+            return GREETING_REPLY
+
+        question = await with_context(session_id, question)
+        resolved = await resolve_sql(question)
+        if resolved.path == "llm_unavailable":
+            metrics.answers.inc("chat", "llm_unavailable")
+            return LLM_UNAVAILABLE_REPLY
+        if resolved.path == "not_understood":
+            metrics.answers.inc("chat", "not_understood")
+            return NOT_UNDERSTOOD_REPLY
+        if resolved.path == "blocked":
+            metrics.answers.inc("chat", "blocked")
+            return f"🛡️ Query blocked ({resolved.rejected}):\n{resolved.generated}"
+
+        if request.page > 1 and not resolved.pageable:
+            metrics.answers.inc("chat", "unordered")
+            return f"📄 {UNORDERED_NOTE}"
+
+        # ✅ Only the requested page is fetched (one extra row tells us if there is more)
+        offset = (request.page - 1) * request.limit
         try:
-            result = db.execute(text(sql_query))
+            if resolved.rows is not None:
+                rows = resolved.rows[offset:offset + request.limit + 1]
+            else:
+                rows = await run_query(resolved, offset, request.limit + 1, db)
+        except SQLRejected as rejected:
+            await failed(resolved, rejected)
+            return f"🛡️ Query blocked ({rejected}):\n{resolved.sql}"
         except Exception as db_err:
-            return f"❌ SQL execution failed:\n{sql_query}\n\nError: {str(db_err)}"
+            await failed(resolved, db_err)
+            return f"❌ SQL execution failed:\n{resolved.sql}\n\nError: {str(db_err)}"
+
+        has_more = len(rows) > request.limit
+        rows = rows[:request.limit]
+
+        with metrics.timed("format"):
+            if request.page == 1 and not has_more:
+                final_response = format_rows(rows)
+            elif not rows:
+                final_response = f"📭 No results on page {request.page}."
+            else:
+                lines = ["• " + format_row(row) for row in rows]
+                final_response = f"📦 Results {offset + 1}–{offset + len(rows)}:\n" + "\n".join(lines)
+                if has_more and resolved.pageable:
+                    final_response += f"\n➡️ More results available: request page {request.page + 1}."
+                elif has_more:
+                    final_response += f"\n➡️ {UNORDERED_NOTE}"
+
+        await succeeded([(resolved, bool(rows))])
+        if resolved.path == "approximate":
+            final_response = APPROXIMATE_NOTE + final_response
+
+        metrics.answers.inc("chat", resolved.path)
 
-        rows = result.mappings().all()
-        formatted = [row for row in rows]
+        return final_response
 
-        if not formatted:
-            final_response = "📭 No results found for your query."
-        elif len(formatted) == 1:
-            final_response = ", ".join(f"{k}: {v}" for k, v in formatted[0].items())
-        else:
-            lines = ["• " + ", ".join(f"{k}: {v}" for k, v in row.items()) for row in formatted]
-            final_response = "📦 Here are the results:\n" + "\n".join(lines)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # ✅ Store in Redis
-        cache.set(question_hash, final_response)
 
-        return final_response
+class BatchMessage(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    limit: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+def _ok_answer(rows, limit: int, resolved) -> Dict[str, Any]:
+    source = resolved.path
+    has_more = len(rows) > limit
+    answer = format_rows(rows[:limit])
+    if source == "approximate":
+        answer = APPROXIMATE_NOTE + answer
+    if has_more and resolved.pageable:
+        answer += "\n➡️ More results available: ask this question on /chat with page 2."
+    elif has_more:
+        answer += f"\n➡️ {UNORDERED_NOTE}"
+    return {"status": "ok", "source": source, "answer": answer, "has_more": has_more}
+
+@router.post("/chat/batch")
+async def chat_batch_route(request: BatchMessage) -> List[Dict[str, Any]]:
+    """Answer many questions at once; results come back in request order, one status per item."""
+    try:
+        # ✅ Normalize + dedupe: each distinct question is answered once
+        normalized = [" ".join(q.split()) for q in request.questions]
+        unique = list(dict.fromkeys(normalized))
+        answers: Dict[str, Dict[str, Any]] = {}
+        greetings = [q for q in unique if q.lower() in GREETINGS]
+        for question in greetings:
+            answers[question] = {"status": "ok", "source": "greeting", "answer": GREETING_REPLY}
+
+        jobs = []
+        for resolved in await resolve_many([q for q in unique if q not in answers]):
+            if resolved.path == "llm_unavailable":
+                answers[resolved.question] = {"status": "unavailable", "source": "llm", "answer": LLM_UNAVAILABLE_REPLY}
+            elif resolved.path == "not_understood":
+                answers[resolved.question] = {"status": "not_understood", "source": "llm", "answer": NOT_UNDERSTOOD_REPLY}
+            elif resolved.path == "blocked":
+                answers[resolved.question] = {"status": "blocked", "source": "llm", "answer": f"🛡️ Query blocked ({resolved.rejected})."}
+            elif resolved.rows is not None:
+                answers[resolved.question] = _ok_answer(resolved.rows, request.limit, resolved)
+            else:
+                jobs.append(resolved)
+
+        # ✅ Identical SQL (+ params) runs once; at most BATCH_DB_CONCURRENCY queries at a time
+        semaphore = asyncio.Semaphore(BATCH_DB_CONCURRENCY)
+
+        async def run(resolved):
+            async with semaphore:
+                return await run_query(resolved, 0, request.limit + 1)
+
+        keys = [(r.sql, json.dumps(r.params, sort_keys=True, default=str), r.guarded) for r in jobs]
+        distinct: Dict[tuple, Any] = {}
+        for key, resolved in zip(keys, jobs):
+            distinct.setdefault(key, resolved)
+        outcomes = await asyncio.gather(*(run(r) for r in distinct.values()), return_exceptions=True)
+        outcome_by_key = dict(zip(distinct, outcomes))
+
+        ran = []
+        for key, resolved in zip(keys, jobs):
+            outcome = outcome_by_key[key]
+            if distinct[key].sql != key[0]:
+                # The shared query was repaired: its SQL is what ran for this question too
+                resolved.sql, resolved.generated = distinct[key].sql, distinct[key].generated
+            if isinstance(outcome, Exception):
+                await failed(resolved, outcome)
+                if isinstance(outcome, SQLRejected):
+                    answers[resolved.question] = {"status": "blocked", "source": resolved.path, "answer": f"🛡️ Query blocked ({outcome})."}
+                else:
+                    answers[resolved.question] = {"status": "error", "source": resolved.path, "answer": f"❌ SQL execution failed: {outcome}"}
+            else:
+                answers[resolved.question] = _ok_answer(outcome, request.limit, resolved)
+                ran.append((resolved, bool(outcome)))
+        await succeeded(ran)
+
+        for item in answers.values():
+            metrics.answers.inc("batch", item["source"] if item["status"] == "ok" else item["status"])
+
+        return [{"question": original, **answers[question]} for original, question in zip(request.questions, normalized)]
 
     except Exception as e:
         traceback.print_exc()
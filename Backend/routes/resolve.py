@@ -0,0 +1,238 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import DataError, ProgrammingError
+
+from app.rag.rag_pipeline import (
+    APPROXIMATE, LLM_UNAVAILABLE, REPAIRED, aget_sql_from_question, aget_sql_for_questions, arepair_sql,
+    semantic_cache,
+)
+from app.rag.intent_router import IntentMatch, intent_router, match_intent
+from app.rag.timeline_index import timeline_index
+from app.rag.plan_cache import plan_cache
+from app.core import cache, metrics, singleflight
+from app.core.context_store import context_store, resolve_followup
+from app.core.database import AsyncSessionLocal
+from app.core.query import fetch_rows, ordered, paged_sql
+from app.core.sql_guard import SQLRejected, check_statement
+
+# ✅ Question -> guarded SQL -> rows, shared by /chat, /chat/batch and /ws/chat:
+# intent (or timeline index) -> SQL cache -> learned plan -> LLM, then the guard; the
+# caches are told when SQL fails (discard/forget) and when it found something (learn)
+
+LLM_UNAVAILABLE_REPLY = ("⏳ The AI service is not responding right now. Common questions (batch status, history, "
+                         "who handled a batch) still work; please try others again shortly.")
+NOT_UNDERSTOOD_REPLY = "🤖 Sorry, I couldn't understand your question. Try asking about batches, employees, or products."
+UNORDERED_NOTE = ("These results have no defined order, so further pages could repeat or skip rows: "
+                  "ask again with an order (e.g. \"sorted by date\") to see more.")
+APPROXIMATE_NOTE = ("⚠️ The AI service is not responding, so this answer reuses the query of a similar earlier "
+                    "question and may not match yours exactly.\n")
+
+
+@dataclass
+class Resolution:
+    question: str
+    # intent | timeline | sql_cache | plan | llm | approximate, or why there is no SQL:
+    # llm_unavailable | not_understood | blocked
+    path: str
+    sql: Optional[str] = None                  # guarded (LIMIT added), ready to page and run
+    params: Dict[str, Any] = field(default_factory=dict)
+    intent: Optional[IntentMatch] = None
+    rows: Optional[List[Dict[str, Any]]] = None  # the whole result, when the timeline index had it
+    generated: Optional[str] = None            # SQL as the LLM / semantic cache / SQL cache returned it
+    rejected: Optional[SQLRejected] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.sql is not None
+
+    @property
+    def pageable(self) -> bool:
+        # OFFSET over rows in no defined order may repeat or skip rows between pages
+        return self.rows is not None or ordered(self.sql)
+
+    @property
+    def guarded(self) -> bool:
+        # Pre-compiled intent SQL is trusted; anything generated must fit the EXPLAIN budget
+        return self.intent is None
+
+
+async def with_context(session_id: str, question: str) -> str:
+    """Per-session context: "it" / "that batch" / "he" refer to this session's latest entities."""
+    await intent_router.ensure_loaded()
+    context = await context_store.get(session_id)
+    question = resolve_followup(question, context, intent_router.extract(question))
+    await context_store.remember(session_id, intent_router.extract(question), context)
+    return question
+
+
+def from_intent(question: str, intent: IntentMatch) -> Resolution:
+    # ✅ Single-batch intents: answered from the in-memory timeline index when it knows the batch
+    rows = timeline_index.answer(intent)
+    return Resolution(question, "intent" if rows is None else "timeline", str(intent.sql), intent.params,
+                      intent=intent, rows=rows)
+
+
+async def _intent(question: str) -> Optional[Resolution]:
+    # ✅ Fast path: known question shapes run pre-compiled SQL, no LLM call
+    with metrics.timed("intent_match"):
+        intent = await match_intent(question)
+    metrics.record_cache("intent", bool(intent))
+    return from_intent(question, intent) if intent else None
+
+
+async def _checked(question: str, path: str, sql: str, params: Optional[Dict[str, Any]] = None) -> Resolution:
+    """Markers from the pipeline -> failure paths; everything else through the static guard."""
+    if path in ("llm", "sql_cache"):
+        if sql.startswith(LLM_UNAVAILABLE):
+            return Resolution(question, "llm_unavailable")
+        if sql.startswith("-- ERROR") or sql.strip() == "-- No valid SQL found":
+            return Resolution(question, "not_understood")
+        if sql.startswith(APPROXIMATE):
+            path, sql = "approximate", sql[len(APPROXIMATE):]
+    resolution = Resolution(question, path, params=params or {}, generated=None if path == "plan" else sql)
+
+    # ✅ Guard: generated SQL must be a single SELECT (a LIMIT is added if missing)
+    try:
+        with metrics.timed("sql_guard"):
+            resolution.sql = check_statement(sql)
+    except SQLRejected as rejected:
+        await failed(resolution, rejected)
+        resolution.path, resolution.rejected = "blocked", rejected
+    return resolution
+
+
+async def resolve_sql(question: str) -> Resolution:
+    resolved = await _intent(question)
+    if resolved:
+        return resolved
+    # ✅ Redis Caching: question -> SQL text (data-independent, long TTL)
+    sql = await cache.get_sql(question)
+    if sql:
+        return await _checked(question, "sql_cache", sql)
+    # ✅ Learned plan: a question of this shape was answered before; its SQL takes our values
+    plan = await plan_cache.lookup(question)
+    if plan:
+        return await _checked(question, "plan", *plan)
+    # ✅ Get SQL from LLM (identical questions in flight share one call)
+    sql = await singleflight.coalesce("sql", " ".join(question.split()), lambda: aget_sql_from_question(question))
+    return await _checked(question, "llm", sql)
+
+
+async def resolve_many(questions: Sequence[str]) -> List[Resolution]:
+    """resolve_sql for many questions: one SQL-cache MGET, and the LLM questions go to the
+    pipeline together (one embedding call, one FAISS search, bounded LLM concurrency)."""
+    resolved: Dict[str, Resolution] = {}
+    rest = []
+    for question in questions:
+        intent = await _intent(question)
+        if intent:
+            resolved[question] = intent
+        else:
+            rest.append(question)
+
+    cached = dict(zip(rest, await cache.get_sql_many(rest)))
+    uncached = [q for q in rest if not cached[q]]
+    plans = dict(zip(uncached, await asyncio.gather(*(plan_cache.lookup(q) for q in uncached))))
+    missing = [q for q in uncached if not plans[q]]
+    generated = dict(zip(missing, await aget_sql_for_questions(missing)))
+    for question in rest:
+        if cached[question]:
+            resolved[question] = await _checked(question, "sql_cache", cached[question])
+        elif plans[question]:
+            resolved[question] = await _checked(question, "plan", *plans[question])
+        else:
+            resolved[question] = await _checked(question, "llm", generated[question])
+    return [resolved[q] for q in questions]
+
+
+async def run_query(resolution: Resolution, offset: int, limit: int, db=None) -> List[Dict[str, Any]]:
+    """Rows offset..offset+limit of a resolved question's SQL.
+
+    Redis Caching: SQL -> rows, invalidated when a table it reads is written. Generated SQL
+    also has to fit the EXPLAIN cost budget before it runs. Concurrent misses for the same
+    page share one query (hits never touch the single-flight). Fresh LLM SQL that fails at
+    EXPLAIN or in the database gets one repair round-trip; the resolution then holds the
+    repaired SQL.
+    """
+    try:
+        return await _fetch_page(resolution, paged_sql(resolution.sql, offset, limit), db)
+    except Exception as error:
+        if not await _repair(resolution, error, db):
+            raise
+    try:
+        rows = await _fetch_page(resolution, paged_sql(resolution.sql, offset, limit), db)
+    except Exception:
+        metrics.sql_repairs.inc("failed")
+        raise
+    metrics.sql_repairs.inc("fixed")
+    return rows
+
+
+def _repairable(error: Exception) -> bool:
+    # Over the cost/row budget, or the database rejected the SQL itself (not a connection problem)
+    if isinstance(error, SQLRejected):
+        return error.reason in ("cost", "rows")
+    return isinstance(error, (ProgrammingError, DataError))
+
+
+async def _repair(resolution: Resolution, error: Exception, db) -> bool:
+    if resolution.path != "llm" or resolution.generated.startswith(REPAIRED) or not _repairable(error):
+        return False
+    # The database's own message, without SQLAlchemy's SQL echo and background link
+    message = str(getattr(error, "orig", None) or error)
+    generated = resolution.generated
+    repaired = await singleflight.coalesce("repair", [generated, message],
+                                           lambda: arepair_sql(resolution.question, generated, message))
+    try:
+        sql = check_statement(repaired) if repaired else None
+    except SQLRejected:
+        sql = None
+    if sql is None:
+        metrics.sql_repairs.inc("failed")
+        return False
+    await failed(resolution, error)
+    if db is not None:
+        await db.rollback()  # the failed statement aborted the request's transaction
+    resolution.sql, resolution.generated = sql, repaired
+    return True
+
+
+async def _fetch_page(resolution: Resolution, page_sql: str, db) -> List[Dict[str, Any]]:
+    params = resolution.params
+    rows, versions = await cache.lookup_rows(page_sql, params)
+    if rows is not None:
+        return rows
+
+    async def fetch():
+        if db is not None:
+            return await fetch_rows(db, page_sql, params, guarded=resolution.guarded)
+        async with AsyncSessionLocal() as session:
+            return await fetch_rows(session, page_sql, params, guarded=resolution.guarded)
+
+    return await singleflight.coalesce("rows", [page_sql, params], lambda: cache.fill_rows(page_sql, params, versions, fetch))
+
+
+async def failed(resolution: Resolution, error: Exception) -> None:
+    """The SQL was rejected or failed to run: stop every cache from handing it out again."""
+    if isinstance(error, SQLRejected):
+        metrics.sql_failures.inc(f"rejected:{error.reason}")
+    else:
+        metrics.sql_failures.inc("execution")
+    if resolution.generated:
+        semantic_cache.discard(resolution.generated)
+    if resolution.path == "plan":
+        await plan_cache.forget(resolution.question)
+    if resolution.path == "sql_cache":
+        await cache.delete_sql(resolution.question)
+
+
+async def succeeded(results: Sequence[Tuple[Resolution, bool]]) -> None:
+    """(resolution, found rows) pairs whose SQL ran: keep it for the next identical question,
+    and learn a plan from LLM SQL that found something. Approximate SQL is never kept."""
+    await cache.set_sql_many({r.question: r.sql for r, _ in results if r.path in ("llm", "sql_cache")})
+    for resolution, found in results:
+        if resolution.path == "llm" and found:
+            # ✅ Validated SQL that found something: reusable for every question of the same shape
+            await plan_cache.learn(resolution.question, resolution.sql)
@@ -1,43 +1,184 @@
+import re
+import asyncio
+import secrets
+from collections import OrderedDict
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.core.database import SessionLocal
-from app.rag.rag_pipeline import get_sql_from_question
+from app.rag.intent_router import IntentMatch
+from app.core import metrics
+from app.core.live_feed import format_event, live_feed
+from app.core.context_store import context_store, session_id_or_new
+from app.core.query import WS_CHUNK_ROWS, WS_MAX_ROWS, format_row
+from app.core.sql_guard import SQLRejected
+from app.routes.resolve import (
+    APPROXIMATE_NOTE, LLM_UNAVAILABLE_REPLY, NOT_UNDERSTOOD_REPLY, UNORDERED_NOTE, Resolution,
+    failed, from_intent, resolve_sql, run_query, succeeded, with_context,
+)
 
 ws_router = APIRouter()  # ✅ Use consistent router name
 
+MORE_COMMAND = re.compile(r"\s*more(?:\s+(\S+))?\s*", re.IGNORECASE)
+MAX_PENDING_PAGES = 8  # continuation tokens remembered per socket
+MAX_SUBSCRIPTIONS = 20  # live-feed filters per socket
+
+# ✅ Live feed: "subscribe batch ABC-012025-A", "unsubscribe product Cough Syrup", "unsubscribe all", "subscriptions"
+SUBSCRIBE_COMMAND = re.compile(r"\s*(subscribe|unsubscribe)\s+(batch|product|department)\s+(.+?)\s*", re.IGNORECASE)
+UNSUBSCRIBE_ALL = re.compile(r"\s*unsubscribe\s+all\s*", re.IGNORECASE)
+LIST_SUBSCRIPTIONS = re.compile(r"\s*subscriptions\s*", re.IGNORECASE)
+
+
+async def send_results(websocket: WebSocket, resolved: Resolution, offset: int = 0):
+    """Send one window of up to WS_MAX_ROWS rows in WS_CHUNK_ROWS-row frames.
+
+    The window is fetched like a /chat page (row cache, single-flight), one extra row
+    telling whether there is more. Returns (offset of the next window or None, rows sent).
+    """
+    if resolved.rows is not None:
+        rows = resolved.rows[offset:offset + WS_MAX_ROWS + 1]
+    else:
+        rows = await run_query(resolved, offset, WS_MAX_ROWS + 1)
+    has_more = len(rows) > WS_MAX_ROWS
+    rows = rows[:WS_MAX_ROWS]
+
+    if not rows:
+        await websocket.send_text("📭 No results found for your query." if offset == 0 else "📭 No more results.")
+        return None, 0
+    if offset == 0 and len(rows) == 1:
+        await websocket.send_text(format_row(rows[0]))
+    else:
+        for i in range(0, len(rows), WS_CHUNK_ROWS):
+            header = "📦 Here are the results:\n" if i == 0 and offset == 0 else ""
+            await websocket.send_text(header + "\n".join("• " + format_row(row) for row in rows[i:i + WS_CHUNK_ROWS]))
+    if has_more:
+        return offset + len(rows), len(rows)
+    if offset:
+        await websocket.send_text(f"✅ Rows {offset + 1}–{offset + len(rows)}, end of results.")
+    return None, len(rows)
+
+
+async def push_events(websocket: WebSocket, subscription):
+    """Forward this socket's live-feed events until the socket closes."""
+    try:
+        while True:
+            event = await subscription.queue.get()
+            await websocket.send_text(format_event(event))
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # socket closed mid-send; the receive loop cleans up
+
+
+async def handle_subscription(websocket: WebSocket, subscription, data: str) -> bool:
+    """Run a subscribe/unsubscribe/subscriptions command. Returns False if `data` is not one."""
+    if UNSUBSCRIBE_ALL.fullmatch(data):
+        subscription.close()
+        await websocket.send_text("🔕 Unsubscribed from all live updates.")
+        return True
+    if LIST_SUBSCRIPTIONS.fullmatch(data):
+        filters = sorted(f"{kind} {value}" for kind, value in subscription.filters)
+        await websocket.send_text("🔔 Live updates for: " + ", ".join(filters) if filters else "🔕 No live subscriptions.")
+        return True
+    command = SUBSCRIBE_COMMAND.fullmatch(data)
+    if not command:
+        return False
+
+    action, kind, value = command.group(1).lower(), command.group(2).lower(), command.group(3)
+    if action == "unsubscribe":
+        removed = subscription.remove(kind, value)
+        await websocket.send_text(f"🔕 Unsubscribed from {kind} {value}." if removed else f"🤖 Not subscribed to {kind} {value}.")
+        return True
+    if len(subscription.filters) >= MAX_SUBSCRIPTIONS:
+        await websocket.send_text(f"🤖 At most {MAX_SUBSCRIPTIONS} live subscriptions per connection.")
+        return True
+    try:
+        await subscription.add(kind, value)
+    except Exception as e:
+        subscription.remove(kind, value)
+        print(f"⚠️ Live feed unavailable: {e}")
+        await websocket.send_text("❌ Live updates are unavailable right now.")
+        return True
+    await websocket.send_text(f"🔔 Subscribed to {kind} {value}. New tracking entries will be pushed here.")
+    if kind == "batch":
+        # Current state once; everything after arrives as pushes
+        intent = IntentMatch("batch_status", {"batch_code": value.upper()})
+        await send_results(websocket, from_intent(data, intent))
+    return True
+
+
 @ws_router.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     await websocket.accept()
-    db: Session = SessionLocal()
+    # Context lives per connection, or per client session when ?session_id= is given (shared with /chat)
+    session_id, per_connection = session_id_or_new(websocket.query_params.get("session_id"))
+    # token -> (resolution, next offset) for "more" requests on this socket
+    pending: "OrderedDict[str, tuple]" = OrderedDict()
+    # Live-feed filters for this socket; the pusher task starts with the first subscription
+    subscription = live_feed.subscription()
+    pusher = None
 
     try:
         while True:
             data = await websocket.receive_text()
-            await websocket.send_text("typing...")
-
-            sql_query = get_sql_from_question(data)
-            if sql_query.startswith("-- ERROR") or sql_query.strip() == "-- No valid SQL found":
-                await websocket.send_text("🤖 Sorry, I couldn't understand your question.")
+            if await handle_subscription(websocket, subscription, data):
+                if pusher is None and subscription.filters:
+                    pusher = asyncio.create_task(push_events(websocket, subscription))
                 continue
+            with metrics.timed("ws_message"):
+                # ✅ Continuation: "more" (latest result) or "more <token>"
+                more = MORE_COMMAND.fullmatch(data)
+                if more:
+                    token = more.group(1) or (next(reversed(pending)) if pending else None)
+                    if token not in pending:
+                        await websocket.send_text("🤖 Nothing more to show for that request.")
+                        continue
+                    resolved, offset = pending.pop(token)
+                else:
+                    await websocket.send_text("typing...")
+                    resolved, offset = await resolve_sql(await with_context(session_id, data)), 0
+                    if resolved.path == "llm_unavailable":
+                        metrics.answers.inc("ws", "llm_unavailable")
+                        await websocket.send_text(LLM_UNAVAILABLE_REPLY)
+                        continue
+                    if resolved.path == "not_understood":
+                        metrics.answers.inc("ws", "not_understood")
+                        await websocket.send_text(NOT_UNDERSTOOD_REPLY)
+                        continue
+                    if resolved.path == "blocked":
+                        metrics.answers.inc("ws", "blocked")
+                        await websocket.send_text(f"🛡️ Query blocked ({resolved.rejected}).")
+                        continue
+                    if resolved.path == "approximate":
+                        await websocket.send_text(APPROXIMATE_NOTE.strip())
 
-            try:
-                result = db.execute(text(sql_query))
-                rows = result.mappings().all()
-            except Exception as e:
-                await websocket.send_text(f"❌ SQL execution failed:\n{str(e)}")
-                continue
+                try:
+                    next_offset, sent = await send_results(websocket, resolved, offset)
+                except WebSocketDisconnect:
+                    raise
+                except SQLRejected as rejected:
+                    await failed(resolved, rejected)
+                    await websocket.send_text(f"🛡️ Query blocked ({rejected}).")
+                    continue
+                except Exception as e:
+                    await failed(resolved, e)
+                    await websocket.send_text(f"❌ SQL execution failed:\n{str(e)}")
+                    continue
 
-            if not rows:
-                await websocket.send_text("📭 No results found for your query.")
-            elif len(rows) == 1:
-                message = ", ".join(f"{k}: {v}" for k, v in rows[0].items())
-                await websocket.send_text(message)
-            else:
-                lines = ["• " + ", ".join(f"{k}: {v}" for k, v in row.items()) for row in rows]
-                await websocket.send_text("📦 Here are the results:\n" + "\n".join(lines))
+                if not more:
+                    await succeeded([(resolved, bool(sent))])
+                metrics.answers.inc("ws", "more" if more else resolved.path)
+                if next_offset is not None and not resolved.pageable:
+                    await websocket.send_text(f"➡️ Showing rows {offset + 1}–{next_offset}. {UNORDERED_NOTE}")
+                elif next_offset is not None:
+                    token = secrets.token_urlsafe(6)
+                    pending[token] = (resolved, next_offset)
+                    while len(pending) > MAX_PENDING_PAGES:
+                        pending.popitem(last=False)
+                    await websocket.send_text(
+                        f"➡️ Showing rows {offset + 1}–{next_offset}. Send \"more {token}\" for the next {WS_MAX_ROWS}."
+                    )
 
     except WebSocketDisconnect:
         print("WebSocket client disconnected.")
     finally:
-        db.close()
+        subscription.close()
+        if pusher is not None:
+            pusher.cancel()
+        if per_connection:
+            await context_store.forget(session_id)
@@ -25,6 +25,8 @@ const ChatInterface = () => {
   const socket = useRef<WebSocket | null>(null);
   const useWebSocket = useRef(true); // ✅ Flag to toggle mode
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // ✅ One session id for WebSocket and Axios, so follow-ups ("it", "that batch") work on both
+  const sessionId = useRef(crypto.randomUUID());
 
   // ✅ Scroll to latest message
   const scrollToBottom = () => {
@@ -37,7 +39,7 @@ const ChatInterface = () => {
 
   // ✅ Setup WebSocket once
   useEffect(() => {
-    socket.current = new WebSocket('ws://localhost:8000/ws/chat');
+    socket.current = new WebSocket(`ws://localhost:8000/ws/chat?session_id=${sessionId.current}`);
 
     socket.current.onopen = () => {
       console.log('✅ WebSocket connected');
@@ -50,7 +52,7 @@ const ChatInterface = () => {
       } else {
         setIsTyping(false);
         const botMessage: Message = {
-          id: Date.now().toString() + '-bot',
+          id: crypto.randomUUID(),
           type: 'bot',
           content: event.data,
           timestamp: new Date(),
@@ -79,7 +81,7 @@ const ChatInterface = () => {
     if (!inputValue.trim()) return;
 
     const userMessage: Message = {
-      id: Date.now().toString(),
+      id: crypto.randomUUID(),
       type: 'user',
       content: inputValue,
       timestamp: new Date(),
@@ -98,14 +100,14 @@ const ChatInterface = () => {
           'http://127.0.0.1:8000/chat',
           { query: userMessage.content },
           {
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId.current },
           }
         );
 
         const botReply = response.data || "🤖 Sorry, I didn't understand that.";
 
         const botMessage: Message = {
-          id: Date.now().toString() + '-bot',
+          id: crypto.randomUUID(),
           type: 'bot',
           content: botReply,
           timestamp: new Date(),
@@ -118,7 +120,7 @@ const ChatInterface = () => {
       setMessages((prev) => [
         ...prev,
         {
-          id: Date.now().toString() + '-error',
+          id: crypto.randomUUID(),
           type: 'bot',
           content: `❌ Error: ${errorMsg}`,
           timestamp: new Date(),
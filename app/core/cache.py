@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.core import metrics
+
+# ✅ Redis connection + cache policy (all overridable from .env)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SQL_CACHE_TTL = int(os.getenv("SQL_CACHE_TTL", "86400"))        # question -> SQL text
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "600"))    # SQL -> result rows
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "500"))
+
+cache = aioredis.from_url(REDIS_URL)
+# Version bumps run inside SQLAlchemy commit hooks, which are synchronous
+_sync_cache = redis.Redis.from_url(REDIS_URL)
+
+# Tables maintained by DB triggers from writes to another table
+DERIVED_TABLES = {
+    "batch_tracking": {"batch_latest_status"},
+}
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w\.]*)", re.IGNORECASE)
+
+
+def _version_key(table: str) -> str:
+    return f"tv:{table}"
+
+
+def _hash(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def schema_version() -> str:
+    # SQL is only as good as the schema it was written for: new columns/tables start a new hash
+    shape = sorted((t.name, sorted(c.name for c in t.columns)) for t in Base.metadata.tables.values())
+    return hashlib.sha256(json.dumps(shape).encode()).hexdigest()[:12]
+
+
+def tables_in(sql: str) -> List[str]:
+    known = Base.metadata.tables
+    found = {name.split(".")[-1].lower() for name in _TABLE_REF.findall(sql)}
+    tables = sorted(t for t in found if t in known)
+    # Can't tell what it reads -> tag with everything so any write invalidates it
+    return tables or sorted(known)
+
+
+# ================================
+#  Question -> SQL text (keyed by schema version: a migration starts a new keyspace)
+# ================================
+def _sql_key(question: str, schema: Optional[str] = None) -> str:
+    return f"sql:{schema or schema_version()}:{_hash(question)}"
+
+
+async def get_sql(question: str) -> Optional[str]:
+    with metrics.timed("redis_sql_get"):
+        sql = await cache.get(_sql_key(question))
+    metrics.record_cache("sql", bool(sql))
+    return sql.decode() if sql else None
+
+
+async def set_sql(question: str, sql: str) -> None:
+    with metrics.timed("redis_sql_set"):
+        await cache.set(_sql_key(question), sql, ex=SQL_CACHE_TTL)
+
+
+async def delete_sql(question: str) -> None:
+    """The cached SQL was rejected or failed to run: the next ask goes back to the LLM."""
+    await cache.delete(_sql_key(question))
+
+
+async def get_sql_many(questions: List[str]) -> List[Optional[str]]:
+    if not questions:
+        return []
+    schema = schema_version()
+    with metrics.timed("redis_sql_get"):
+        values = await cache.mget([_sql_key(q, schema) for q in questions])
+    for value in values:
+        metrics.record_cache("sql", bool(value))
+    return [value.decode() if value else None for value in values]
+
+
+async def set_sql_many(sql_by_question: Dict[str, str]) -> None:
+    if not sql_by_question:
+        return
+    schema = schema_version()
+    with metrics.timed("redis_sql_set"):
+        async with cache.pipeline(transaction=False) as pipe:
+            for question, sql in sql_by_question.items():
+                pipe.set(_sql_key(question, schema), sql, ex=SQL_CACHE_TTL)
+            await pipe.execute()
+
+
+# ================================
+#  SQL text -> result rows, tagged with table versions
+# ================================
+async def lookup_rows(sql: str, params: Optional[Dict[str, Any]]):
+    """Return (rows or None, current table versions) in one Redis round-trip."""
+    tables = tables_in(sql)
+    with metrics.timed("redis_rows_get"):
+        async with cache.pipeline(transaction=False) as pipe:
+            pipe.get(f"rows:{_hash(sql, params)}")
+            pipe.mget([_version_key(t) for t in tables])
+            raw, versions = await pipe.execute()
+    current = {t: int(v or 0) for t, v in zip(tables, versions)}
+    if not raw:
+        metrics.record_cache("rows", False)
+        return None, current
+
+    entry = json.loads(raw)
+    if entry["versions"] != current:
+        # A table this query reads has been written since -> stale
+        metrics.record_cache("rows", False)
+        await cache.delete(f"rows:{_hash(sql, params)}")
+        return None, current
+    metrics.record_cache("rows", True)
+    return entry["rows"], current
+
+
+async def store_rows(sql: str, params: Optional[Dict[str, Any]],
+                     rows: List[Dict[str, Any]], versions: Dict[str, int]) -> None:
+    # Pass the versions read *before* the fetch, so a concurrent write can only
+    # make this entry look stale, never make stale rows look fresh
+    if len(rows) <= RESULT_CACHE_MAX_ROWS and _seeing_writes():
+        entry = json.dumps({"versions": versions, "rows": rows}, default=str)
+        with metrics.timed("redis_rows_set"):
+            await cache.set(f"rows:{_hash(sql, params)}", entry, ex=RESULT_CACHE_TTL)
+
+
+async def fill_rows(sql: str, params: Optional[Dict[str, Any]], versions: Dict[str, int],
+                    fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """After a lookup_rows() miss: fetch, and cache under the versions that lookup returned."""
+    rows = [dict(row) for row in await fetch()]
+    await store_rows(sql, params, rows, versions)
+    return rows
+
+
+async def cached_rows(sql: str, params: Optional[Dict[str, Any]],
+                      fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    rows, versions = await lookup_rows(sql, params)
+    if rows is None:
+        rows = await fill_rows(sql, params, versions, fetch)
+    return rows
+
+
+# ================================
+#  Per-table version counters
+# ================================
+def bump_tables(tables: Iterable[str]) -> None:
+    tables = set(tables)
+    for table in list(tables):
+        tables |= DERIVED_TABLES.get(table, set())
+    if not tables:
+        return
+    try:
+        with _sync_cache.pipeline(transaction=False) as pipe:
+            for table in tables:
+                pipe.incr(_version_key(table))
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Could not bump cache versions for {sorted(tables)}: {e}")
+
+
+# ================================
+#  Writes that bypass the ORM (psql, bulk loads, other services)
+# ================================
+_writes_feed = None  # LISTEN feed of the per-table write triggers, once followed
+
+
+async def follow_table_writes(feed) -> None:
+    """Bump a table's version on every committed write to it, whoever made it (the ORM hooks
+    below only see this process's sessions). Every worker bumps: harmless, versions only
+    have to change."""
+    global _writes_feed
+    if _writes_feed is None:
+        feed.add_listener(_on_table_write, _on_writes_lost)
+        _writes_feed = feed
+    await feed.ensure_listening()
+
+
+def _seeing_writes() -> bool:
+    # While the feed is down, writes go unseen: nothing new is cached until it is back
+    return _writes_feed is None or _writes_feed.listening
+
+
+def _on_table_write(event: Dict[str, Any]):
+    return asyncio.get_running_loop().run_in_executor(None, bump_tables, [event["table"]])
+
+
+def _on_writes_lost():
+    # Writes may have been missed: whatever was cached so far may be stale
+    return asyncio.get_running_loop().run_in_executor(None, bump_tables, list(Base.metadata.tables))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_tables(session, flush_context):
+    touched: Set[str] = session.info.setdefault("touched_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            touched.add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_written_tables(session):
+    bump_tables(session.info.pop("touched_tables", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_tables(session):
+    session.info.pop("touched_tables", None)
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.core import cache
+
+# ✅ Per-session conversation context (overridable from .env)
+CONTEXT_BACKEND = os.getenv("CONTEXT_BACKEND", "memory")                 # memory | redis (shared by workers)
+CONTEXT_TTL = int(os.getenv("CONTEXT_TTL", "1800"))                      # idle seconds before a session is forgotten
+CONTEXT_MAX_SESSIONS = int(os.getenv("CONTEXT_MAX_SESSIONS", "10000"))   # memory backend: LRU beyond this
+CONTEXT_MAX_BYTES = int(os.getenv("CONTEXT_MAX_BYTES", str(8 * 1024 * 1024)))
+CONTEXT_HISTORY = int(os.getenv("CONTEXT_HISTORY", "5"))                 # entities remembered per kind
+
+# Entity kinds carried between messages (as extracted by the intent router)
+CONTEXT_KINDS = ("batch_code", "employee", "product")
+SESSION_OVERHEAD_BYTES = 256  # dict/tuple/key bookkeeping per session, roughly
+
+_SESSION_ID = re.compile(r"[A-Za-z0-9_\-]{1,128}")
+
+# ✅ Follow-up references -> the most recent entity of that kind in the session
+FOLLOW_UPS = {
+    "batch_code": (re.compile(r"\bit\b|\b(that|this|the same) batch\b", re.IGNORECASE), " for batch {}"),
+    "employee": (re.compile(r"\b(he|she|him|her|that employee)\b", re.IGNORECASE), " by employee {}"),
+    "product": (re.compile(r"\b(that|this|the same) product\b", re.IGNORECASE), " for product {}"),
+}
+
+Context = Dict[str, List[str]]
+
+
+def session_id_or_new(value: Optional[str]) -> Tuple[str, bool]:
+    """Return (session id, created): client ids are kept if well-formed, else a new one is issued."""
+    if value and _SESSION_ID.fullmatch(value):
+        return value, False
+    return uuid.uuid4().hex, True
+
+
+def resolve_followup(question: str, context: Context, entities: Dict[str, str]) -> str:
+    for kind, (pattern, suffix) in FOLLOW_UPS.items():
+        if kind not in entities and context.get(kind) and pattern.search(question):
+            question += suffix.format(context[kind][0])
+    return question
+
+
+class ContextStore(ABC):
+    @abstractmethod
+    async def get(self, session_id: str) -> Context:
+        ...
+
+    @abstractmethod
+    async def put(self, session_id: str, context: Context) -> None:
+        ...
+
+    @abstractmethod
+    async def forget(self, session_id: str) -> None:
+        ...
+
+    def stats(self) -> Dict[str, float]:
+        return {}
+
+    async def remember(self, session_id: str, entities: Dict[str, str], context: Optional[Context] = None) -> Context:
+        """Push this message's entities to the front of each kind's history (also refreshes the TTL)."""
+        context = dict(context if context is not None else await self.get(session_id))
+        for kind in CONTEXT_KINDS:
+            value = entities.get(kind)
+            if value:
+                history = [value] + [v for v in context.get(kind, []) if v != value]
+                context[kind] = history[:CONTEXT_HISTORY]
+        await self.put(session_id, context)
+        return context
+
+
+class MemoryContextStore(ContextStore):
+    """LRU + idle TTL, capped by session count and (approximate) bytes. Per worker."""
+
+    def __init__(self, max_sessions: int = CONTEXT_MAX_SESSIONS, max_bytes: int = CONTEXT_MAX_BYTES,
+                 ttl: int = CONTEXT_TTL):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        # session id -> (expires at, context, size)
+        self._sessions: "OrderedDict[str, Tuple[float, Context, int]]" = OrderedDict()
+
+    async def get(self, session_id: str) -> Context:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return {}
+        if entry[0] < time.monotonic():
+            self._drop(session_id)
+            return {}
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    async def put(self, session_id: str, context: Context) -> None:
+        self._drop(session_id)
+        size = SESSION_OVERHEAD_BYTES + len(session_id) + len(json.dumps(context))
+        self._sessions[session_id] = (time.monotonic() + self.ttl, context, size)
+        self.bytes += size
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            self._drop(oldest)
+            self.evictions += 1
+
+    async def forget(self, session_id: str) -> None:
+        self._drop(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self) -> Dict[str, float]:
+        return {"sessions": len(self._sessions), "bytes": self.bytes, "evictions": self.evictions}
+
+
+class RedisContextStore(ContextStore):
+    """One small JSON value per session with a sliding TTL; shared by all workers."""
+
+    def __init__(self, ttl: int = CONTEXT_TTL):
+        self.ttl = ttl
+
+    async def get(self, session_id: str) -> Context:
+        try:
+            raw = await cache.cache.get(f"ctx:{session_id}")
+        except redis.RedisError as e:
+            print(f"⚠️ Could not read session context: {e}")
+            return {}
+        return json.loads(raw) if raw else {}
+
+    async def put(self, session_id: str, context: Context) -> None:
+        try:
+            await cache.cache.set(f"ctx:{session_id}", json.dumps(context), ex=self.ttl)
+        except redis.RedisError as e:
+            print(f"⚠️ Could not save session context: {e}")
+
+    async def forget(self, session_id: str) -> None:
+        try:
+            await cache.cache.delete(f"ctx:{session_id}")
+        except redis.RedisError:
+            pass
+
+
+context_store: ContextStore = RedisContextStore() if CONTEXT_BACKEND == "redis" else MemoryContextStore()
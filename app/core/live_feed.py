@@ -0,0 +1,179 @@
+import os
+import json
+import asyncio
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from app.core.database import ASYNC_DATABASE_URL
+from app.models.models import FEED_CHANNEL, TABLE_WRITES_CHANNEL
+
+# ✅ One LISTEN connection per worker, fanned out to in-process subscribers
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "100"))            # per subscriber; oldest dropped when full
+FEED_RECONNECT_SECONDS = float(os.getenv("FEED_RECONNECT_SECONDS", "2"))
+
+# Subscription kinds -> payload fields they match (lower-cased)
+FEED_KINDS = {
+    "batch": ("batch_code",),
+    "product": ("product", "product_code"),
+    "department": ("department",),
+}
+
+
+class Subscription:
+    """One subscriber's filters plus the queue its matching events land in."""
+
+    def __init__(self, feed: "LiveFeed"):
+        self.feed = feed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.filters: Set[tuple] = set()
+        self.dropped = 0
+
+    async def add(self, kind: str, value: str) -> None:
+        key = (kind, value.lower())
+        if key not in self.filters:
+            self.filters.add(key)
+            self.feed._index[key].add(self)
+        await self.feed.ensure_listening()
+
+    def remove(self, kind: str, value: str) -> bool:
+        key = (kind, value.lower())
+        if key not in self.filters:
+            return False
+        self.filters.discard(key)
+        self.feed._unindex(key, self)
+        return True
+
+    def close(self) -> None:
+        for key in list(self.filters):
+            self.feed._unindex(key, self)
+        self.filters.clear()
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        if self.queue.full():
+            # Slow client: keep the newest updates rather than blocking the listener
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class LiveFeed:
+    def __init__(self, dsn: str, channel: str = FEED_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self.events = 0
+        self._index: Dict[tuple, Set[Subscription]] = defaultdict(set)
+        # In-process consumers of every event: (on_event, on_lost)
+        self._listeners: List[Tuple[Callable[[Dict[str, Any]], None], Optional[Callable[[], None]]]] = []
+        self._connection: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    def subscription(self) -> Subscription:
+        return Subscription(self)
+
+    def add_listener(self, on_event: Callable[[Dict[str, Any]], None],
+                     on_lost: Optional[Callable[[], None]] = None) -> None:
+        """Call `on_event` for every feed event (e.g. to keep an in-memory index fresh).
+        `on_lost` runs when the connection drops: events may be missed until it is back."""
+        self._listeners.append((on_event, on_lost))
+
+    def _wanted(self) -> bool:
+        return bool(self._index or self._listeners)
+
+    def _unindex(self, key: tuple, subscription: Subscription) -> None:
+        subscribers = self._index.get(key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._index[key]
+
+    # ================================
+    #  LISTEN connection
+    # ================================
+    async def ensure_listening(self) -> None:
+        """Open the LISTEN connection on first use (an idle worker holds no connection)."""
+        if self._connection is not None and not self._connection.is_closed():
+            return
+        async with self._lock:
+            if self._connection is not None and not self._connection.is_closed():
+                return
+            connection = await asyncpg.connect(self.dsn)
+            await connection.add_listener(self.channel, self._on_notify)
+            connection.add_termination_listener(self._on_terminated)
+            self._connection = connection
+
+    def _on_terminated(self, connection) -> None:
+        self._connection = None
+        for _, on_lost in self._listeners:
+            if on_lost is not None:
+                on_lost()
+        if self._wanted() and self._reconnect_task is None:
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        try:
+            while self._wanted():
+                await asyncio.sleep(FEED_RECONNECT_SECONDS)
+                try:
+                    await self.ensure_listening()
+                    return
+                except (OSError, asyncpg.PostgresError) as e:
+                    print(f"⚠️ Live feed reconnect failed: {e}")
+        finally:
+            self._reconnect_task = None
+
+    async def close(self) -> None:
+        if self._connection is not None and not self._connection.is_closed():
+            # A deliberate close is not a dropped connection: don't reconnect
+            self._connection.remove_termination_listener(self._on_terminated)
+            await self._connection.close()
+        self._connection = None
+
+    # ================================
+    #  Fan-out
+    # ================================
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        event = json.loads(payload)
+        self.events += 1
+        for on_event, _ in self._listeners:
+            on_event(event)
+        if event.get("op", "INSERT") != "INSERT":
+            return  # subscribers are told about new entries only
+        matched: Set[Subscription] = set()
+        for kind, fields in FEED_KINDS.items():
+            for field in fields:
+                value = event.get(field)
+                if value:
+                    matched |= self._index.get((kind, str(value).lower()), set())
+        for subscription in matched:
+            subscription.deliver(event)
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    def stats(self) -> Dict[str, float]:
+        subscribers = {s for subs in self._index.values() for s in subs}
+        return {
+            "listening": int(self.listening),
+            "subscribers": len(subscribers),
+            "filters": len(self._index),
+            "events": self.events,
+            "dropped": sum(s.dropped for s in subscribers),
+        }
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    who = f" by {event['employee']}" if event.get("employee") else ""
+    where = f" ({event['department']})" if event.get("department") else ""
+    return f"📡 {event.get('batch_code')} → {event.get('status')}{who}{where} at {event.get('timestamp')}"
+
+
+# asyncpg takes a plain postgresql:// DSN
+_DSN = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+live_feed = LiveFeed(_DSN)
+# Committed writes per table, for cache invalidation (see cache.follow_table_writes)
+table_writes = LiveFeed(_DSN, TABLE_WRITES_CHANNEL)
@@ -0,0 +1,161 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ✅ Minimal in-process Prometheus registry: a dict update per observation, no I/O.
+# Each uvicorn worker exposes its own series; scrape every worker (or sum by instance).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# Per-request trace id (set by the HTTP middleware in main.py)
+trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def _escape(value, quote: bool = True) -> str:
+    # Exposition format: backslash and newline always, double quote inside label values
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {_escape(self.documentation, quote=False)}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# ================================
+#  Application metrics
+# ================================
+stage_seconds = Histogram(
+    "batch_assistant_stage_seconds", "Latency of each chat pipeline stage", ["stage"]
+)
+llm_seconds = Histogram("batch_assistant_llm_seconds", "Latency of LLM calls")
+llm_calls = Counter(
+    "batch_assistant_llm_calls_total", "LLM attempts by provider and outcome", ["provider", "outcome"]
+)
+llm_tokens = Histogram(
+    "batch_assistant_llm_tokens", "Tokens per LLM call", ["kind"], buckets=TOKEN_BUCKETS
+)
+cache_requests = Counter(
+    "batch_assistant_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+sql_failures = Counter("batch_assistant_sql_failures_total", "Failed or rejected SQL by reason", ["reason"])
+sql_repairs = Counter("batch_assistant_sql_repairs_total", "SQL repair round-trips (schema, EXPLAIN or database errors) by outcome", ["outcome"])
+answers = Counter("batch_assistant_answers_total", "Answered questions by route and path", ["route", "path"])
+coalesced = Counter(
+    "batch_assistant_coalesced_total", "Single-flight outcomes by scope and role", ["scope", "role"]
+)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def record_llm_usage(response) -> None:
+    # LangChain puts token counts on AIMessage.usage_metadata when the provider returns them
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        llm_tokens.observe(usage["input_tokens"], "prompt")
+    if usage.get("output_tokens") is not None:
+        llm_tokens.observe(usage["output_tokens"], "completion")
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """Add a callback that renders extra exposition lines (gauges read at scrape time)."""
+    _collectors.append(collector)
+
+
+def gauge_lines(name: str, documentation: str, values: Dict[str, float], label: str = "") -> List[str]:
+    lines = [f"# HELP {name} {_escape(documentation, quote=False)}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        lines.append(f"{name}{_fmt_labels([label], [key])} {value}" if label else f"{name} {value}")
+    return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
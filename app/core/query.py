@@ -0,0 +1,50 @@
+import os
+import re
+from typing import Any, Dict, List, Mapping, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.sql_guard import check_plan, mask_literals, top_level
+from app.core import metrics
+
+# ✅ Result delivery limits (overridable from .env)
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))        # REST rows per page
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+WS_CHUNK_ROWS = int(os.getenv("WS_CHUNK_ROWS", "100"))       # rows per WebSocket frame
+WS_MAX_ROWS = int(os.getenv("WS_MAX_ROWS", "1000"))          # rows before asking the client for "more"
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))  # questions per /chat/batch call
+BATCH_DB_CONCURRENCY = int(os.getenv("BATCH_DB_CONCURRENCY", "4"))   # /chat/batch queries in flight
+
+
+def ordered(sql: str) -> bool:
+    # Pages only line up when the statement itself orders its rows (not a subquery or window)
+    return bool(re.search(r"\bORDER\s+BY\b", top_level(mask_literals(sql)), re.IGNORECASE))
+
+
+def paged_sql(sql: str, offset: int, limit: int) -> str:
+    # Wrap rather than edit the query so any ORDER BY / LIMIT inside still applies
+    inner = sql.strip().rstrip(";")
+    return f"SELECT * FROM ({inner}) AS page LIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+def format_row(row: Mapping[str, Any]) -> str:
+    return ", ".join(f"{k}: {v}" for k, v in row.items())
+
+
+def format_rows(rows: List[Mapping[str, Any]]) -> str:
+    if not rows:
+        return "📭 No results found for your query."
+    if len(rows) == 1:
+        return format_row(rows[0])
+    return "📦 Here are the results:\n" + "\n".join("• " + format_row(row) for row in rows)
+
+
+async def fetch_rows(db: AsyncSession, sql: str, params: Optional[Dict[str, Any]],
+                     guarded: bool = False) -> List[Mapping[str, Any]]:
+    # guarded=True: LLM-generated SQL must pass the EXPLAIN budget before it runs
+    if guarded:
+        with metrics.timed("sql_explain"):
+            await check_plan(db, sql, params)
+    with metrics.timed("db_query"):
+        return (await db.execute(text(sql), params or {})).mappings().all()
@@ -0,0 +1,155 @@
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis
+
+from app.core import cache, metrics
+
+# ✅ Single-flight: identical in-flight work runs once; everyone else awaits that result.
+# In-process via a shared Future, across workers via a Redis lock + pub/sub.
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "30"))          # follower wait, seconds
+SINGLEFLIGHT_LOCK_TTL_MS = int(os.getenv("SINGLEFLIGHT_LOCK_TTL_MS", "30000"))  # frees the key if a leader dies
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "5"))        # covers late subscribers
+LEADER_CHECK_INTERVAL = 1.0  # how often a remote follower checks that the leader still holds the lock
+
+# Delete the lock only if we still own it (it may have expired and been re-taken)
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class LeaderFailed(Exception):
+    pass
+
+
+def _name(scope: str, key: Any) -> str:
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{scope}:{digest}"
+
+
+async def coalesce(scope: str, key: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `compute()` once per `key` across concurrent callers (results must be JSON-serializable).
+
+    Local followers get the leader's result or its exception: a failing call (e.g. during an
+    LLM outage) is not repeated by everyone who was waiting for it. If the leader was cancelled,
+    the followers coalesce again, so one of them recomputes. Past SINGLEFLIGHT_TIMEOUT, a
+    follower stops waiting and runs `compute()` itself.
+    """
+    name = _name(scope, key)
+    future = _inflight.get(name)
+    if future is not None:
+        # asyncio.wait, not wait_for: a leader's own TimeoutError must reach us as its error
+        done, _ = await asyncio.wait({future}, timeout=SINGLEFLIGHT_TIMEOUT)
+        if not done:
+            metrics.coalesced.inc(scope, "fallback")
+            return await compute()
+        try:
+            result = future.result()
+            metrics.coalesced.inc(scope, "local_follower")
+            return result
+        except LeaderFailed:
+            # Leader cancelled: the first follower back in becomes the new leader
+            return await coalesce(scope, key, compute)
+        except Exception:
+            metrics.coalesced.inc(scope, "local_follower_failed")
+            raise
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[name] = future
+    try:
+        result = await _across_workers(scope, name, compute)
+    except BaseException as e:
+        # Followers get the leader's own error; LeaderFailed means it was cancelled (nothing to share)
+        future.set_exception(e if isinstance(e, Exception) else LeaderFailed(repr(e)))
+        future.exception()  # mark retrieved: there may be no followers
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(name, None)
+
+
+async def _across_workers(scope: str, name: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    client = cache.cache
+    lock, channel, result_key = f"sf:lock:{name}", f"sf:done:{name}", f"sf:result:{name}"
+    token = uuid.uuid4().hex
+    try:
+        leader = await client.set(lock, token, nx=True, px=SINGLEFLIGHT_LOCK_TTL_MS)
+    except redis.RedisError as e:
+        # Redis down: still coalesced within this worker
+        print(f"⚠️ Single-flight lock unavailable, running locally: {e}")
+        leader = True
+        token = None
+
+    if leader:
+        metrics.coalesced.inc(scope, "leader")
+        try:
+            result = await compute()
+        except BaseException:
+            if token:
+                await _finish(client, lock, token, channel, result_key, {"failed": True})
+            raise
+        if token:
+            await _finish(client, lock, token, channel, result_key, {"result": result})
+        return result
+
+    # ✅ Another worker is computing it: wait for its published result
+    payload = await _wait_for_leader(client, lock, channel, result_key)
+    if payload is not None and "result" in payload:
+        metrics.coalesced.inc(scope, "remote_follower")
+        return payload["result"]
+    metrics.coalesced.inc(scope, "fallback")
+    return await compute()
+
+
+async def _finish(client, lock: str, token: str, channel: str, result_key: str, payload: dict) -> None:
+    try:
+        message = json.dumps(payload, default=str)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(result_key, message, ex=SINGLEFLIGHT_RESULT_TTL)
+            pipe.publish(channel, message)
+            pipe.eval(_RELEASE, 1, lock, token)
+            await pipe.execute()
+    except (redis.RedisError, TypeError, ValueError) as e:
+        # Remote followers fall back once they notice the lock is gone (or it expires)
+        print(f"⚠️ Could not publish single-flight result: {e}")
+
+
+async def _wait_for_leader(client, lock: str, channel: str, result_key: str) -> Optional[dict]:
+    try:
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+    except redis.RedisError:
+        return None
+    try:
+        # The leader may have finished between our SET NX and SUBSCRIBE
+        raw = await client.get(result_key)
+        if raw:
+            return json.loads(raw)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SINGLEFLIGHT_TIMEOUT
+        while loop.time() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=min(LEADER_CHECK_INTERVAL, deadline - loop.time())
+            )
+            if message is not None:
+                return json.loads(message["data"])
+            if not await client.exists(lock):
+                # Leader gone without publishing (crashed, or its publish failed)
+                raw = await client.get(result_key)
+                return json.loads(raw) if raw else None
+        return None
+    except redis.RedisError:
+        return None
+    finally:
+        try:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+        except redis.RedisError:
+            pass
@@ -0,0 +1,102 @@
+import os
+import re
+import json
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# ✅ Budget for LLM-generated SQL (overridable from .env)
+SQL_MAX_COST = float(os.getenv("SQL_MAX_COST", "100000"))             # planner cost units
+SQL_MAX_ROWS_ESTIMATE = float(os.getenv("SQL_MAX_ROWS_ESTIMATE", "1000000"))
+SQL_DEFAULT_LIMIT = int(os.getenv("SQL_DEFAULT_LIMIT", "10000"))       # injected when the query has none
+
+# checked / passed / rejected:<reason>
+guard_stats: Counter = Counter()
+
+_FORBIDDEN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|UPSERT|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|COPY|CALL|DO|"
+    r"LOCK|VACUUM|ANALYZE|REINDEX|CLUSTER|REFRESH|SET|RESET|COMMENT|LISTEN|NOTIFY|PREPARE|EXECUTE|INTO)\b",
+    re.IGNORECASE,
+)
+_FORBIDDEN_FUNCTIONS = re.compile(
+    r"\b(pg_sleep\w*|pg_terminate_backend|pg_cancel_backend|pg_read_\w+|pg_ls_dir|pg_reload_conf|"
+    r"set_config|dblink\w*|lo_import|lo_export)\s*\(",
+    re.IGNORECASE,
+)
+_LOCKING = re.compile(r"\bFOR\s+(UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b", re.IGNORECASE)
+# Literals first, so a '--' or '/*' inside a string isn't taken for a comment
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|/\*.*?\*/|--[^\n]*", re.DOTALL)
+
+
+class SQLRejected(Exception):
+    def __init__(self, reason: str, detail: str = ""):
+        self.reason = reason
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+
+
+def _reject(reason: str, detail: str = ""):
+    guard_stats[f"rejected:{reason}"] += 1
+    raise SQLRejected(reason, detail)
+
+
+def mask_literals(sql: str) -> str:
+    # Blank out string literals and quoted identifiers so keywords inside them don't count
+    return re.sub(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"", lambda m: " " * len(m.group()), sql)
+
+
+def _strip_comments(sql: str) -> str:
+    return _LITERAL_OR_COMMENT.sub(lambda m: m.group() if m.group()[0] in "'\"" else " ", sql)
+
+
+def top_level(sql: str) -> str:
+    # Drop everything inside parentheses (subqueries, function args)
+    out, depth = [], 0
+    for ch in sql:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out)
+
+
+def check_statement(sql: str) -> str:
+    """Static checks: a single read-only SELECT. Returns the SQL with a LIMIT if it had none."""
+    guard_stats["checked"] += 1
+    sql = _strip_comments(sql).strip().rstrip(";").strip()
+    masked = mask_literals(sql)
+
+    if not sql:
+        _reject("empty")
+    if ";" in masked:
+        _reject("multiple_statements")
+    if not re.match(r"\s*(SELECT|WITH)\b", masked, re.IGNORECASE):
+        _reject("not_select", masked.split(None, 1)[0].upper())
+    forbidden = _FORBIDDEN.search(masked) or _FORBIDDEN_FUNCTIONS.search(masked) or _LOCKING.search(masked)
+    if forbidden:
+        _reject("forbidden_keyword", forbidden.group(0).strip(" (").upper())
+
+    top = top_level(masked)
+    if not re.search(r"\bLIMIT\b|\bFETCH\s+(FIRST|NEXT)\b", top, re.IGNORECASE):
+        sql = f"{sql} LIMIT {SQL_DEFAULT_LIMIT}"
+    return sql
+
+
+async def check_plan(db: AsyncSession, sql: str, params: Optional[Dict[str, Any]] = None) -> None:
+    """EXPLAIN (no ANALYZE, so nothing runs) and reject plans over the cost/row budget."""
+    raw = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {})).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+    # Pagination and the injected LIMIT wrap the query; the row estimate that matters
+    # (e.g. an accidental cross join) is the one beneath those wrappers
+    rows_plan = plan
+    while rows_plan["Node Type"] in ("Limit", "Subquery Scan") and rows_plan.get("Plans"):
+        rows_plan = rows_plan["Plans"][0]
+    if plan["Total Cost"] > SQL_MAX_COST:
+        _reject("cost", f"estimated cost {plan['Total Cost']:.0f} > {SQL_MAX_COST:.0f}")
+    if rows_plan["Plan Rows"] > SQL_MAX_ROWS_ESTIMATE:
+        _reject("rows", f"estimated {rows_plan['Plan Rows']:.0f} rows > {SQL_MAX_ROWS_ESTIMATE:.0f}")
+    guard_stats["passed"] += 1
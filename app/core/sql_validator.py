@@ -0,0 +1,225 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import MetaData
+
+from app.core.sql_guard import mask_literals
+
+# Words that may appear bare in a query without being a column
+_KEYWORDS = {
+    "select", "distinct", "from", "join", "inner", "left", "right", "full", "outer", "cross", "natural",
+    "on", "using", "where", "and", "or", "not", "in", "is", "null", "like", "ilike", "similar", "between",
+    "exists", "group", "by", "order", "asc", "desc", "nulls", "first", "last", "having", "limit", "offset",
+    "fetch", "next", "rows", "row", "only", "as", "case", "when", "then", "else", "end", "union", "all",
+    "intersect", "except", "with", "recursive", "true", "false", "interval", "date", "time", "timestamp",
+    "current_date", "current_time", "current_timestamp", "localtime", "localtimestamp", "any", "some",
+    "over", "partition", "filter", "within", "lateral", "escape", "at", "zone", "unknown", "ties",
+    "year", "month", "week", "day", "hour", "minute", "second", "dow", "doy", "epoch", "quarter",
+}
+_TOKEN = re.compile(r"::|[A-Za-z_][\w$]*(?:\.(?:[A-Za-z_][\w$]*|\*))*|\d+(?:\.\d+)?|\S")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_BIND = re.compile(r"(?<![:\w]):[A-Za-z_]\w*")  # :batch_code placeholders (not ::casts)
+_CLAUSE_END = {"join", "inner", "left", "right", "full", "cross", "natural", "where", "group", "order",
+               "limit", "having", "union", "intersect", "except", "fetch", "offset", "on", "using", ")", ","}
+
+
+class SchemaValidator:
+    """Static check of generated SQL against the models' metadata, before anything runs.
+
+    Catches unknown tables/aliases/columns, ambiguous bare columns and joins that
+    ignore the foreign key between two tables. Deliberately lenient where it can't
+    be sure (CTEs, derived tables): those only get the checks that still apply.
+    """
+
+    def __init__(self, metadata: MetaData):
+        self.metadata = metadata
+        self.columns: Dict[str, Set[str]] = {
+            name: {c.name.lower() for c in table.columns} for name, table in metadata.tables.items()
+        }
+        # (table, column) -> (target table, target column) for every FK
+        self.fks: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for table in metadata.tables.values():
+            for fk in table.foreign_keys:
+                self.fks[(table.name, fk.parent.name)] = (fk.column.table.name, fk.column.name)
+        self.primary_keys = {
+            name: {c.name for c in table.primary_key.columns} for name, table in metadata.tables.items()
+        }
+
+    def _fk_joins(self, a: str, b: str) -> List[str]:
+        return [f"{t}.{c} = {tt}.{tc}" for (t, c), (tt, tc) in self.fks.items()
+                if (t, tt) in ((a, b), (b, a))]
+
+    def _joins_ok(self, left: Tuple[str, str], right: Tuple[str, str]) -> bool:
+        if self.fks.get(left) == right or self.fks.get(right) == left:
+            return True
+        # Both sides reference the same key (e.g. two tables' batch_id)
+        if left in self.fks and self.fks.get(left) == self.fks.get(right):
+            return True
+        both_primary = left[1] in self.primary_keys[left[0]] and right[1] in self.primary_keys[right[0]]
+        # Only second-guess joins between tables that have a foreign key to use instead
+        return not both_primary and not self._fk_joins(left[0], right[0])
+
+    def problems(self, sql: str) -> List[str]:
+        # String literals and bind placeholders become a value (they can precede an alias); quoted names are blanked
+        tokens = _TOKEN.findall(mask_literals(_BIND.sub(" 0 ", _STRING.sub(" 0 ", sql))))
+        lower = [t.lower() for t in tokens]
+        found: List[str] = []
+
+        # ✅ Pass 1: sources (FROM/JOIN targets, aliases, CTEs), output aliases and ON conditions
+        sources: Dict[str, Optional[str]] = {}  # alias or table -> real table (None: CTE/subquery)
+        output_aliases: Set[str] = set()
+        ctes: Set[str] = set()
+        on_ranges: List[Tuple[int, int]] = []
+        stack: List[str] = []  # per open paren: "query" or "expr"
+        subqueries = 0
+        i = 0
+        while i < len(tokens):
+            word = lower[i]
+            if word == "(":
+                nxt = lower[i + 1] if i + 1 < len(tokens) else ""
+                stack.append("query" if nxt in ("select", "with") else "expr")
+                subqueries += stack[-1] == "query"
+            elif word == ")":
+                if stack and stack.pop() == "query":
+                    # `(SELECT ...) [AS] alias`: a source whose columns we don't know
+                    j = i + 2 if i + 1 < len(tokens) and lower[i + 1] == "as" else i + 1
+                    if j < len(tokens) and re.match(r"[a-z_]\w*$", lower[j]) and lower[j] not in _KEYWORDS:
+                        sources[lower[j]] = None
+            elif word == "as" and i + 1 < len(tokens):
+                if lower[i + 1] == "(" and i >= 2 and lower[i - 2] in ("with", "recursive", ","):
+                    ctes.add(lower[i - 1])
+                    sources[lower[i - 1]] = None
+                else:
+                    output_aliases.add(lower[i + 1])
+            elif word == "on":
+                end = i + 1
+                while end < len(tokens) and lower[end] not in _CLAUSE_END - {")"}:
+                    end += 1
+                on_ranges.append((i + 1, end))
+            elif word in ("from", "join") and self._is_table_list(lower, i, stack):
+                i = self._read_sources(tokens, lower, i + 1, sources, ctes, found)
+                continue
+            elif self._is_implicit_alias(lower, i):
+                output_aliases.add(word)
+            i += 1
+
+        # ✅ Pass 2: column references (bare names only when every source and scope is known)
+        opaque = subqueries > 0 or any(real is None for real in sources.values())
+        referenced = {real for real in sources.values() if real}
+        for i, token in enumerate(tokens):
+            word = lower[i]
+            if not re.match(r"[a-z_]", word) or word in _KEYWORDS:
+                continue
+            previous = lower[i - 1] if i else ""
+            following = lower[i + 1] if i + 1 < len(tokens) else ""
+            if previous in ("from", "join", "as", "::") or (previous == "," and self._in_from(lower, i)):
+                continue
+            if "." in word:
+                qualifier, column = word.rsplit(".", 1)
+                qualifier = qualifier.split(".")[-1]
+                if qualifier not in sources:
+                    if qualifier in self.columns:
+                        found.append(f"table {qualifier} is used but not in FROM/JOIN")
+                    else:
+                        found.append(f"unknown table or alias {qualifier}")
+                    continue
+                real = sources[qualifier]
+                if real and column != "*" and column not in self.columns[real]:
+                    found.append(f"unknown column {qualifier}.{column} (columns of {real}: "
+                                 f"{', '.join(sorted(self.columns[real]))})")
+                continue
+            if following == "(" or word in sources or word in output_aliases or opaque:
+                continue
+            owners = sorted(t for t in referenced if word in self.columns[t])
+            if not owners:
+                found.append(f"unknown column {word} (tables in the query: {', '.join(sorted(referenced))})")
+            elif len(owners) > 1 and "using" not in lower:
+                found.append(f"ambiguous column {word} (in {', '.join(owners)}): qualify it")
+
+        # ✅ Pass 3: join conditions must follow the foreign keys
+        for start, end in on_ranges:
+            for j in range(start, end - 2):
+                if lower[j + 1] != "=" or "." not in lower[j] or "." not in lower[j + 2]:
+                    continue
+                left, right = self._resolve(lower[j], sources), self._resolve(lower[j + 2], sources)
+                if left and right and left[0] != right[0] and not self._joins_ok(left, right):
+                    hint = self._fk_joins(left[0], right[0])
+                    found.append(f"bad join {lower[j]} = {lower[j + 2]}"
+                                 + (f" (the foreign key is {' / '.join(hint)})" if hint else ""))
+
+        return list(dict.fromkeys(found))
+
+    def _resolve(self, ref: str, sources: Dict[str, Optional[str]]) -> Optional[Tuple[str, str]]:
+        qualifier, column = ref.rsplit(".", 1)
+        real = sources.get(qualifier.split(".")[-1])
+        if real and column in self.columns[real]:
+            return real, column
+        return None
+
+    @staticmethod
+    def _is_table_list(lower: List[str], i: int, stack: List[str]) -> bool:
+        # Not a table list: a IS DISTINCT FROM b, EXTRACT(year FROM ts), SUBSTRING(x FROM 2)
+        if lower[i] == "from":
+            if i >= 2 and lower[i - 1] == "distinct" and lower[i - 2] in ("is", "not"):
+                return False
+            # Innermost paren belongs to a function like EXTRACT(...)
+            if stack and stack[-1] == "expr":
+                return False
+        return True
+
+    @staticmethod
+    def _clause(lower: List[str], i: int) -> str:
+        # Walk back to the clause keyword token i belongs to ("" if none at this paren depth)
+        depth = 0
+        for j in range(i - 1, -1, -1):
+            if lower[j] == ")":
+                depth += 1
+            elif lower[j] == "(":
+                if depth == 0:
+                    return ""
+                depth -= 1
+            elif depth == 0 and lower[j] in ("from", "select", "where", "on", "group", "order", "having"):
+                return lower[j]
+        return ""
+
+    def _in_from(self, lower: List[str], i: int) -> bool:
+        return self._clause(lower, i) == "from"
+
+    def _is_implicit_alias(self, lower: List[str], i: int) -> bool:
+        """`SELECT COUNT(*) cnt, name who FROM ...`: a bare name right after a complete select expression."""
+        word = lower[i]
+        if i < 2 or not re.match(r"[a-z_]\w*$", word) or word in _KEYWORDS:
+            return False
+        previous = lower[i - 1]
+        following = lower[i + 1] if i + 1 < len(lower) else ""
+        ends_expression = (previous in (")", "*", "end") or previous[0].isdigit()
+                           or (re.match(r"[a-z_]", previous) and previous not in _KEYWORDS)
+                           or lower[i - 2] == "::")
+        return (ends_expression and following in ("", ",", "from", ")", "union", "intersect", "except")
+                and self._clause(lower, i) == "select")
+
+    def _read_sources(self, tokens, lower, i, sources, ctes, found) -> int:
+        """Read `table [AS] alias, ...` (or `(subquery) [AS] alias`) starting at i; return the next index."""
+        while i < len(tokens):
+            if lower[i] == "(":
+                return i  # derived table: pass 1 walks into it; its alias is caught below
+            name = lower[i].split(".")[-1]
+            real: Optional[str] = None
+            if name in self.columns:
+                real = name
+            elif name not in ctes:
+                found.append(f"unknown table {tokens[i]} (tables: {', '.join(sorted(self.columns))})")
+            i += 1
+            alias = name
+            if i < len(tokens) and lower[i] == "as":
+                i += 1
+            if i < len(tokens) and re.match(r"[a-z_]", lower[i]) and lower[i] not in _KEYWORDS and "." not in lower[i]:
+                alias = lower[i]
+                i += 1
+            sources[alias] = real
+            sources.setdefault(name, real)
+            if i < len(tokens) and lower[i] == ",":
+                i += 1
+                continue
+            return i
+        return i
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, DDL, event
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -39,4 +39,151 @@ class BatchTracking(Base):
 
     batch = relationship("Batch")
     department = relationship("Department")
-    employee = relationship("Employee")
\ No newline at end of file
+    employee = relationship("Employee")
+
+    # ✅ "Latest/history for a batch" and "batches with status S" become index scans
+    __table_args__ = (
+        Index("ix_batch_tracking_batch_id_timestamp", "batch_id", "timestamp"),
+        Index("ix_batch_tracking_status_batch_id", "status", "batch_id"),
+    )
+
+class BatchLatestStatus(Base):
+    """One row per batch: its most recent batch_tracking entry (maintained by trigger)."""
+    __tablename__ = "batch_latest_status"
+    batch_id = Column(Integer, ForeignKey("batches.id"), primary_key=True)
+    tracking_id = Column(Integer)
+    department_id = Column(Integer, ForeignKey("departments.id"))
+    employee_id = Column(Integer, ForeignKey("employees.id"))
+    timestamp = Column(DateTime)
+    status = Column(String, index=True)
+
+    batch = relationship("Batch")
+    department = relationship("Department")
+    employee = relationship("Employee")
+
+# Created after batch_tracking so the trigger below can attach to it
+BatchLatestStatus.__table__.add_is_dependent_on(BatchTracking.__table__)
+
+# ✅ Postgres trigger keeps batch_latest_status current on every tracking write.
+# Inserts are an O(1) upsert; updates/deletes (rare) recompute the affected batch.
+_LATEST_COLUMNS = "batch_id, tracking_id, department_id, employee_id, timestamp, status"
+_LATEST_SELECT = (
+    "SELECT DISTINCT ON (batch_id) batch_id, id, department_id, employee_id, timestamp, status "
+    "FROM batch_tracking {where} ORDER BY batch_id, timestamp DESC, id DESC"
+)
+
+event.listen(BatchLatestStatus.__table__, "after_create", DDL(f"""
+CREATE OR REPLACE FUNCTION batch_latest_status_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO batch_latest_status ({_LATEST_COLUMNS})
+        VALUES (NEW.batch_id, NEW.id, NEW.department_id, NEW.employee_id, NEW.timestamp, NEW.status)
+        ON CONFLICT (batch_id) DO UPDATE SET
+            tracking_id = EXCLUDED.tracking_id,
+            department_id = EXCLUDED.department_id,
+            employee_id = EXCLUDED.employee_id,
+            timestamp = EXCLUDED.timestamp,
+            status = EXCLUDED.status
+        WHERE (batch_latest_status.timestamp, batch_latest_status.tracking_id)
+              <= (EXCLUDED.timestamp, EXCLUDED.tracking_id);
+        RETURN NEW;
+    END IF;
+
+    DELETE FROM batch_latest_status WHERE batch_id = OLD.batch_id;
+    INSERT INTO batch_latest_status ({_LATEST_COLUMNS})
+    {_LATEST_SELECT.format(where="WHERE batch_id = OLD.batch_id")};
+    IF TG_OP = 'UPDATE' AND NEW.batch_id IS DISTINCT FROM OLD.batch_id THEN
+        DELETE FROM batch_latest_status WHERE batch_id = NEW.batch_id;
+        INSERT INTO batch_latest_status ({_LATEST_COLUMNS})
+        {_LATEST_SELECT.format(where="WHERE batch_id = NEW.batch_id")};
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_batch_latest_status
+AFTER INSERT OR UPDATE OR DELETE ON batch_tracking
+FOR EACH ROW EXECUTE FUNCTION batch_latest_status_refresh();
+
+INSERT INTO batch_latest_status ({_LATEST_COLUMNS})
+{_LATEST_SELECT.format(where="")};
+""").execute_if(dialect="postgresql"))
+
+# ✅ create_all() skips tables that already exist, so add new indexes explicitly
+def ensure_indexes(bind):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+# ✅ Live feed: every tracking row change is announced (on commit) with its names resolved,
+# so WebSocket subscribers get pushed updates instead of polling. "op" is INSERT for new
+# entries; UPDATE/DELETE tell in-memory copies (the timeline index) the batch changed.
+FEED_CHANNEL = "batch_tracking_feed"
+
+_LIVE_FEED_DDL = f"""
+CREATE OR REPLACE FUNCTION batch_tracking_notify() RETURNS trigger AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.batch_id IS DISTINCT FROM NEW.batch_id THEN
+        PERFORM pg_notify('{FEED_CHANNEL}', json_build_object(
+            'op', 'DELETE', 'id', OLD.id, 'batch_id', OLD.batch_id,
+            'batch_code', (SELECT batch_code FROM batches WHERE id = OLD.batch_id)
+        )::text);
+    END IF;
+    IF TG_OP = 'DELETE' THEN r := OLD; ELSE r := NEW; END IF;
+    PERFORM pg_notify('{FEED_CHANNEL}', json_build_object(
+        'op', TG_OP,
+        'id', r.id,
+        'batch_id', r.batch_id,
+        'batch_code', (SELECT batch_code FROM batches WHERE id = r.batch_id),
+        'product', (SELECT p.name FROM batches b JOIN products p ON p.id = b.product_id WHERE b.id = r.batch_id),
+        'product_code', (SELECT p.code FROM batches b JOIN products p ON p.id = b.product_id WHERE b.id = r.batch_id),
+        'department', (SELECT name FROM departments WHERE id = r.department_id),
+        'employee', (SELECT name FROM employees WHERE id = r.employee_id),
+        'status', r.status,
+        'timestamp', r.timestamp
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_batch_tracking_notify ON batch_tracking;
+CREATE TRIGGER trg_batch_tracking_notify
+AFTER INSERT OR UPDATE OR DELETE ON batch_tracking
+FOR EACH ROW EXECUTE FUNCTION batch_tracking_notify();
+"""
+
+# ✅ Table writes: every committed INSERT/UPDATE/DELETE/TRUNCATE names its table, whoever
+# made it (psql, bulk loads, other services), so cached results are invalidated even for
+# writes that never went through a SQLAlchemy session. One notification per table and
+# transaction (Postgres folds identical payloads). "op" WRITE keeps feed subscribers out of it.
+TABLE_WRITES_CHANNEL = "table_writes"
+
+_TABLE_WRITES_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION table_write_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{TABLE_WRITES_CHANNEL}', json_build_object('op', 'WRITE', 'table', TG_TABLE_NAME)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_TABLE_WRITES_TRIGGER = """
+DROP TRIGGER IF EXISTS trg_{table}_writes ON {table};
+CREATE TRIGGER trg_{table}_writes
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION table_write_notify();
+"""
+
+def table_writes_ddl() -> str:
+    return _TABLE_WRITES_FUNCTION + "".join(
+        _TABLE_WRITES_TRIGGER.format(table=table.name) for table in Base.metadata.sorted_tables)
+
+# Idempotent (re)install; the table usually exists already, so this can't hang off after_create
+def ensure_live_feed(bind):
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as conn:
+        conn.exec_driver_sql(_LIVE_FEED_DDL)
+        conn.exec_driver_sql(table_writes_ddl())
@@ -0,0 +1,306 @@
+"""Replay a question mix against /chat and /ws/chat and report latency percentiles.
+
+    python -m bench.serve &                                  # API with offline stubs
+    python -m bench.load_test --concurrency 1,8,32 --requests 400 --batches 400000
+    python -m bench.load_test --json run.json --baseline last.json   # fail on a p95 regression
+
+For each concurrency level the driver keeps that many requests in flight (closed
+loop), then reports client-side p50/p95/p99 and throughput, plus per-stage
+percentiles computed from the server's /metrics histograms for that window.
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import websockets
+
+from bench.synthetic_data import batch_code
+
+# ✅ Question mix: kind -> templates. "intent" hits the rule router, "llm" goes through RAG.
+QUESTIONS = {
+    "intent": [
+        "What is the current status of batch {code}?",
+        "Show the history of batch {code}",
+        "Who inspected batch {code}?",
+        "When was {code} dispatched?",
+        "Which product is in batch {code}?",
+    ],
+    "llm": [
+        "Give me a summary of batch {code}",
+        "How many batches has each department handled?",
+        "Which employee handled the most batches?",
+        "List the products that have batches waiting in storage",
+    ],
+    "greeting": ["hello"],
+}
+DEFAULT_MIX = "intent=0.6,llm=0.35,greeting=0.05"
+
+# Sent after every WS question: the server answers messages in order, so this
+# cheap reply marks the end of the previous (unterminated) multi-frame answer
+WS_END_MARKER = "more __bench_end__"
+WS_END_REPLY = "🤖 Nothing more to show for that request."
+
+_BUCKET = re.compile(r'^(\w+)_bucket\{(.*)le="([^"]+)"\}\s+(\S+)$')
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, weight = part.split("=")
+        if kind not in QUESTIONS:
+            raise SystemExit(f"Unknown question kind '{kind}' (choose from {', '.join(QUESTIONS)})")
+        mix[kind] = float(weight)
+    return mix
+
+
+def make_questions(count: int, mix: Dict[str, float], batches: int, seed: int, repeat: float) -> List[str]:
+    """Deterministic question list; `repeat` is the share re-asking an earlier question (cache hits)."""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    questions: List[str] = []
+    for _ in range(count):
+        if questions and rng.random() < repeat:
+            questions.append(rng.choice(questions))
+            continue
+        template = rng.choice(QUESTIONS[rng.choices(kinds, weights)[0]])
+        questions.append(template.format(code=batch_code(rng.randrange(batches))))
+    return questions
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+# ================================
+#  Drivers
+# ================================
+async def _run_closed_loop(questions: List[str], concurrency: int, worker_factory):
+    queue: asyncio.Queue = asyncio.Queue()
+    for q in questions:
+        queue.put_nowait(q)
+    latencies: List[float] = []
+    first_frames: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def worker():
+        async with worker_factory() as send:
+            while not queue.empty():
+                question = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    first = await send(question)
+                    latencies.append(time.perf_counter() - start)
+                    if first is not None:
+                        first_frames.append(first - start)
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, first_frames, dict(errors), time.perf_counter() - started
+
+
+class _ChatClient:
+    def __init__(self, url: str, timeout: float):
+        self.url, self.timeout = url, timeout
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(base_url=self.url, timeout=self.timeout)
+        return self.send
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def send(self, question: str) -> None:
+        response = await self.client.post("/chat", json={"query": question})
+        response.raise_for_status()
+        if response.json().startswith("❌"):
+            raise RuntimeError("ServerError")
+
+
+class _WSClient:
+    def __init__(self, url: str, timeout: float):
+        self.url, self.timeout = url.replace("http", "ws", 1) + "/ws/chat", timeout
+
+    async def __aenter__(self):
+        self.socket = await websockets.connect(self.url, max_size=None)
+        return self.send
+
+    async def __aexit__(self, *exc):
+        await self.socket.close()
+
+    async def send(self, question: str) -> Optional[float]:
+        await self.socket.send(question)
+        await self.socket.send(WS_END_MARKER)
+        return await asyncio.wait_for(self._read_answer(), self.timeout)
+
+    async def _read_answer(self) -> Optional[float]:
+        first = None
+        while True:
+            frame = await self.socket.recv()
+            if frame == WS_END_REPLY:
+                return first
+            if frame != "typing..." and first is None:
+                first = time.perf_counter()
+
+
+# ================================
+#  Server-side stage percentiles from /metrics
+# ================================
+async def scrape(url: str) -> Dict[Tuple[str, str], List[Tuple[float, float]]]:
+    """(metric, labels) -> cumulative [(le, count)] for every histogram series."""
+    async with httpx.AsyncClient(base_url=url, timeout=10) as client:
+        body = (await client.get("/metrics")).text
+    series: Dict[Tuple[str, str], List[Tuple[float, float]]] = defaultdict(list)
+    for line in body.splitlines():
+        match = _BUCKET.match(line)
+        # Latency histograms only (token counts have their own units)
+        if match and match.group(1).endswith("_seconds"):
+            name, labels, le, count = match.groups()
+            series[(name, labels.rstrip(","))].append((float(le), float(count)))
+    return series
+
+
+def histogram_quantile(buckets: List[Tuple[float, float]], q: float) -> float:
+    # Same linear interpolation within a bucket as Prometheus' histogram_quantile()
+    total = buckets[-1][1]
+    if total == 0:
+        return float("nan")
+    rank, lower, below = q * total, 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * ((rank - below) / (count - below) if count > below else 0)
+        lower, below = bound, count
+    return lower
+
+
+def stage_report(before, after) -> List[dict]:
+    rows = []
+    for key, buckets in sorted(after.items()):
+        previous = dict(before.get(key, []))
+        window = [(le, count - previous.get(le, 0)) for le, count in buckets]
+        if window[-1][1] == 0:
+            continue
+        name, labels = key
+        rows.append({
+            "stage": labels.split('"')[1] if '"' in labels else name.replace("batch_assistant_", ""),
+            "count": int(window[-1][1]),
+            "p50": histogram_quantile(window, 0.50),
+            "p95": histogram_quantile(window, 0.95),
+            "p99": histogram_quantile(window, 0.99),
+        })
+    return rows
+
+
+# ================================
+#  Run + report
+# ================================
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:9.1f}"
+
+
+def print_level(result: dict) -> None:
+    print(f"\n== {result['route']} @ concurrency {result['concurrency']}: {result['requests']} requests, "
+          f"{result['throughput']:.1f} req/s, errors {result['errors'] or 0}")
+    print(f"   {'':24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(f"   {'end-to-end':24}{_ms(result['p50'])}{_ms(result['p95'])}{_ms(result['p99'])}")
+    if result.get("first_frame_p50") is not None:
+        print(f"   {'first frame':24}{_ms(result['first_frame_p50'])}{_ms(result['first_frame_p95'])}"
+              f"{_ms(result['first_frame_p99'])}")
+    for stage in result["stages"]:
+        print(f"   {stage['stage'][:24]:24}{_ms(stage['p50'])}{_ms(stage['p95'])}{_ms(stage['p99'])}"
+              f"   n={stage['count']}")
+
+
+async def run_level(url: str, route: str, questions: List[str], concurrency: int, timeout: float) -> dict:
+    client = _ChatClient if route == "chat" else _WSClient
+    before = await scrape(url)
+    latencies, first_frames, errors, elapsed = await _run_closed_loop(
+        questions, concurrency, lambda: client(url, timeout)
+    )
+    after = await scrape(url)
+    result = {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "stages": stage_report(before, after),
+    }
+    if first_frames:
+        result.update({f"first_frame_p{int(q * 100)}": percentile(first_frames, q) for q in (0.50, 0.95, 0.99)})
+    return result
+
+
+def regressions(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    previous = {(r["route"], r["concurrency"]): r for r in baseline}
+    found = []
+    for result in results:
+        old = previous.get((result["route"], result["concurrency"]))
+        if old and result["p95"] > old["p95"] * (1 + tolerance):
+            found.append(f"{result['route']} @ {result['concurrency']}: p95 {old['p95'] * 1000:.0f}ms -> "
+                         f"{result['p95'] * 1000:.0f}ms")
+    return found
+
+
+async def main_async(args) -> int:
+    mix = parse_mix(args.mix)
+    results = []
+    for route in args.routes.split(","):
+        # Greetings are a REST-only shortcut; over WS they would just be LLM questions
+        route_mix = {k: w for k, w in mix.items() if route == "chat" or k != "greeting"}
+        for level, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            questions = make_questions(args.requests, route_mix, args.batches, args.seed + level, args.repeat)
+            result = await run_level(args.url, route, questions, concurrency, args.timeout)
+            print_level(result)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"❌ Regression: {line}")
+        return 1 if found else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--routes", default="chat,ws", help="comma-separated: chat, ws")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"question kind weights (default {DEFAULT_MIX})")
+    parser.add_argument("--repeat", type=float, default=0.2, help="share of repeated questions (cache hits)")
+    parser.add_argument("--batches", type=int, default=1000, help="synthetic batches loaded (codes to ask about)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output; exit 1 if any p95 regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 increase vs baseline (0.2 = 20%%)")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
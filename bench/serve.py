@@ -0,0 +1,29 @@
+"""Run the API with the offline LLM/embedding stubs (no Gemini key, no network).
+
+    python -m bench.serve --port 8000
+    BENCH_LLM_LATENCY_MS=1500 python -m bench.serve --app main:app
+"""
+import argparse
+
+import uvicorn
+
+from bench import stubs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="ASGI app import string (default: main:app)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--index-dir", default="bench/faiss_index", help="FAISS index built from stub embeddings")
+    args = parser.parse_args()
+
+    # Install before the app is imported so warm-up already builds the stub index
+    stubs.install(args.index_dir)
+    app = uvicorn.importer.import_from_string(args.app)
+    # Single worker: the stubs live in this process (and /metrics is per worker anyway)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+# ✅ Offline stand-ins for ChatGoogleGenerativeAI / GoogleGenerativeAIEmbeddings.
+# Outputs are a pure function of the input; only the simulated latency is random.
+LLM_LATENCY_MS = float(os.getenv("BENCH_LLM_LATENCY_MS", "800"))
+LLM_JITTER_MS = float(os.getenv("BENCH_LLM_JITTER_MS", "200"))
+EMBED_LATENCY_MS = float(os.getenv("BENCH_EMBED_LATENCY_MS", "60"))
+EMBED_DIM = int(os.getenv("BENCH_EMBED_DIM", "256"))
+
+_BATCH_CODE = re.compile(r"\b[A-Z]{3}-\d{6}-[A-Z]\b")
+_EXAMPLE = re.compile(r"^(.*?)=>\s*(SELECT .*)$", re.IGNORECASE | re.MULTILINE)
+_WORD = re.compile(r"[a-z0-9]+")
+FALLBACK_SQL = "SELECT COUNT(*) FROM batches;"
+
+
+def _delay(mean_ms: float, jitter_ms: float = 0.0) -> float:
+    return max(mean_ms + random.uniform(-jitter_ms, jitter_ms), 0.0) / 1000
+
+
+class StubChatModel:
+    """Answers with the SQL of the best retrieved few-shot example, re-targeted at the question's batch code."""
+
+    model = "bench-stub-llm"
+
+    def __init__(self, latency_ms: float = LLM_LATENCY_MS, jitter_ms: float = LLM_JITTER_MS):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def _answer(self, prompt: str) -> AIMessage:
+        question = prompt.rsplit("Question:", 1)[-1].split("SQL Query:", 1)[0]
+        example = _EXAMPLE.search(prompt)
+        sql = example.group(2).strip() if example else FALLBACK_SQL
+        code = _BATCH_CODE.search(question)
+        if code:
+            sql = _BATCH_CODE.sub(code.group(0), sql)
+        return AIMessage(
+            content=f"```sql\n{sql}\n```",
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(sql) // 4,
+                "total_tokens": (len(prompt) + len(sql)) // 4,
+            },
+        )
+
+    def invoke(self, prompt, *args, **kwargs) -> AIMessage:
+        time.sleep(_delay(self.latency_ms, self.jitter_ms))
+        return self._answer(str(prompt))
+
+    async def ainvoke(self, prompt, *args, **kwargs) -> AIMessage:
+        await asyncio.sleep(_delay(self.latency_ms, self.jitter_ms))
+        return self._answer(str(prompt))
+
+
+class StubEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: similar wording -> similar (unit-length) vectors."""
+
+    def __init__(self, dim: int = EMBED_DIM, latency_ms: float = EMBED_LATENCY_MS):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.model = f"bench-hash-{dim}"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.md5(word.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        time.sleep(_delay(self.latency_ms))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        time.sleep(_delay(self.latency_ms))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        await asyncio.sleep(_delay(self.latency_ms))
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str, **kwargs) -> List[float]:
+        await asyncio.sleep(_delay(self.latency_ms))
+        return self._vector(text)
+
+
+def install(index_dir: str = "bench/faiss_index") -> None:
+    """Point rag_pipeline at the stubs (and a separate FAISS index) before the app serves anything."""
+    from app.rag import rag_pipeline
+
+    rag_pipeline._llm = StubChatModel()
+    rag_pipeline._embedding_model = StubEmbeddings()
+    # Never overwrite the real Gemini-embedded index or its embedding cache
+    rag_pipeline.index_path = index_dir
+    rag_pipeline.embedding_cache_path = index_dir + "_embedding_cache.json"
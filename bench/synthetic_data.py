@@ -0,0 +1,174 @@
+"""Bulk-load a large synthetic dataset with COPY (millions of batch_tracking rows in minutes).
+
+    python -m bench.synthetic_data --batches 400000          # ~1M tracking rows
+    python -m bench.synthetic_data --batches 4000000 --reset # ~10M, on an emptied database
+
+Batch codes are a pure function of their index (see batch_code), so the load
+driver can generate questions about batches that exist without querying the DB.
+"""
+import io
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Sequence
+
+from sqlalchemy import text
+
+from app.models import models
+from app.core.database import Base, engine
+
+DEPARTMENTS = ["Packaging", "Quality Control", "Storage", "Delivery"]
+# A batch moves through these in order; status i is recorded by department i
+STATUSES = ["Packed", "Inspected", "Stored", "Dispatched"]
+PRODUCT_COUNT = 26 * 26          # product codes ZAA..ZZZ
+COPY_CHUNK_ROWS = 50_000
+START_TIME = datetime(2024, 1, 1)
+
+
+def product_code(i: int) -> str:
+    return "Z" + chr(65 + (i // 26) % 26) + chr(65 + i % 26)
+
+
+def batch_code(i: int) -> str:
+    # "ZAB-032025-K": matches the chatbot's batch-code pattern and never collides with seed.py
+    n = i // PRODUCT_COUNT
+    month, year, letter = 1 + (n // 26) % 12, 2000 + n // (26 * 12), chr(65 + n % 26)
+    return f"{product_code(i % PRODUCT_COUNT)}-{month:02d}{year:04d}-{letter}"
+
+
+def _copy(cursor, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    """COPY rows in fixed-size CSV chunks, so memory stays flat for any row count."""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total, buffer = 0, io.StringIO()
+    for row in rows:
+        buffer.write(",".join("" if v is None else str(v) for v in row) + "\n")
+        total += 1
+        if total % COPY_CHUNK_ROWS == 0:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    return total
+
+
+def _next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def _sync_sequence(cursor, table: str) -> None:
+    # Rows were COPY'd with explicit ids; move the serial past them
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+
+
+def _tracking_rows(first_batch_id: int, batches: int, employees_by_dept: List[List[int]],
+                   department_ids: List[int], first_id: int, rng: random.Random) -> Iterator[tuple]:
+    tracking_id = first_id
+    for b in range(batches):
+        # Most batches are mid-pipeline; a quarter have been dispatched
+        steps = rng.randint(1, len(STATUSES))
+        when = START_TIME + timedelta(minutes=b * 5)
+        for s in range(steps):
+            when += timedelta(hours=rng.randint(1, 48))
+            yield (tracking_id, first_batch_id + b, department_ids[s], rng.choice(employees_by_dept[s]),
+                   when.isoformat(sep=" "), STATUSES[s])
+            tracking_id += 1
+
+
+def load(batches: int, employees: int, seed: int = 42, reset: bool = False) -> None:
+    rng = random.Random(seed)
+    Base.metadata.create_all(bind=engine)
+    models.ensure_indexes(engine)
+    models.ensure_live_feed(engine)
+
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if reset:
+            cursor.execute("TRUNCATE batch_latest_status, batch_tracking, batches, products, employees, departments "
+                           "RESTART IDENTITY")
+
+        # ✅ Small dimension tables
+        for name in DEPARTMENTS:
+            cursor.execute("INSERT INTO departments (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (name,))
+        cursor.execute("SELECT id, name FROM departments")
+        department_by_name = {name: i for i, name in cursor.fetchall()}
+        department_ids = [department_by_name[name] for name in DEPARTMENTS]
+
+        first_employee = _next_id(cursor, "employees")
+        employees_by_dept: List[List[int]] = [[] for _ in DEPARTMENTS]
+        employee_rows = []
+        for e in range(employees):
+            employees_by_dept[e % len(DEPARTMENTS)].append(first_employee + e)
+            employee_rows.append((first_employee + e, f"Employee {e:05d}", department_ids[e % len(DEPARTMENTS)]))
+        _copy(cursor, "employees", ("id", "name", "department_id"), employee_rows)
+
+        cursor.execute("SELECT code, id FROM products WHERE code LIKE 'Z__'")
+        product_ids = dict(cursor.fetchall())
+        first_product = _next_id(cursor, "products")
+        new_products = [(first_product + i, f"Synthetic Product {code}", code)
+                        for i, code in enumerate(c for c in map(product_code, range(PRODUCT_COUNT))
+                                                  if c not in product_ids)]
+        _copy(cursor, "products", ("id", "name", "code"), new_products)
+        product_ids.update({code: pid for pid, _, code in new_products})
+
+        # ✅ Batches continue the code sequence from earlier synthetic loads
+        cursor.execute("SELECT COUNT(*) FROM batches WHERE batch_code ~ '^Z[A-Z]{2}-[0-9]{6}-[A-Z]$'")
+        first_code = cursor.fetchone()[0]
+        first_batch = _next_id(cursor, "batches")
+        _copy(cursor, "batches", ("id", "batch_code", "product_id"), (
+            (first_batch + b, batch_code(first_code + b), product_ids[product_code((first_code + b) % PRODUCT_COUNT)])
+            for b in range(batches)
+        ))
+
+        # ✅ Tracking rows: per-row triggers (latest status, live feed) off during the load,
+        # projection rebuilt once afterwards
+        cursor.execute("ALTER TABLE batch_tracking DISABLE TRIGGER USER")
+        tracking = _copy(
+            cursor, "batch_tracking", ("id", "batch_id", "department_id", "employee_id", "timestamp", "status"),
+            _tracking_rows(first_batch, batches, employees_by_dept, department_ids,
+                           _next_id(cursor, "batch_tracking"), rng),
+        )
+        cursor.execute("ALTER TABLE batch_tracking ENABLE TRIGGER USER")
+        cursor.execute(
+            "INSERT INTO batch_latest_status (batch_id, tracking_id, department_id, employee_id, timestamp, status) "
+            "SELECT DISTINCT ON (batch_id) batch_id, id, department_id, employee_id, timestamp, status "
+            "FROM batch_tracking WHERE batch_id >= %s ORDER BY batch_id, timestamp DESC, id DESC",
+            (first_batch,),
+        )
+
+        for table in ("employees", "products", "batches", "batch_tracking"):
+            _sync_sequence(cursor, table)
+        raw.commit()
+    finally:
+        raw.close()
+
+    # Fresh planner statistics, or the EXPLAIN budget judges the new tables as empty
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+
+    # Raw COPY bypasses the ORM hooks that invalidate cached results
+    from app.core.cache import bump_tables
+    bump_tables(Base.metadata.tables)
+
+    print(f"✅ Loaded {employees} employees, {batches} batches and {tracking} tracking rows "
+          f"in {time.perf_counter() - started:.1f}s (batch codes {batch_code(first_code)} .. "
+          f"{batch_code(first_code + batches - 1)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=400_000, help="batches to add (~2.5 tracking rows each)")
+    parser.add_argument("--employees", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="truncate all tables first")
+    args = parser.parse_args()
+    load(args.batches, args.employees, args.seed, args.reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,7 @@ from app.core.database import Base, engine
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
+models.ensure_indexes(engine)
+models.ensure_live_feed(engine)
 
 print("✅ All tables created successfully!")
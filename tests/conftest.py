@@ -0,0 +1,30 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ✅ Deployed layout: Backend/rag and Backend/routes are app/rag and app/routes
+for name in ("rag", "routes"):
+    package = types.ModuleType(f"app.{name}")
+    package.__path__ = [os.path.join(ROOT, "Backend", name)]
+    sys.modules.setdefault(f"app.{name}", package)
+
+VOCABULARY = {
+    "employee": ["John", "Sara", "Anna", "Ted"],
+    "product": ["Cough Syrup", "Pain Relief Gel"],
+    "department": ["Packaging", "Quality Control", "Storage", "Delivery"],
+    "status": ["Packed", "Inspected", "Stored", "Dispatched"],
+}
+
+
+@pytest.fixture
+def router():
+    from app.rag.intent_router import IntentRouter
+
+    router = IntentRouter()
+    router.set_vocabulary(VOCABULARY)
+    return router
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.core import context_store
+from app.core.context_store import ContextStore, MemoryContextStore, resolve_followup
+
+
+def test_base_is_abstract():
+    with pytest.raises(TypeError):
+        ContextStore()
+
+
+def test_remember_keeps_most_recent_first():
+    store = MemoryContextStore()
+
+    async def run():
+        await store.remember("s", {"batch_code": "ABC-012025-A"})
+        await store.remember("s", {"batch_code": "ABC-012025-B", "employee": "John"})
+        return await store.remember("s", {"batch_code": "ABC-012025-A"})
+
+    assert asyncio.run(run()) == {"batch_code": ["ABC-012025-A", "ABC-012025-B"], "employee": ["John"]}
+
+
+def test_lru_evicts_least_recently_used():
+    store = MemoryContextStore(max_sessions=2)
+
+    async def run():
+        await store.put("a", {"employee": ["John"]})
+        await store.put("b", {"employee": ["Sara"]})
+        await store.get("a")  # a is now the most recent
+        await store.put("c", {"employee": ["Anna"]})
+        return [await store.get(s) for s in "abc"]
+
+    assert asyncio.run(run()) == [{"employee": ["John"]}, {}, {"employee": ["Anna"]}]
+    assert store.stats()["evictions"] == 1
+
+
+def test_byte_cap():
+    one = context_store.SESSION_OVERHEAD_BYTES + len("s0") + len('{"employee": ["John"]}')
+    store = MemoryContextStore(max_bytes=2 * one)
+
+    async def run():
+        for i in range(3):
+            await store.put(f"s{i}", {"employee": ["John"]})
+
+    asyncio.run(run())
+    assert store.stats() == {"sessions": 2, "bytes": 2 * one, "evictions": 1}
+    # replacing a session's context re-counts it instead of adding to it
+    asyncio.run(store.put("s2", {"employee": ["John"]}))
+    assert store.bytes == 2 * one
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(context_store.time, "monotonic", lambda: now[0])
+    store = MemoryContextStore(ttl=10)
+    asyncio.run(store.put("s", {"employee": ["John"]}))
+    now[0] += 11
+    assert asyncio.run(store.get("s")) == {}
+    assert store.bytes == 0
+
+
+CONTEXT = {"batch_code": ["ABC-012025-A"], "employee": ["John"], "product": ["Cough Syrup"]}
+
+
+@pytest.mark.parametrize("question, entities, expected", [
+    ("Who packed it?", {}, "Who packed it? for batch ABC-012025-A"),
+    ("When did he store that batch?", {}, "When did he store that batch? for batch ABC-012025-A by employee John"),
+    ("Which batches of the same product were stored?", {}, "Which batches of the same product were stored? for product Cough Syrup"),
+    # the question names its own batch: nothing to resolve
+    ("Who packed it, ABC-012025-B?", {"batch_code": "ABC-012025-B"}, "Who packed it, ABC-012025-B?"),
+    ("Which batches were stored?", {}, "Which batches were stored?"),
+])
+def test_resolve_followup(question, entities, expected):
+    assert resolve_followup(question, CONTEXT, entities) == expected
+
+
+def test_resolve_followup_without_history():
+    assert resolve_followup("Who packed it?", {}, {}) == "Who packed it?"
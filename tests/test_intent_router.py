@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.mark.parametrize("question, name, params", [
+    ("Where is batch CSY-052025-C?", "batch_status", {"batch_code": "CSY-052025-C"}),
+    ("Show the full processing history of CSY-052025-C", "batch_history", {"batch_code": "CSY-052025-C"}),
+    ("Who inspected batch CSY-052025-C?", "batch_actor", {"batch_code": "CSY-052025-C", "status": "Inspected"}),
+    ("Who delivered CSY-052025-C?", "batch_actor", {"batch_code": "CSY-052025-C", "status": "Dispatched"}),
+    ("When was batch CSY-052025-C stored?", "batch_status_time", {"batch_code": "CSY-052025-C", "status": "Stored"}),
+    ("Which departments were involved in CSY-052025-C?", "batch_department", {"batch_code": "CSY-052025-C"}),
+    ("What are all batches for Cough Syrup?", "product_batches", {"product": "Cough Syrup"}),
+    ("Which batches did John work on?", "employee_batches", {"employee": "John"}),
+    ("Which batches did Ted handle?", "employee_batches", {"employee": "Ted"}),
+    ("Which batches did Anna pack?", "employee_status_batches", {"employee": "Anna", "status": "Packed"}),
+    ("Which batches did Anna deliver?", "employee_status_batches", {"employee": "Anna", "status": "Dispatched"}),
+    ("Which batches did Anna ship?", "employee_status_batches", {"employee": "Anna", "status": "Dispatched"}),
+    ("Which batches did Sara check?", "employee_status_batches", {"employee": "Sara", "status": "Inspected"}),
+    ("List all batches that were stored.", "status_batches", {"status": "Stored"}),
+    ("Which employees belong to the Storage department?", "department_employees", {"department": "Storage"}),
+])
+def test_matches(router, question, name, params):
+    match = router.match(question)
+    assert match is not None and (match.name, match.params) == (name, params)
+
+
+@pytest.mark.parametrize("question", [
+    # negation and counting: the templates would give the opposite answer or the wrong shape
+    "Which batches did John not pack?",
+    "Which batches did John never inspect?",
+    "Which batches didn't Sara store?",
+    "How many batches did John pack?",
+    "Count the batches for Cough Syrup",
+    # two questions in one
+    "Who packed CSY-052025-C and when?",
+    "Where is CSY-052025-C? Who packed it?",
+    # two values of one kind
+    "Which batches did John and Sara pack?",
+    # an action with no status behind it
+    "Which batches did Anna receive?",
+    "Which batches has John completed?",
+    # no template
+    "What is the average time between packing and dispatch?",
+])
+def test_falls_through_to_rag(router, question):
+    assert router.match(question) is None
+
+
+def test_spans_prefer_the_longest_mention(router):
+    spans = router.spans("Was Cough Syrup batch CSY-052025-C packed by Ted?")
+    assert [(kind, value) for _, _, kind, value in spans] == [
+        ("product", "Cough Syrup"), ("batch_code", "CSY-052025-C"), ("status", "Packed"), ("employee", "Ted"),
+    ]
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from app.rag import llm_provider
+from app.rag.llm_provider import CircuitBreaker, LLMProvider, LLMUnavailable, ResilientLLM
+
+
+class FakeProvider(LLMProvider):
+    """Plays one scripted step per call: an exception to raise, or (seconds, answer)."""
+
+    def __init__(self, name, *steps):
+        self.name = name
+        self.steps = list(steps)
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        step = self.steps[min(self.calls, len(self.steps) - 1)]
+        self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        seconds, answer = step
+        await asyncio.sleep(seconds)
+        return answer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_provider.time, "monotonic", lambda: now[0])
+    return now
+
+
+# ==================== Circuit breaker ====================
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failures=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and breaker.trips == 1
+    assert not breaker.allow()
+
+
+def test_breaker_probe_success_closes(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30)
+    breaker.failure()
+    clock[0] += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def test_breaker_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failures=3, reset_seconds=30)
+    for _ in range(3):
+        breaker.failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and breaker.trips == 1
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()  # a lost probe doesn't block forever
+
+
+# ==================== ResilientLLM ====================
+
+def test_success():
+    primary = FakeProvider("primary", (0, "answer"))
+    llm = ResilientLLM(primary)
+    assert asyncio.run(llm.ainvoke("q")) == "answer"
+    assert primary.calls == 1 and llm.breaker.failures == 0
+
+
+def test_failure_is_retried_once():
+    primary = FakeProvider("primary", RuntimeError("boom"), (0, "answer"))
+    assert asyncio.run(ResilientLLM(primary).ainvoke("q")) == "answer"
+    assert primary.calls == 2
+
+
+def test_two_failures_raise_unavailable():
+    primary = FakeProvider("primary", RuntimeError("boom"))
+    llm = ResilientLLM(primary)
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(llm.ainvoke("q"))
+    assert primary.calls == 2 and llm.breaker.failures == 1
+
+
+def test_deadline(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_DEADLINE_SECONDS", 0.05)
+    primary = FakeProvider("primary", (1, "too late"))
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(ResilientLLM(primary).ainvoke("q"))
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_HEDGE", True)
+    monkeypatch.setattr(llm_provider, "LLM_HEDGE_MIN_SECONDS", 0.02)
+    primary = FakeProvider("primary", (1, "slow"), (0, "fast"))
+    llm = ResilientLLM(primary)
+    for _ in range(llm_provider.LLM_HEDGE_MIN_SAMPLES):
+        llm.latency.add(0.001)
+    assert llm.hedge_delay() == 0.02
+    assert asyncio.run(llm.ainvoke("q")) == "fast"
+    assert primary.calls == 2
+
+
+def test_no_hedge_without_enough_samples(monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_HEDGE_MIN_SECONDS", 0.0)
+    llm = ResilientLLM(FakeProvider("primary", (0, "answer")))
+    assert llm.hedge_delay() is None
+
+
+def test_open_breaker_short_circuits():
+    primary = FakeProvider("primary", (0, "answer"))
+    llm = ResilientLLM(primary)
+    llm.breaker = CircuitBreaker(failures=1, reset_seconds=60)
+    llm.breaker.failure()
+    with pytest.raises(LLMUnavailable, match="circuit open"):
+        asyncio.run(llm.ainvoke("q"))
+    assert primary.calls == 0
+
+
+def test_fallback_answers():
+    primary = FakeProvider("primary", RuntimeError("boom"))
+    fallback = FakeProvider("fallback", (0, "local answer"))
+    assert asyncio.run(ResilientLLM(primary, fallback).ainvoke("q")) == "local answer"
+    assert fallback.calls == 1
+
+
+def test_fallback_failure_raises_unavailable():
+    primary = FakeProvider("primary", RuntimeError("boom"))
+    fallback = FakeProvider("fallback", RuntimeError("also down"))
+    with pytest.raises(LLMUnavailable, match="also down"):
+        asyncio.run(ResilientLLM(primary, fallback).ainvoke("q"))
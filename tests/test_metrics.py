@@ -0,0 +1,82 @@
+import math
+import os
+import re
+import sys
+
+import pytest
+
+from app.core import metrics
+
+_LABEL = r'[a-zA-Z_]\w*="(?:[^"\\\n]|\\[\\"n])*"'
+_SAMPLE = re.compile(rf"^([a-zA-Z_:][\w:]*)(\{{{_LABEL}(?:,{_LABEL})*\}})? (\S+)$")
+_COMMENT = re.compile(r"^# (HELP|TYPE) ([a-zA-Z_:][\w:]*) (.*)$")
+_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def parse(text):
+    """Families by name -> (type, [sample lines]); fails on anything the text format doesn't allow."""
+    assert text.endswith("\n")
+    families = {}
+    for line in text[:-1].split("\n"):
+        comment = _COMMENT.match(line)
+        if comment:
+            kind, name, rest = comment.groups()
+            if kind == "TYPE":
+                assert rest in ("counter", "gauge", "histogram"), line
+                assert name not in families, f"duplicate family {name}"
+                families[name] = (rest, [])
+            continue
+        sample = _SAMPLE.match(line)
+        assert sample, f"invalid sample line: {line!r}"
+        name = sample.group(1)
+        family = name if name in families else next(name[:-len(s)] for s in _SUFFIXES if name.endswith(s))
+        assert family in families, f"sample before its TYPE: {line!r}"
+        assert not math.isnan(float(sample.group(3)))
+        families[family][1].append(line)
+    return families
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_registry", list(metrics._registry))
+    monkeypatch.setattr(metrics, "_collectors", [])
+
+
+def test_counter_and_histogram_exposition(registry):
+    counter = metrics.Counter("test_calls_total", "Calls\nby outcome", ["outcome"])
+    histogram = metrics.Histogram("test_seconds", "Latency", ["stage"], buckets=(0.1, 1))
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "llm")
+
+    families = parse(metrics.render())
+    assert families["test_calls_total"] == ("counter", ['test_calls_total{outcome="ok"} 3'])
+    assert families["test_seconds"][1] == [
+        'test_seconds_bucket{stage="llm",le="0.1"} 1',
+        'test_seconds_bucket{stage="llm",le="1"} 2',
+        'test_seconds_bucket{stage="llm",le="+Inf"} 3',
+        'test_seconds_sum{stage="llm"} 5.55',
+        'test_seconds_count{stage="llm"} 3',
+    ]
+    assert "# HELP test_calls_total Calls\\nby outcome" in metrics.render()
+
+
+def test_label_values_are_escaped(registry):
+    metrics.Counter("test_paths_total", "Paths", ["path"]).inc('/a"b\\c\nd')
+    metrics.register_collector(lambda: metrics.gauge_lines("test_state", "State", {'x"y': 1}, "field"))
+
+    families = parse(metrics.render())
+    assert families["test_paths_total"][1] == ['test_paths_total{path="/a\\"b\\\\c\\nd"} 1']
+    assert families["test_state"] == ("gauge", ['test_state{field="x\\"y"} 1'])
+
+
+def test_app_collectors_are_exposed():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+    main = pytest.importorskip("main")
+
+    families = parse(main.metrics.render())
+    for name in ("semantic_cache", "sql_guard_checks", "context_store", "llm_provider", "embedding_provider", "plan_cache",
+                 "timeline_index", "live_feed", "db_pool"):
+        assert families[f"batch_assistant_{name}"][0] == "gauge"
+    assert families["batch_assistant_stage_seconds"][0] == "histogram"
@@ -0,0 +1,60 @@
+import pytest
+
+from app.rag.plan_cache import question_shape, templatize
+from tests.conftest import VOCABULARY
+
+
+@pytest.fixture(autouse=True)
+def vocabulary(monkeypatch):
+    from app.rag import plan_cache
+    from app.rag.intent_router import IntentRouter
+
+    router = IntentRouter()
+    router.set_vocabulary(VOCABULARY)
+    monkeypatch.setattr(plan_cache, "intent_router", router)
+
+
+@pytest.mark.parametrize("question, shape, values", [
+    ("When was ABC-012025-A stored?", "when was {batch_code} {status}", {"batch_code": "ABC-012025-A", "status": "Stored"}),
+    ("Which batches did  JOHN pack?", "which batches did {employee} {status}", {"employee": "John", "status": "Packed"}),
+    ("List cough syrup batches", "list {product} batches", {"product": "Cough Syrup"}),
+    ("Who packed ABC-012025-A and ABC-012025-B", "who {status} {batch_code} and {batch_code_2}", {"status": "Packed", "batch_code": "ABC-012025-A", "batch_code_2": "ABC-012025-B"}),
+    ("How many batches are there", "how many batches are there", {}),
+])
+def test_question_shape(question, shape, values):
+    assert question_shape(question) == (shape, values)
+
+
+def test_same_shape_for_different_values():
+    assert question_shape("Who packed ABC-012025-A?")[0] == question_shape("who packed XYZ-022025-C")[0]
+
+
+def test_templatize_exact_like_and_case():
+    sql = ("SELECT e.name FROM employees e JOIN products p ON p.id = e.id "
+           "WHERE e.name = 'John' AND p.name ILIKE '%Cough Syrup%' AND LOWER(e.name) = 'john'")
+    plan = templatize(sql, {"employee": "John", "product": "Cough Syrup"})
+    assert plan["sql"] == ("SELECT e.name FROM employees e JOIN products p ON p.id = e.id "
+                           "WHERE e.name = :p_employee AND p.name ILIKE :p_product_like AND LOWER(e.name) = :p_employee_lower")
+    assert plan["params"] == {
+        "p_employee": ["employee", "", ""],
+        "p_product_like": ["product", "%", ""],
+        "p_employee_lower": ["employee", "", "lower"],
+    }
+
+
+def test_templatize_keeps_unrelated_literals():
+    plan = templatize("SELECT * FROM batch_tracking WHERE status = 'Packed' AND batch_id = 'A-1'", {"batch_code": "A-1"})
+    assert plan["sql"] == "SELECT * FROM batch_tracking WHERE status = 'Packed' AND batch_id = :p_batch_code"
+
+
+@pytest.mark.parametrize("sql, values", [
+    ("SELECT * FROM employees", {}),
+    # an entity the SQL never uses: the next question's value would be dropped
+    ("SELECT * FROM employees WHERE name = 'John'", {"employee": "John", "status": "Packed"}),
+    # the value is part of another literal, so it can't be swapped
+    ("SELECT * FROM employees WHERE name LIKE 'John%'", {"employee": "John"}),
+    # two entities with the same value: ambiguous which parameter a literal is
+    ("SELECT * FROM batches WHERE batch_code = 'A-1'", {"batch_code": "A-1", "batch_code_2": "a-1"}),
+])
+def test_templatize_refuses(sql, values):
+    assert templatize(sql, values) is None
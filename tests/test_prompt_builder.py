@@ -0,0 +1,78 @@
+import pytest
+
+from langchain.docstore.document import Document
+
+from app.models import models
+from app.rag.prompt_builder import PromptBuilder, estimate_tokens, select_examples
+
+
+def _example(question, sql):
+    return Document(page_content=f"{question} => {sql}", metadata={"kind": "example"})
+
+
+EXAMPLES = [
+    _example(f"Who packed ABC-0{i}2025-A?",
+             "SELECT employees.name FROM batch_tracking JOIN batches ON batch_tracking.batch_id = batches.id "
+             "JOIN employees ON batch_tracking.employee_id = employees.id "
+             f"WHERE batches.batch_code = 'ABC-0{i}2025-A' AND batch_tracking.status = 'Packed';")
+    for i in range(10)
+]
+
+
+@pytest.fixture
+def builder():
+    return PromptBuilder(models.Base.metadata, table_hints={"batches": r"\bbatch(es)?\b"}, token_budget=450)
+
+
+def test_prompt_stays_within_budget(builder):
+    prompt = builder.build("Who packed ABC-012025-A?", EXAMPLES, {"batch_code": "ABC-012025-A"})
+    assert estimate_tokens(prompt) <= builder.token_budget
+    # examples are added in relevance order until the budget runs out
+    included = [doc for doc in EXAMPLES if doc.page_content in prompt]
+    assert included == EXAMPLES[:len(included)] and 0 < len(included) < len(EXAMPLES)
+
+
+def test_prompt_lists_only_touched_tables_and_their_joins(builder):
+    prompt = builder.build("Which batches did John pack?", [], {"employee": "John"})
+    schema = prompt.split("Schema:", 1)[1].split("Joins:", 1)[0]
+    # employees -> batches is bridged through batch_tracking
+    for table in ("employees", "batches", "batch_tracking"):
+        assert f"\n{table}(" in schema
+    assert "\nproducts(" not in schema
+    assert "batch_tracking.employee_id = employees.id" in prompt
+    assert "batch_tracking.batch_id = batches.id" in prompt
+
+
+def test_unrecognised_question_gets_the_whole_schema(builder):
+    assert builder.tables_for("hello", {}, []) == sorted(models.Base.metadata.tables)
+
+
+class Vectorstore:
+    """The slice of the FAISS vectorstore select_examples uses, over hand-picked vectors."""
+
+    def __init__(self, docs, vectors):
+        faiss = pytest.importorskip("faiss")
+        import numpy as np
+
+        self.index = faiss.IndexFlatL2(len(vectors[0]))
+        self.index.add(np.array(vectors, dtype="float32"))
+        self.index_to_docstore_id = {i: str(i) for i in range(len(docs))}
+        self.docstore = type("Docstore", (), {"search": lambda _, i: docs[int(i)]})()
+
+
+def test_near_duplicate_examples_are_dropped():
+    best, duplicate, different = (_example(q, "SELECT 1;") for q in ("best", "near duplicate", "different"))
+    schema = Document(page_content="Table: batches - Contains batch data", metadata={"kind": "schema"})
+    store = Vectorstore(
+        [best, duplicate, different, schema],
+        [[1, 0, 0], [0.995, 0.0998, 0], [0.6, 0, 0.8], [0.9, 0, 0.436]],
+    )
+    [chosen] = select_examples(store, [[0.9, 0, 0.436]], k=2, fetch_k=4, lambda_mult=0.6)
+    # the duplicate is almost as relevant as `different`, but adds nothing next to `best`;
+    # the schema doc is the closest of all, but it isn't an example
+    assert chosen == [best, different]
+
+
+def test_no_candidates():
+    store = Vectorstore([_example("q", "SELECT 1;")], [[1, 0]])
+    assert select_examples(store, [[1, 0], [0, 1]], kind="schema") == [[], []]
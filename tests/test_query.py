@@ -0,0 +1,24 @@
+import pytest
+
+from app.core.query import ordered
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM employees ORDER BY name",
+    "SELECT name FROM employees order  by name LIMIT 10",
+    "SELECT name FROM employees UNION SELECT name FROM departments ORDER BY 1",
+    "WITH e AS (SELECT name FROM employees) SELECT name FROM e ORDER BY name",
+])
+def test_ordered(sql):
+    assert ordered(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM employees LIMIT 100",
+    # ORDER BY in a subquery, a window or a literal doesn't order the result
+    "SELECT name FROM employees WHERE id IN (SELECT id FROM employees ORDER BY id LIMIT 3)",
+    "SELECT name, ROW_NUMBER() OVER (ORDER BY id) FROM employees",
+    "SELECT name FROM employees WHERE name = 'order by name'",
+])
+def test_unordered(sql):
+    assert not ordered(sql)
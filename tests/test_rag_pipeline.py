@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.rag import llm_provider, rag_pipeline
+from app.rag.llm_provider import EmbeddingProvider, LLMProvider, ResilientLLM
+from app.rag.semantic_cache import SemanticSQLCache
+
+SQL = "SELECT employees.name FROM employees;"
+
+
+class Answers(LLMProvider):
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        step = self.steps[min(len(self.prompts), len(self.steps)) - 1]
+        if isinstance(step, Exception):
+            raise step
+        await asyncio.sleep(step[0])
+        return SimpleNamespace(content=step[1])
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    def install(llm, embeddings):
+        monkeypatch.setattr(rag_pipeline, "llm", ResilientLLM(llm))
+        monkeypatch.setattr(rag_pipeline, "embedder", ResilientLLM(embeddings))
+        monkeypatch.setattr(rag_pipeline, "semantic_cache", SemanticSQLCache())
+        monkeypatch.setattr(rag_pipeline, "aget_vectorstore", lambda: pytest.fail("no FAISS without embeddings"))
+    return install
+
+
+def test_embeddings_down_prompts_without_examples(pipeline):
+    llm = Answers((0, SQL))
+    pipeline(llm, Answers(RuntimeError("embedding API down")))
+    assert asyncio.run(rag_pipeline.aget_sql_from_question("Who works here?")) == SQL
+    assert "Examples:\n\n" in llm.prompts[0]
+
+
+def test_slow_embeddings_hit_the_deadline(pipeline, monkeypatch):
+    monkeypatch.setattr(llm_provider, "LLM_DEADLINE_SECONDS", 0.05)
+    llm = Answers((0, SQL))
+    pipeline(llm, Answers((5, [0.0])))
+    assert asyncio.run(rag_pipeline.aget_sql_from_question("Who works here?")).startswith("SELECT")
+
+
+def test_everything_down_is_llm_unavailable(pipeline):
+    pipeline(Answers(RuntimeError("LLM down")), Answers(RuntimeError("embedding API down")))
+    sql = asyncio.run(rag_pipeline.aget_sql_from_question("Who works here?"))
+    assert sql.startswith(rag_pipeline.LLM_UNAVAILABLE)
+    assert rag_pipeline.embedder.breaker.failures == 1 and rag_pipeline.llm.breaker.failures == 1
+
+
+def test_open_embedding_breaker_skips_the_call(pipeline):
+    embeddings = Answers(RuntimeError("embedding API down"))
+    pipeline(Answers((0, SQL)), embeddings)
+    rag_pipeline.embedder.breaker.state = "open"
+    rag_pipeline.embedder.breaker._since = float("inf")
+    assert asyncio.run(rag_pipeline.aget_sql_from_question("Who works here?")) == SQL
+    assert embeddings.prompts == []
+
+
+def test_batch_with_embeddings_down(pipeline):
+    pipeline(Answers((0, SQL)), Answers(RuntimeError("embedding API down")))
+    results = asyncio.run(rag_pipeline.aget_sql_for_questions(["Who works here?", "Who else?"]))
+    assert [r.startswith("SELECT") for r in results] == [True, True]
+
+
+def test_embedding_provider_dispatch():
+    calls = []
+
+    class Model:
+        async def aembed_query(self, text):
+            calls.append(("query", text))
+            return [1.0]
+
+        async def aembed_documents(self, texts, **kwargs):
+            calls.append(("documents", texts, kwargs))
+            return [[1.0]] * len(texts)
+
+    provider = EmbeddingProvider("test", Model)
+    assert asyncio.run(provider.ainvoke("q")) == [1.0]
+    assert asyncio.run(provider.ainvoke(["a", "b"])) == [[1.0], [1.0]]
+    assert calls == [("query", "q"), ("documents", ["a", "b"], {"task_type": "retrieval_query"})]
+
+
+def test_validator_repair_is_marked(pipeline):
+    llm = Answers((0, "SELECT employees.nam FROM employees;"), (0, SQL))
+    pipeline(llm, Answers(RuntimeError("embedding API down")))
+    sql = asyncio.run(rag_pipeline.aget_sql_from_question("Who works here?"))
+    assert sql == rag_pipeline.REPAIRED + SQL
+    assert "unknown column employees.nam" in llm.prompts[1]
+
+
+def test_database_error_repair(pipeline):
+    llm = Answers((0, SQL))
+    pipeline(llm, Answers(RuntimeError("embedding API down")))
+    sql = asyncio.run(rag_pipeline.arepair_sql("Who works here?", "SELECT 1/0 FROM employees", "division by zero"))
+    assert sql == rag_pipeline.REPAIRED + SQL
+    assert "division by zero" in llm.prompts[0] and "SELECT 1/0 FROM employees" in llm.prompts[0]
+
+
+@pytest.mark.parametrize("answer", [(0, "SELECT employees.nam FROM employees;"), (0, "-- ERROR: no idea"), RuntimeError("LLM down")])
+def test_database_error_repair_gives_up(pipeline, answer):
+    pipeline(Answers(answer), Answers(RuntimeError("embedding API down")))
+    assert asyncio.run(rag_pipeline.arepair_sql("Who works here?", SQL, "division by zero")) is None
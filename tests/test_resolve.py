@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.core.sql_guard import SQLRejected
+from tests.test_singleflight import RedisDown
+
+BROKEN = "SELECT employees.nam FROM employees"
+FIXED = "SELECT employees.name FROM employees"
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    from app.core import cache
+    from app.routes import resolve
+
+    monkeypatch.setattr(cache, "cache", RedisDown())
+    monkeypatch.setattr(resolve.semantic_cache, "discard", lambda sql: None)
+    return resolve
+
+
+def fake_database(monkeypatch, resolve, *outcomes):
+    ran = []
+
+    async def fetch_page(resolution, page_sql, db):
+        ran.append(page_sql)
+        outcome = outcomes[len(ran) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(resolve, "_fetch_page", fetch_page)
+    return ran
+
+
+def fake_repair(monkeypatch, resolve, answer):
+    asked = []
+
+    async def arepair_sql(question, sql, error):
+        asked.append((sql, error))
+        return answer
+
+    monkeypatch.setattr(resolve, "arepair_sql", arepair_sql)
+    return asked
+
+
+def undefined_column():
+    return ProgrammingError(BROKEN, {}, Exception('column employees.nam does not exist'))
+
+
+def test_database_error_is_repaired_once(resolve, monkeypatch):
+    ran = fake_database(monkeypatch, resolve, undefined_column(), [{"name": "John"}])
+    asked = fake_repair(monkeypatch, resolve, resolve.REPAIRED + FIXED)
+    resolution = resolve.Resolution("Who works here?", "llm", sql=BROKEN, generated=BROKEN)
+
+    assert asyncio.run(resolve.run_query(resolution, 0, 11)) == [{"name": "John"}]
+    assert asked == [(BROKEN, "column employees.nam does not exist")]
+    assert ran[1].startswith(f"SELECT * FROM ({FIXED} LIMIT")
+    assert resolution.generated == resolve.REPAIRED + FIXED
+
+
+def test_over_budget_plan_is_repaired(resolve, monkeypatch):
+    fake_database(monkeypatch, resolve, SQLRejected("cost", "estimated cost 9e9"), [])
+    asked = fake_repair(monkeypatch, resolve, resolve.REPAIRED + FIXED)
+    resolution = resolve.Resolution("Who works here?", "llm", sql=BROKEN, generated=BROKEN)
+    assert asyncio.run(resolve.run_query(resolution, 0, 11)) == []
+    assert asked == [(BROKEN, "cost: estimated cost 9e9")]
+
+
+@pytest.mark.parametrize("path, generated, error", [
+    ("plan", None, undefined_column()),                      # not fresh LLM SQL
+    ("sql_cache", BROKEN, undefined_column()),
+    ("llm", "-- REPAIRED\n" + BROKEN, undefined_column()),   # already had its one repair
+    ("llm", BROKEN, OperationalError(BROKEN, {}, Exception("connection refused"))),
+    ("llm", BROKEN, SQLRejected("forbidden_keyword", "DELETE")),
+])
+def test_no_repair(resolve, monkeypatch, path, generated, error):
+    fake_database(monkeypatch, resolve, error)
+    asked = fake_repair(monkeypatch, resolve, resolve.REPAIRED + FIXED)
+    resolution = resolve.Resolution("Who works here?", path, sql=BROKEN, generated=generated)
+    with pytest.raises(type(error)):
+        asyncio.run(resolve.run_query(resolution, 0, 11))
+    assert asked == []
+
+
+def test_repair_that_fails_again_raises(resolve, monkeypatch):
+    fake_database(monkeypatch, resolve, undefined_column(), undefined_column())
+    asked = fake_repair(monkeypatch, resolve, resolve.REPAIRED + BROKEN)
+    resolution = resolve.Resolution("Who works here?", "llm", sql=BROKEN, generated=BROKEN)
+    with pytest.raises(ProgrammingError):
+        asyncio.run(resolve.run_query(resolution, 0, 11))
+    assert len(asked) == 1
+
+
+def test_pageable(resolve):
+    assert resolve.Resolution("q", "llm", sql="SELECT name FROM employees ORDER BY name LIMIT 100").pageable
+    assert not resolve.Resolution("q", "llm", sql="SELECT name FROM employees LIMIT 100").pageable
+    # timeline rows are in memory, in timeline order
+    assert resolve.Resolution("q", "timeline", sql="SELECT 1", rows=[]).pageable
@@ -0,0 +1,77 @@
+import pytest
+
+from app.rag.semantic_cache import SemanticSQLCache, entity_key
+from bench.stubs import StubEmbeddings
+
+embed = StubEmbeddings(latency_ms=0).embed_query
+
+
+@pytest.fixture
+def key(router):
+    return lambda question: entity_key(question, router.spans(question))
+
+
+def test_entity_key_keeps_every_mention(key):
+    assert key("Compare ABC-012025-A and ABC-012025-B packed by John in May 2025") == (
+        ("batch_code", "ABC-012025-A"), ("batch_code", "ABC-012025-B"), ("status", "Packed"),
+        ("employee", "John"), ("literal", "may"), ("literal", "2025"),
+    )
+
+
+@pytest.mark.parametrize("first, second", [
+    # only the second batch code differs: extract() alone would give both the same key
+    ("Show the full processing history and the current status of ABC-012025-A and ABC-012025-B",
+     "Show the full processing history and the current status of ABC-012025-A and ABC-012025-C"),
+    ("Show the top 5 employees by packed batches", "Show the top 10 employees by packed batches"),
+    ("Which batches were stored on 2025-01-03?", "Which batches were stored on 2025-01-04?"),
+    ("Which batches were stored yesterday?", "Which batches were stored last week?"),
+])
+def test_entity_key_separates_near_identical_questions(key, first, second):
+    assert key(first) != key(second)
+
+
+def test_hit_on_similar_question(key):
+    cache = SemanticSQLCache(threshold=0.8)
+    cache.store(embed("Who packed batch ABC-012025-A?"), key("Who packed batch ABC-012025-A?"), "SELECT 1")
+    question = "Who packed the batch ABC-012025-A"
+    assert cache.lookup(embed(question), key(question)) == "SELECT 1"
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_on_different_entity(key):
+    cache = SemanticSQLCache(threshold=0.5)
+    first = "Show the full processing history and the current status of ABC-012025-A and ABC-012025-B"
+    second = first.replace("ABC-012025-B", "ABC-012025-C")
+    cache.store(embed(first), key(first), "SELECT 'ABC-012025-B'")
+    assert cache.lookup(embed(second), key(second), threshold=0.0) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_miss_below_threshold(key):
+    cache = SemanticSQLCache(threshold=0.99)
+    cache.store(embed("Who packed batch ABC-012025-A?"), key("Who packed batch ABC-012025-A?"), "SELECT 1")
+    question = "Which department packed ABC-012025-A in the end"
+    assert cache.lookup(embed(question), key(question)) is None
+    # a lower threshold (as used while the LLM is down) can still take it
+    assert cache.lookup(embed(question), key(question), threshold=0.0) == "SELECT 1"
+
+
+def test_discard_drops_every_entry_with_that_sql(key):
+    cache = SemanticSQLCache()
+    questions = ["Who packed ABC-012025-A?", "Who packed batch ABC-012025-A", "Who stored ABC-012025-A?"]
+    for question, sql in zip(questions, ("SELECT 1", "SELECT 1", "SELECT 2")):
+        cache.store(embed(question), key(question), sql)
+
+    cache.discard("SELECT 1")
+    assert cache.stats()["size"] == 1
+    assert cache.lookup(embed(questions[0]), key(questions[0])) is None
+    assert cache.lookup(embed(questions[2]), key(questions[2])) == "SELECT 2"
+
+
+def test_lru_eviction():
+    cache = SemanticSQLCache(capacity=2)
+    for i in range(3):
+        cache.store([1.0, float(i)], (("literal", str(i)),), f"SELECT {i}")
+    assert cache.lookup([1.0, 0.0], (("literal", "0"),)) is None
+    assert cache.lookup([1.0, 2.0], (("literal", "2"),)) == "SELECT 2"
+    assert cache.stats()["evictions"] == 1
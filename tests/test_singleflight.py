@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+import redis
+
+
+class RedisDown:
+    """No Redis: the lock can't be taken, so coalescing is within this process only."""
+
+    async def set(self, *args, **kwargs):
+        raise redis.ConnectionError("redis is down")
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    from app.core import cache
+
+    monkeypatch.setattr(cache, "cache", RedisDown())
+
+
+def gather(*calls):
+    async def run():
+        return await asyncio.gather(*calls, return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_concurrent_callers_share_one_call():
+    from app.core import singleflight
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"sql": "SELECT 1"}
+
+    results = gather(*(singleflight.coalesce("sql", "how many batches", compute) for _ in range(5)))
+    assert results == [{"sql": "SELECT 1"}] * 5
+    assert len(calls) == 1
+    assert not singleflight._inflight
+
+
+def test_different_keys_do_not_share():
+    from app.core import singleflight
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    gather(singleflight.coalesce("sql", "a", compute), singleflight.coalesce("sql", "b", compute),
+           singleflight.coalesce("rows", "a", compute))
+    assert len(calls) == 3
+
+
+def test_exception_reaches_every_waiter():
+    from app.core import singleflight
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise TimeoutError("LLM deadline")
+
+    results = gather(*(singleflight.coalesce("sql", "how many batches", compute) for _ in range(4)))
+    assert len(calls) == 1
+    assert all(isinstance(r, TimeoutError) and str(r) == "LLM deadline" for r in results)
+    assert not singleflight._inflight
+
+
+def test_next_call_after_a_failure_computes_again():
+    from app.core import singleflight
+
+    outcomes = [RuntimeError("down"), "SELECT 1"]
+
+    async def compute():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(singleflight.coalesce("sql", "q", compute))
+    assert asyncio.run(singleflight.coalesce("sql", "q", compute)) == "SELECT 1"
+
+
+def test_followers_recompute_when_the_leader_is_cancelled():
+    from app.core import singleflight
+
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        leader = asyncio.ensure_future(singleflight.coalesce("sql", "q", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(singleflight.coalesce("sql", "q", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(run()) == [2, 2, 2]
+    assert len(calls) == 2
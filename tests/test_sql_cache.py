@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    from app.core import cache
+
+    fake = FakeRedis()
+    monkeypatch.setattr(cache, "cache", fake)
+    return fake
+
+
+def test_round_trip(redis_cache):
+    from app.core import cache
+
+    asyncio.run(cache.set_sql("how many batches", "SELECT COUNT(*) FROM batches"))
+    assert asyncio.run(cache.get_sql("how many batches")) == "SELECT COUNT(*) FROM batches"
+    assert asyncio.run(cache.get_sql_many(["how many batches", "who packed it"])) == ["SELECT COUNT(*) FROM batches", None]
+
+
+def test_schema_change_starts_a_new_keyspace(redis_cache, monkeypatch):
+    from app.core import cache
+
+    asyncio.run(cache.set_sql("how many batches", "SELECT COUNT(*) FROM batches"))
+    monkeypatch.setattr(cache, "schema_version", lambda: "migrated")
+    assert asyncio.run(cache.get_sql("how many batches")) is None
+    assert asyncio.run(cache.get_sql_many(["how many batches"])) == [None]
+
+
+@pytest.mark.parametrize("path, evicted", [("sql_cache", True), ("llm", False)])
+def test_failed_cached_sql_is_evicted(redis_cache, monkeypatch, path, evicted):
+    from app.core import cache
+    from app.routes import resolve
+
+    discarded = []
+    monkeypatch.setattr(resolve.semantic_cache, "discard", discarded.append)
+    asyncio.run(cache.set_sql("how many batches", "SELECT nope FROM batches"))
+    resolution = resolve.Resolution("how many batches", path, sql="SELECT nope FROM batches LIMIT 100",
+                                    generated="SELECT nope FROM batches")
+    asyncio.run(resolve.failed(resolution, RuntimeError("column nope does not exist")))
+
+    assert (asyncio.run(cache.get_sql("how many batches")) is None) == evicted
+    assert discarded == ["SELECT nope FROM batches"]
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import sql_guard
+from app.core.sql_guard import SQLRejected, check_plan, check_statement
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT name FROM employees;", f"SELECT name FROM employees LIMIT {sql_guard.SQL_DEFAULT_LIMIT}"),
+    ("SELECT name FROM employees LIMIT 5", "SELECT name FROM employees LIMIT 5"),
+    ("SELECT name FROM employees FETCH FIRST 5 ROWS ONLY", "SELECT name FROM employees FETCH FIRST 5 ROWS ONLY"),
+    # a LIMIT inside a subquery doesn't bound the outer result
+    ("SELECT * FROM (SELECT id FROM batches LIMIT 3) b", f"SELECT * FROM (SELECT id FROM batches LIMIT 3) b LIMIT {sql_guard.SQL_DEFAULT_LIMIT}"),
+    ("-- latest first\nSELECT id FROM batches /* all */ LIMIT 1", "SELECT id FROM batches   LIMIT 1"),
+    # keywords inside literals and quoted names are data, not SQL
+    ("SELECT id FROM batches WHERE batch_code = 'DROP; DELETE' LIMIT 1", "SELECT id FROM batches WHERE batch_code = 'DROP; DELETE' LIMIT 1"),
+    # ... and so are comment markers
+    ("SELECT id FROM batches WHERE batch_code = 'a--b' LIMIT 1", "SELECT id FROM batches WHERE batch_code = 'a--b' LIMIT 1"),
+    ("SELECT id FROM batches WHERE batch_code = '/* x' -- note\n", f"SELECT id FROM batches WHERE batch_code = '/* x' LIMIT {sql_guard.SQL_DEFAULT_LIMIT}"),
+    ("WITH t AS (SELECT 1 AS x) SELECT x FROM t LIMIT 1", "WITH t AS (SELECT 1 AS x) SELECT x FROM t LIMIT 1"),
+])
+def test_accepts_single_selects(sql, expected):
+    assert check_statement(sql) == expected
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("", "empty"),
+    ("-- nothing here", "empty"),
+    ("SELECT 1; SELECT 2", "multiple_statements"),
+    # a '--' inside a literal must not hide what follows it
+    ("SELECT id FROM batches WHERE batch_code = 'a--b'; DROP TABLE batches", "multiple_statements"),
+    ("DELETE FROM batches", "not_select"),
+    ("SHOW search_path", "not_select"),
+    ("WITH gone AS (DELETE FROM batches RETURNING id) SELECT * FROM gone", "forbidden_keyword"),
+    ("SELECT * INTO copy FROM batches", "forbidden_keyword"),
+    ("SELECT pg_sleep(10)", "forbidden_keyword"),
+    ("SELECT * FROM batches FOR UPDATE", "forbidden_keyword"),
+])
+def test_rejects(sql, reason):
+    with pytest.raises(SQLRejected) as rejected:
+        check_statement(sql)
+    assert rejected.value.reason == reason
+
+
+class FakeDB:
+    """Answers EXPLAIN (FORMAT JSON) with a canned plan."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.sql = None
+
+    async def execute(self, statement, params):
+        self.sql = str(statement)
+        plan = json.dumps([{"Plan": self.plan}])
+        return type("Result", (), {"scalar": lambda _: plan})()
+
+
+def _plan(cost, rows, wrappers=()):
+    plan = {"Node Type": "Seq Scan", "Total Cost": cost, "Plan Rows": rows}
+    for node in wrappers:
+        plan = {"Node Type": node, "Total Cost": cost, "Plan Rows": 10, "Plans": [plan]}
+    return plan
+
+
+def test_plan_within_budget():
+    db = FakeDB(_plan(10, 5))
+    asyncio.run(check_plan(db, "SELECT 1"))
+    assert db.sql == "EXPLAIN (FORMAT JSON) SELECT 1"
+
+
+@pytest.mark.parametrize("plan, reason", [
+    (_plan(sql_guard.SQL_MAX_COST + 1, 5), "cost"),
+    (_plan(10, sql_guard.SQL_MAX_ROWS_ESTIMATE + 1), "rows"),
+    # the LIMIT wrapper estimates 10 rows; the cross join beneath it is what counts
+    (_plan(10, sql_guard.SQL_MAX_ROWS_ESTIMATE + 1, ("Limit", "Subquery Scan")), "rows"),
+])
+def test_plan_over_budget(plan, reason):
+    with pytest.raises(SQLRejected) as rejected:
+        asyncio.run(check_plan(FakeDB(plan), "SELECT 1"))
+    assert rejected.value.reason == reason
@@ -0,0 +1,54 @@
+import pytest
+
+from app.core.sql_validator import SchemaValidator
+from app.models import models
+
+
+@pytest.fixture(scope="module")
+def validator():
+    return SchemaValidator(models.Base.metadata)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT EXTRACT(YEAR FROM timestamp) AS y, COUNT(*) FROM batch_tracking GROUP BY y ORDER BY y",
+    "SELECT b.batch_code, COUNT(*) AS n FROM batches AS b JOIN batch_tracking bt ON bt.batch_id = b.id GROUP BY b.batch_code ORDER BY n DESC LIMIT 5",
+    "WITH latest AS (SELECT batch_id, MAX(timestamp) AS ts FROM batch_tracking GROUP BY batch_id) SELECT batches.batch_code FROM latest JOIN batches ON batches.id = latest.batch_id",
+    "SELECT s.code FROM (SELECT batch_code AS code FROM batches) s",
+    "SELECT batches.batch_code FROM batches, products WHERE batches.product_id = products.id AND products.name = 'X'",
+    "SELECT e.name FROM employees e WHERE e.department_id IN (SELECT id FROM departments WHERE name = 'Storage')",
+    "SELECT status, COUNT(*) FROM batch_latest_status GROUP BY status",
+    "SELECT batch_tracking.timestamp::date AS d FROM batch_tracking WHERE batch_tracking.timestamp > NOW() - INTERVAL '7 days'",
+    # literals are data, whatever they look like
+    "SELECT name FROM employees WHERE name = 'colour FROM nowhere'",
+    # implicit aliases (no AS)
+    "SELECT COUNT(*) cnt FROM batch_tracking ORDER BY cnt",
+    "SELECT b.batch_code code, p.name product FROM batches b JOIN products p ON b.product_id = p.id ORDER BY code",
+    "SELECT 'x' label, CASE WHEN status = 'Packed' THEN 1 ELSE 0 END packed FROM batch_tracking",
+    "SELECT timestamp::date d, COUNT(*) n FROM batch_tracking GROUP BY d",
+    # bind placeholders are values, casts of them still cast
+    "SELECT b.batch_code FROM batches b WHERE b.batch_code = :code AND b.id = :id::int",
+    "SELECT name FROM employees WHERE LOWER(name) = LOWER(:employee) LIMIT :limit",
+])
+def test_valid(validator, sql):
+    assert validator.problems(sql) == []
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT employees.nam FROM employees",
+    "SELECT b.batch_code FROM batches b JOIN batch_tracking t ON t.id = b.id WHERE t.colour = 'Stored'",
+    "SELECT batch_code FROM batch WHERE id = 1",
+    "SELECT x.status FROM batch_tracking",
+    "SELECT batches.batch_code FROM batch_tracking WHERE batch_tracking.status='Stored'",
+    "SELECT colour FROM products",
+    "SELECT nam FROM employees",
+    # an implicit alias doesn't excuse unknown columns elsewhere
+    "SELECT COUNT(*) cnt FROM batch_tracking WHERE colour = 1",
+])
+def test_invalid(validator, sql):
+    assert validator.problems(sql)
+
+
+def test_intent_sql_is_valid(validator):
+    from app.rag.intent_router import INTENT_SQL
+
+    assert {name: validator.problems(str(sql)) for name, sql in INTENT_SQL.items() if validator.problems(str(sql))} == {}
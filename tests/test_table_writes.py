@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from tests.test_sql_cache import FakeRedis
+
+
+class FakeFeed:
+    def __init__(self):
+        self.listeners = []
+        self.listening = False
+
+    def add_listener(self, on_event, on_lost=None):
+        self.listeners.append((on_event, on_lost))
+
+    async def ensure_listening(self):
+        self.listening = True
+
+    def notify(self, event):
+        return [on_event(event) for on_event, _ in self.listeners]
+
+    def drop(self):
+        self.listening = False
+        return [on_lost() for _, on_lost in self.listeners]
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    from app.core import cache
+
+    bumped = []
+    monkeypatch.setattr(cache, "bump_tables", lambda tables: bumped.append(sorted(tables)))
+    monkeypatch.setattr(cache, "cache", FakeRedis())
+    monkeypatch.setattr(cache, "_writes_feed", None)
+    feed = FakeFeed()
+    feed.bumped = bumped
+    return feed
+
+
+def test_ddl_covers_every_table():
+    from app.models import models
+
+    ddl = models.table_writes_ddl()
+    for table in models.Base.metadata.tables:
+        assert f"CREATE TRIGGER trg_{table}_writes" in ddl
+        assert f"ON {table}\nFOR EACH STATEMENT" in ddl
+    assert f"pg_notify('{models.TABLE_WRITES_CHANNEL}'" in ddl
+
+
+def test_write_bumps_its_table(feed):
+    from app.core import cache
+
+    async def run():
+        await cache.follow_table_writes(feed)
+        await cache.follow_table_writes(feed)  # a retried warm-up doesn't listen twice
+        await asyncio.gather(*feed.notify({"op": "WRITE", "table": "departments"}))
+
+    asyncio.run(run())
+    assert len(feed.listeners) == 1
+    assert feed.bumped == [["departments"]]
+
+
+def test_lost_feed_bumps_everything_and_stops_caching(feed):
+    from app.core import cache
+    from app.core.database import Base
+
+    async def run():
+        await cache.follow_table_writes(feed)
+        await cache.store_rows("SELECT name FROM departments", {}, [{"name": "Packaging"}], {"departments": 0})
+        await asyncio.gather(*feed.drop())
+        await cache.store_rows("SELECT name FROM employees", {}, [{"name": "John"}], {"employees": 0})
+
+    asyncio.run(run())
+    assert feed.bumped == [sorted(Base.metadata.tables)]
+    assert list(cache.cache.data) == [f"rows:{cache._hash('SELECT name FROM departments', {})}"]
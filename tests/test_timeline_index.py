@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from app.models import models
+from app.rag import timeline_index
+from app.rag.intent_router import INTENT_SQL, IntentMatch
+from app.rag.timeline_index import _LOAD_SQL, TimelineIndex, Timelines
+
+T = [datetime(2025, 5, 1, 8, minute, 30, 250) for minute in range(6)]
+
+# (id, batch code, status, employee id, department id, timestamp); rows 3 and 4 lack a name
+TRACKING = [
+    (1, "ABC-012025-A", "Packed", 1, 1, T[0]),
+    (2, "ABC-012025-B", "Packed", 2, 1, T[1]),
+    (3, "ABC-012025-A", "Inspected", None, 2, T[2]),
+    (4, "ABC-012025-A", "Stored", 1, None, T[3]),
+    (5, "ABC-012025-A", "Dispatched", 2, 2, T[4]),
+]
+INTENTS = [
+    IntentMatch(name, params)
+    for code in ("ABC-012025-A", "ABC-012025-B")
+    for name, params in [
+        ("batch_status", {"batch_code": code}),
+        ("batch_history", {"batch_code": code}),
+        ("batch_statuses", {"batch_code": code}),
+        ("batch_department", {"batch_code": code}),
+        ("batch_product", {"batch_code": code}),
+        *[(name, {"batch_code": code, "status": status})
+          for name in ("batch_actor", "batch_status_time", "batch_status_department")
+          for status in ("Packed", "Inspected", "Stored", "Dispatched", "Returned")],
+    ]
+]
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Department), [{"id": 1, "name": "Packaging"}, {"id": 2, "name": "Quality Control"}])
+        conn.execute(insert(models.Employee), [{"id": 1, "name": "John"}, {"id": 2, "name": "Sara"}])
+        conn.execute(insert(models.Product), [{"id": 1, "name": "Cough Syrup", "code": "CSY"}])
+        # B has no product: INTENT_SQL's inner join finds none
+        conn.execute(insert(models.Batch), [{"id": 1, "batch_code": "ABC-012025-A", "product_id": 1},
+                                            {"id": 2, "batch_code": "ABC-012025-B", "product_id": None}])
+        conn.execute(insert(models.BatchTracking), [
+            {"id": i, "batch_id": 1 if code.endswith("A") else 2, "status": status,
+             "employee_id": employee, "department_id": department, "timestamp": ts}
+            for i, code, status, employee, department, ts in TRACKING])
+        conn.execute(insert(models.BatchLatestStatus), [
+            {"batch_id": 1, "tracking_id": 5, "status": "Dispatched", "timestamp": T[4]},
+            {"batch_id": 2, "tracking_id": 2, "status": "Packed", "timestamp": T[1]}])
+    return engine
+
+
+@pytest.fixture
+def index(db):
+    index = TimelineIndex()
+    with db.connect() as conn:
+        for row in conn.execute(_LOAD_SQL):
+            index._data.add(*row)
+    index.ready = True
+    return index
+
+
+def _normalized(rows, intent):
+    return [{k: datetime.fromisoformat(v) if k == "timestamp" and isinstance(v, str) else v
+             for k, v in row.items()} for row in rows]
+
+
+@pytest.mark.parametrize("intent", INTENTS, ids=lambda i: f"{i.name}-{'-'.join(i.params.values())}")
+def test_answers_match_intent_sql(db, index, intent):
+    with db.connect() as conn:
+        expected = [dict(row) for row in conn.execute(INTENT_SQL[intent.name], intent.params).mappings()]
+    assert _normalized(index.answer(intent), intent) == _normalized(expected, intent)
+
+
+def test_timeline_order_and_unknown_batches():
+    data = Timelines()
+    data.add(1, "ABC-012025-A", "Cough Syrup", "Stored", "John", "Storage", T[3])
+    data.add(2, "ABC-012025-A", "Cough Syrup", "Packed", "Sara", "Packaging", T[0])
+    data.add(3, "ABC-012025-A", "Cough Syrup", "Inspected", "John", "Quality Control", T[0])
+    # timestamp first, then insert order
+    assert data.rows("ABC-012025-A") == [1, 2, 0]
+    assert data.rows("ABC-012025-Z") is None
+    data.stale.add("ABC-012025-A")
+    assert data.rows("ABC-012025-A") is None
+    assert data.names.count("John") == 1
+
+
+def test_answers_only_while_ready(index):
+    intent = IntentMatch("batch_status", {"batch_code": "ABC-012025-A"})
+    assert index.answer(intent) == [{"status": "Dispatched"}]
+    index._on_lost()
+    assert index.answer(intent) is None
+    assert index.answer(IntentMatch("product_batches", {"product": "Cough Syrup"})) is None
+
+
+def test_lost_feed_wakes_maintenance(monkeypatch):
+    monkeypatch.setattr(timeline_index, "TIMELINE_RELOAD_SECONDS", 3600)
+    monkeypatch.setattr(timeline_index, "TIMELINE_RETRY_SECONDS", 0)
+
+    async def run():
+        index = TimelineIndex()
+        index.ready = True
+        loads = asyncio.Event()
+
+        async def load():
+            loads.set()
+        index.load = load
+        task = asyncio.create_task(index._maintain())
+        await asyncio.sleep(0.01)
+        assert not loads.is_set()  # sleeping out the long reload interval
+        index._on_lost()
+        await asyncio.wait_for(loads.wait(), 1)
+        task.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import shutil
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from langchain.docstore.document import Document
+
+from app.rag.vector_index import fingerprint, load_or_update_index
+from bench.stubs import StubEmbeddings
+
+
+class CountingEmbeddings(StubEmbeddings):
+    def __init__(self, dim: int = 64):
+        super().__init__(dim=dim, latency_ms=0)
+        self.embedded = []
+
+    def embed_documents(self, texts, **kwargs):
+        self.embedded += texts
+        return super().embed_documents(texts, **kwargs)
+
+
+DOCS = [
+    Document(page_content="Who packed ABC-012025-A? => SELECT 1", metadata={"kind": "example"}),
+    Document(page_content="Where is ABC-012025-A? => SELECT 2", metadata={"kind": "example"}),
+]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "index"), str(tmp_path / "embedding_cache.json")
+
+
+def _contents(vectorstore):
+    return sorted(d.page_content for d in vectorstore.docstore._dict.values())
+
+
+def test_unchanged_docs_load_without_embedding(paths):
+    model = CountingEmbeddings()
+    load_or_update_index(DOCS, model, *paths)
+    assert len(model.embedded) == 2
+
+    model.embedded.clear()
+    vectorstore = load_or_update_index(DOCS, model, *paths)
+    assert model.embedded == [] and _contents(vectorstore) == sorted(d.page_content for d in DOCS)
+
+
+def test_changed_docs_update_in_place(paths):
+    model = CountingEmbeddings()
+    load_or_update_index(DOCS, model, *paths)
+    model.embedded.clear()
+
+    changed = [DOCS[0], Document(page_content="Which batches were stored? => SELECT 3", metadata={"kind": "example"})]
+    vectorstore = load_or_update_index(changed, model, *paths)
+    assert model.embedded == [changed[1].page_content]
+    assert _contents(vectorstore) == sorted(d.page_content for d in changed)
+
+
+def test_metadata_change_replaces_doc(paths):
+    model = CountingEmbeddings()
+    load_or_update_index(DOCS, model, *paths)
+    retagged = [DOCS[0], Document(page_content=DOCS[1].page_content, metadata={"kind": "schema"})]
+    assert fingerprint(retagged, model) != fingerprint(DOCS, model)
+
+    vectorstore = load_or_update_index(retagged, model, *paths)
+    assert sorted(d.metadata["kind"] for d in vectorstore.docstore._dict.values()) == ["example", "schema"]
+
+
+def test_model_change_rebuilds(paths):
+    load_or_update_index(DOCS, CountingEmbeddings(dim=64), *paths)
+    other = CountingEmbeddings(dim=128)
+    assert fingerprint(DOCS, other) != fingerprint(DOCS, CountingEmbeddings(dim=64))
+
+    vectorstore = load_or_update_index(DOCS, other, *paths)
+    assert len(other.embedded) == 2
+    assert vectorstore.index.d == 128 and vectorstore.index.ntotal == 2
+
+
+def test_embedding_cache_survives_deleting_the_index(paths):
+    index_path, cache_path = paths
+    load_or_update_index(DOCS, CountingEmbeddings(), *paths)
+    shutil.rmtree(index_path)
+
+    model = CountingEmbeddings()
+    vectorstore = load_or_update_index(DOCS, model, index_path, cache_path)
+    assert model.embedded == [] and vectorstore.index.ntotal == 2